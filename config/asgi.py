@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Índice de autocompletado de pacientes: se carga en segundo plano al iniciar
+from core import autocomplete  # noqa: E402
+
+autocomplete.warm_async()
@@ -2,17 +2,29 @@
 from pathlib import Path
 import os
 
+from dotenv import load_dotenv
+
 BASE_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(BASE_DIR / '.env')
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
 
-SECRET_KEY = 'dev-only-change-in-production'
-DEBUG = True
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'dev-only-change-in-production')
+DEBUG = env_bool('DJANGO_DEBUG', True)
 
 # Autenticación
 LOGIN_URL = 'login'                # URL name de la vista de login
 LOGIN_REDIRECT_URL = 'home'        # A dónde ir después de loguearse
 LOGOUT_REDIRECT_URL = 'login'      # A dónde ir después de cerrar sesión
 
-ALLOWED_HOSTS = []  # en desarrollo
+ALLOWED_HOSTS = [h for h in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if h]  # vacío en desarrollo
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -26,11 +38,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',   # <—— métricas por request (primero: mide todo)
+    'core.routers.PinPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.audit.AuditMiddleware',              # historial de cambios: un bulk_create al final
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -41,8 +56,13 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],  # <—— carpeta templates
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Plantillas compiladas una vez por proceso; en desarrollo el
+            # autoreload de runserver vacía este caché al editar una plantilla
+            'loaders': [('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ])],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -55,13 +75,47 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
-# DB por defecto (SQLite) — fácil para empezar
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Base de datos desde variables de entorno (o un archivo .env, ver .env.example).
+# DB_ENGINE=mysql (por defecto) o sqlite.
+def database(prefix='DB'):
+    """Configuración de una alias a partir de <prefix>_NAME, <prefix>_HOST, …"""
+    def env(name, default=''):
+        return os.environ.get(f'{prefix}_{name}', os.environ.get(f'DB_{name}', default))
+
+    if os.environ.get('DB_ENGINE', 'mysql') == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env('NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    pool_size = env_int('DB_POOL_SIZE', 0)
+    config = {
+        # Con pool (core.backends.mysql) la conexión vuelve al pool en cada
+        # request; sin pool se conserva por hilo hasta CONN_MAX_AGE segundos.
+        'ENGINE': 'core.backends.mysql' if pool_size else 'django.db.backends.mysql',
+        'NAME': env('NAME', 'sistema_audiologia'),
+        'USER': env('USER', 'root'),
+        'PASSWORD': env('PASSWORD'),
+        'HOST': env('HOST', '127.0.0.1'),
+        'PORT': env('PORT', '3306'),
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 0 if pool_size else 60),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+        },
     }
-}
+    if pool_size:
+        config['POOL'] = {'MAX_SIZE': pool_size, 'RECYCLE': env_int('DB_POOL_RECYCLE', 300)}
+    return config
+
+
+DATABASES = {'default': database()}
+# Réplica de lectura para listado/ficha de pacientes (core.routers)
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = database('DB_REPLICA')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_READS = env_bool('DB_REPLICA_READS', True)
+REPLICA_PIN_SECONDS = 10  # tras un POST, ese cliente lee de default (réplica atrasada)
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -78,20 +132,102 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']  # <—— carpeta static (dev)
 STATIC_ROOT = BASE_DIR / 'staticfiles'    # <—— para collectstatic (prod)
+# Producción: nombres con hash + copia .gz (core.storage). Los recursos de
+# Bootstrap se descargan una vez con `manage.py fetch_vendor_assets`; hasta
+# entonces se piden al CDN (core.vendor). Con DEBUG=False faltar alguno es un
+# error de `manage.py check` (core.E001).
+VENDOR_ASSETS_REQUIRED = env_bool('VENDOR_ASSETS_REQUIRED', not DEBUG)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'sistema_audiologia',
-        'USER': 'root',
-        'PASSWORD': '',        
-        'HOST': '127.0.0.1',   
-        'PORT': '3306',        
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-        },
+# Archivos de trabajos en segundo plano (uploads a importar, exportaciones).
+# No se sirven públicamente: se descargan con la vista job_download.
+MEDIA_ROOT = BASE_DIR / 'media'
+JOB_STALE_SECONDS = 600     # RUNNING sin latido => el worker murió, se reencola
+JOB_HEARTBEAT_SECONDS = 60  # latido de un trabajo en curso (hilo aparte, core.jobs)
+
+# Instrumentación (core.middleware.PerformanceMiddleware)
+PERF_SLOW_REQUEST_MS = 500     # request lento
+PERF_SLOW_QUERY_MS = 100       # query lenta
+PERF_N_PLUS_ONE = 5            # misma SQL repetida N veces => posible N+1
+PERF_WINDOW = 1000             # muestras por vista para percentiles
+
+# Caché de pacientes y fichas (core.patient_cache). locmem (por defecto) es
+# por proceso y descarta lo menos usado al pasar MAX_ENTRIES; con varios
+# procesos, OBJECT_CACHE_BACKEND=file lo comparte y los cambios se ven de inmediato.
+def object_cache():
+    config = {
+        'TIMEOUT': env_int('OBJECT_CACHE_TIMEOUT', 300),
+        'OPTIONS': {'MAX_ENTRIES': env_int('OBJECT_CACHE_MAX_ENTRIES', 5000)},
     }
-}
\ No newline at end of file
+    if os.environ.get('OBJECT_CACHE_BACKEND', 'locmem') == 'file':
+        config['BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+        config['LOCATION'] = os.environ.get('OBJECT_CACHE_DIR', BASE_DIR / 'cache' / 'objects')
+    else:
+        config['BACKEND'] = 'django.core.cache.backends.locmem.LocMemCache'
+        config['LOCATION'] = 'objects'
+    return config
+
+
+# Contadores del panel (core.dashboard). Con locmem (por defecto) cada proceso
+# tiene los suyos: lo que invalidan el worker o los comandos se ve en los
+# demás al vencer DASHBOARD_REFRESH_SECONDS, cuando se reconstruyen. Con
+# DASHBOARD_CACHE_BACKEND=file los comparten todos los procesos.
+def dashboard_cache():
+    if os.environ.get('DASHBOARD_CACHE_BACKEND', 'locmem') == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DASHBOARD_CACHE_DIR', BASE_DIR / 'cache' / 'dashboard'),
+            'TIMEOUT': None,
+            'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboard',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    }
+
+
+# Caché por defecto (gráficos), contadores del panel y objetos
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': dashboard_cache(),
+    'objects': object_cache(),
+}
+DASHBOARD_FOLLOW_UP_DAYS = 365  # control anual para pacientes con pérdida
+# Vida de los contadores: al vencer se reconstruyen desde la base, así se
+# recogen los cambios hechos en otros procesos y sin señales (bulk_create)
+DASHBOARD_REFRESH_SECONDS = env_int('DASHBOARD_REFRESH_SECONDS', 300)
+
+# Archivo de registros clínicos antiguos (core.archive, comando archive_records):
+# en la tabla ArchivedRecord ('table') o en archivos JSONL comprimidos ('jsonl')
+ARCHIVE_AFTER_YEARS = env_int('ARCHIVE_AFTER_YEARS', 5)
+ARCHIVE_BACKEND = os.environ.get('ARCHIVE_BACKEND', 'table')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', BASE_DIR / 'archive')
+
+# Autocompletado de pacientes (core.autocomplete): índice en memoria por proceso
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_AGE = 30             # Cache-Control de cada respuesta (s)
+AUTOCOMPLETE_REFRESH_SECONDS = 600    # recarga: recoge altas hechas en otros procesos
+AUTOCOMPLETE_BACKGROUND_WARM = True   # cargar en un hilo al iniciar / primer uso
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.perf': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
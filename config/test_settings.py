@@ -0,0 +1,22 @@
+# config/test_settings.py — python manage.py test --settings=config.test_settings
+from .settings import *  # noqa: F401,F403
+
+# SQLite en memoria; una segunda base SQLite hace de réplica (core.routers).
+# Las lecturas van a la réplica solo en los tests que activan REPLICA_READS.
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+}
+REPLICA_READS = False
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Los recursos de static/vendor/ no se descargan en CI (sin red): el CDN basta
+VENDOR_ASSETS_REQUIRED = False
+
+# Los tests cargan el índice de autocompletado explícitamente (sin hilos)
+AUTOCOMPLETE_BACKGROUND_WARM = False
+
+# Sin caché de pacientes: los tests crean datos sin señales (bulk_create) y
+# reutilizan pks. PatientCacheTests lo activa con override_settings.
+CACHES = {**CACHES, 'objects': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}  # noqa: F405
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Índice de autocompletado de pacientes: se carga en segundo plano al iniciar
+from core import autocomplete  # noqa: E402
+
+autocomplete.warm_async()
@@ -1,20 +1,70 @@
 from django.contrib import admin
-from .models import Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL
+from django.utils import timezone
+from . import audit, classification
+from .forms import PatientForm, ThresholdForm
+from .models import Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL, Job, AuditEntry
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
+    form = PatientForm  # valida el DV y guarda el RUT canónico
     list_display = ("rut", "last_name", "first_name", "birth_date", "sex")
     search_fields = ("rut", "first_name", "last_name", "email")
 
 class ThresholdInline(admin.TabularInline):
     model = Threshold
+    form = ThresholdForm
     extra = 0
 
 @admin.register(Audiogram)
 class AudiogramAdmin(admin.ModelAdmin):
-    list_display = ("patient", "date", "exam_type", "transducer", "masking_used")
+    list_display = ("patient", "date", "exam_type", "transducer", "masking_used", "pta_right", "pta_left", "loss_degree")
+    list_filter = ("loss_degree", "exam_type")
+    readonly_fields = ("pta_right", "pta_left", "pta_binaural", "loss_degree")
     inlines = [ThresholdInline]
 
+    def save_formset(self, request, form, formset, change):
+        # Los trazos no tienen señal de borrado (ver core.audit)
+        for f in formset.deleted_forms:
+            if f.instance.pk:
+                audit.deleted(f.instance)
+        super().save_formset(request, form, formset, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Los Thresholds del inline ya están guardados: sincronizar PTA
+        form.instance.refresh_pta()
+        classification.refresh([form.instance.pk])
+
 admin.site.register(Anamnesis)
 admin.site.register(SpeechAudiometry)
 admin.site.register(LDL)
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    """Historial de cambios (core.audit): solo lectura."""
+    list_display = ("at", "patient_id", "model", "object_id", "action", "user", "origin")
+    list_filter = ("action", "model")
+    search_fields = ("=patient__id", "=patient__rut")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("worker", "heartbeat", "started_at", "finished_at", "error")
+    actions = ["requeue"]
+
+    @admin.action(description="Reencolar trabajos seleccionados")
+    def requeue(self, request, queryset):
+        n = queryset.exclude(status="RUNNING").update(status="QUEUED", attempts=0, run_after=timezone.now(), error="")
+        self.message_user(request, f"{n} trabajos reencolados.")
@@ -0,0 +1,179 @@
+"""
+Analítica longitudinal de umbrales (vigilancia de exposición a ruido).
+
+Los Threshold de un paciente o de una cohorte se cargan con una sola
+consulta en un arreglo NumPy de forma (exámenes, oído, vía, frecuencia),
+con los ejes ordenados según EARS, PATHWAYS y FREQS. Los cambios respecto
+de la línea base, el STS (standard threshold shift) y las pendientes se
+calculan vectorizados, sin recorrer objetos en Python.
+"""
+import numpy as np
+
+from . import codec
+from .models import FREQS, Patient, Threshold
+
+EARS = ("R", "L")
+PATHWAYS = ("AC", "BC")
+STS_FREQS = (2000, 3000, 4000)
+STS_DB = 10.0  # promedio 2/3/4 kHz >= 10 dB respecto de la línea base
+SLOPE_FREQ = 4000
+
+_LEVEL_IDX = [codec.INDEX[f] for f in FREQS]  # columnas de FREQS en Threshold.levels
+_STS_IDX = [FREQS.index(f) for f in STS_FREQS]
+
+
+class ThresholdSeries:
+    """
+    Serie de exámenes ordenada por (paciente, fecha). Todos los arreglos
+    por examen comparten el eje 0; `values` tiene NaN donde no hay dato.
+    """
+
+    def __init__(self, exam_ids, patient_ids, dates, values):
+        self.exam_ids = exam_ids
+        self.patient_ids = patient_ids
+        self.dates = dates
+        self.values = values  # (n, len(EARS), len(PATHWAYS), len(FREQS))
+
+        n = len(exam_ids)
+        new_patient = np.r_[True, patient_ids[1:] != patient_ids[:-1]] if n else np.zeros(0, bool)
+        self.patient_starts = np.flatnonzero(new_patient)
+        self.group = np.cumsum(new_patient) - 1
+        self.baseline_idx = self.patient_starts[self.group]
+        self.last_idx = np.r_[self.patient_starts[1:] - 1, n - 1] if n else np.zeros(0, int)
+
+    def __len__(self):
+        return len(self.exam_ids)
+
+    @property
+    def patients(self):
+        return self.patient_ids[self.patient_starts]
+
+    def years_since_baseline(self):
+        days = (self.dates - self.dates[self.baseline_idx]).astype("timedelta64[D]").astype(float)
+        return days / 365.25
+
+    def shift(self):
+        """dB de cambio de cada examen respecto del primero del paciente."""
+        return self.values - self.values[self.baseline_idx]
+
+    def sts_shift(self):
+        """Promedio del cambio AC en 2/3/4 kHz por examen y oído: (n, oídos)."""
+        return self.shift()[:, :, 0, _STS_IDX].mean(axis=2)
+
+    def sts(self):
+        """True donde el promedio 2/3/4 kHz empeoró >= STS_DB: (n, oídos)."""
+        with np.errstate(invalid="ignore"):
+            return self.sts_shift() >= STS_DB
+
+    def slopes(self):
+        """
+        Pendiente (dB/año) por paciente, oído, vía y frecuencia con mínimos
+        cuadrados agrupados (reduceat); NaN con menos de 2 puntos.
+        """
+        if not len(self):
+            return np.zeros((0,) + self.values.shape[1:])
+        y = self.values
+        mask = ~np.isnan(y)
+        t = np.broadcast_to(self.years_since_baseline()[:, None, None, None], y.shape) * mask
+        y0 = np.where(mask, y, 0.0)
+        starts = self.patient_starts
+        n = np.add.reduceat(mask.astype(float), starts, axis=0)
+        st = np.add.reduceat(t, starts, axis=0)
+        sy = np.add.reduceat(y0, starts, axis=0)
+        stt = np.add.reduceat(t * t, starts, axis=0)
+        sty = np.add.reduceat(t * y0, starts, axis=0)
+        den = n * stt - st * st
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((n >= 2) & (den > 0), (n * sty - st * sy) / den, np.nan)
+
+
+def load_series(thresholds=None, chunk_size=5000):
+    """Carga Threshold (OD/OI) en una ThresholdSeries con una sola consulta."""
+    qs = Threshold.objects.all() if thresholds is None else thresholds
+    rows = list(
+        qs.filter(ear__in=EARS, pathway__in=PATHWAYS)
+        .order_by("audiogram__patient_id", "audiogram__date", "audiogram_id")
+        .values_list("audiogram_id", "audiogram__patient_id", "audiogram__date", "ear", "pathway", "levels")
+        .iterator(chunk_size=chunk_size)
+    )
+    shape_tail = (len(EARS), len(PATHWAYS), len(FREQS))
+    if not rows:
+        empty = np.zeros(0, np.int64)
+        return ThresholdSeries(empty, empty, np.zeros(0, "datetime64[D]"), np.zeros((0,) + shape_tail))
+
+    cols = list(zip(*rows))
+    row_exam = np.asarray(cols[0], dtype=np.int64)
+    new_exam = np.r_[True, row_exam[1:] != row_exam[:-1]]
+    exam_pos = np.cumsum(new_exam) - 1
+    ear_idx = (np.asarray(cols[3]) == EARS[1]).astype(int)
+    path_idx = (np.asarray(cols[4]) == PATHWAYS[1]).astype(int)
+    vals = codec.to_float(codec.stack(cols[5])[:, _LEVEL_IDX])  # NULL_LEVEL -> NaN
+
+    values = np.full((int(exam_pos[-1]) + 1,) + shape_tail, np.nan)
+    values[exam_pos, ear_idx, path_idx] = vals
+    return ThresholdSeries(
+        exam_ids=row_exam[new_exam],
+        patient_ids=np.asarray(cols[1], dtype=np.int64)[new_exam],
+        dates=np.asarray(cols[2], dtype="datetime64[D]")[new_exam],
+        values=values,
+    )
+
+
+def _round(v):
+    return None if np.isnan(v) else round(float(v), 1)
+
+
+def patient_trend(patient):
+    """Resumen de tendencia para la ficha; None si hay menos de 2 exámenes."""
+    series = load_series(Threshold.objects.filter(audiogram__patient=patient))
+    if len(series) < 2:
+        return None
+    last = series.last_idx[0]
+    shift = series.sts_shift()[last]
+    sts = series.sts()
+    slope = series.slopes()[0, :, 0, FREQS.index(SLOPE_FREQ)]
+    return {
+        "exams": len(series),
+        "baseline_date": series.dates[0].item(),
+        "last_date": series.dates[last].item(),
+        "shift_right": _round(shift[0]),
+        "shift_left": _round(shift[1]),
+        "sts_right": bool(sts[:, 0].any()),
+        "sts_left": bool(sts[:, 1].any()),
+        "slope_right": _round(slope[0]),
+        "slope_left": _round(slope[1]),
+    }
+
+
+def cohort_sts_report(patients=None):
+    """
+    Una fila por paciente de la cohorte (por defecto: expuestos a ruido
+    según Anamnesis) con cambio 2/3/4 kHz al último examen, STS y pendiente
+    a 4 kHz. Todo el cálculo es vectorizado sobre la cohorte completa.
+    """
+    if patients is None:
+        patients = Patient.objects.filter(anamneses__noise_exposure=True)
+    series = load_series(Threshold.objects.filter(audiogram__patient__in=patients.values("pk")))
+    if not len(series):
+        return []
+
+    shift = series.sts_shift()[series.last_idx]
+    sts_any = np.logical_or.reduceat(series.sts(), series.patient_starts, axis=0)
+    slope = series.slopes()[:, :, 0, FREQS.index(SLOPE_FREQ)]
+    counts = np.diff(np.r_[series.patient_starts, len(series)])
+
+    people = Patient.objects.in_bulk(series.patients.tolist())
+    rows = []
+    for i, pid in enumerate(series.patients.tolist()):
+        rows.append({
+            "patient": people.get(pid),
+            "exams": int(counts[i]),
+            "baseline_date": series.dates[series.patient_starts[i]].item(),
+            "last_date": series.dates[series.last_idx[i]].item(),
+            "shift_right": _round(shift[i, 0]),
+            "shift_left": _round(shift[i, 1]),
+            "sts": bool(sts_any[i].any()),
+            "slope_right": _round(slope[i, 0]),
+            "slope_left": _round(slope[i, 1]),
+        })
+    return rows
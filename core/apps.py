@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Conecta señales: contadores del panel, resumen por paciente, índice de
+        # autocompletado, caché de pacientes, historial de cambios y recolector de consultas;
+        # registra el check de recursos locales (core.vendor)
+        from . import audit, autocomplete, dashboard, middleware, patient_cache, summaries, vendor  # noqa: F401
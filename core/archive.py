@@ -0,0 +1,270 @@
+"""
+Archivo de registros clínicos antiguos.
+
+archive_all() saca de las tablas activas (Anamnesis, Audiogram con sus
+trazos y clasificación, SpeechAudiometry, LDL) los registros con fecha
+anterior al horizonte (ARCHIVE_AFTER_YEARS). Cada uno queda como una fila
+de ArchivedRecord con el registro serializado en `payload`. Con
+ARCHIVE_BACKEND=jsonl va como una línea de <ARCHIVE_DIR>/<tipo>/<año>.jsonl.gz
+y en la base solo queda el índice. Por paciente nunca se archiva el último
+registro de cada sección ni la audiometría basal: la ficha, el resumen, la
+prescripción y el STS siguen viendo lo mismo. Así las tablas activas crecen
+con la actividad reciente y no con los años de operación.
+
+Un registro archivado que se pide por pk (get_or_archived, vistas de
+audiometría) se lee del archivo sin moverlo: un GET no escribe. Vuelve a su
+tabla con el mismo pk solo al restaurarlo desde la ficha (restore, un POST).
+Si sigue siendo antiguo, la siguiente pasada lo vuelve a archivar.
+
+Retención con ARCHIVE_BACKEND=jsonl: los archivos solo crecen. Al restaurar
+un registro o borrar un paciente (sus ArchivedRecord se van en cascada) las
+líneas quedan en el archivo, sin índice, hasta que compact() las quita
+(`manage.py archive_records --compact`, sin otro archivado en curso).
+"""
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.http import Http404
+
+from . import audit, classification, dashboard, patient_cache, summaries
+from .models import LDL, Anamnesis, ArchivedRecord, Audiogram, SpeechAudiometry, Threshold
+
+MODELS = {"anamnesis": Anamnesis, "audiogram": Audiogram, "speech": SpeechAudiometry, "ldl": LDL}
+KINDS = {model: kind for kind, model in MODELS.items()}
+CHUNK_SIZE = 1000
+
+
+def horizon(years=None):
+    """Fecha desde la que los registros siguen activos."""
+    years = settings.ARCHIVE_AFTER_YEARS if years is None else years
+    today = date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29 de febrero
+        return today.replace(year=today.year - years, day=28)
+
+
+def _first(model, *ordering):
+    return Subquery(model.objects.filter(patient=OuterRef("patient")).order_by(*ordering).values("pk")[:1])
+
+
+def candidates(kind, before):
+    """Registros de `kind` anteriores a `before`, salvo el último de cada paciente (y la audiometría basal)."""
+    model = MODELS[kind]
+    qs = model.objects.filter(date__lt=before).annotate(latest=_first(model, "-date", "-id")).exclude(pk=F("latest"))
+    if model is Audiogram:
+        qs = qs.annotate(baseline=_first(model, "date", "id")).exclude(pk=F("baseline"))
+    return qs
+
+
+# --------- Archivos JSONL ---------
+def _path(name):
+    return Path(settings.ARCHIVE_DIR) / name
+
+
+def _write_lines(kind, rows, written):
+    """
+    Agrega los payloads a <tipo>/<año>.jsonl.gz (un miembro gzip por lote) y
+    los deja solo en el archivo. Anota en `written` (ruta, tamaño previo)
+    para deshacer la escritura (_undo_lines).
+    """
+    by_file = defaultdict(list)
+    for row in rows:
+        row.file = f"{kind}/{row.date.year}.jsonl.gz"
+        by_file[row.file].append(row)
+    for name, file_rows in by_file.items():
+        path = _path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written.append((path, path.stat().st_size if path.exists() else None))
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(row.payload, cls=DjangoJSONEncoder) + "\n" for row in file_rows)
+        for row in file_rows:
+            row.payload = None
+
+
+def _undo_lines(written):
+    """Quita lo agregado por _write_lines: cada lote es un miembro gzip al final del archivo."""
+    for path, size in written:
+        if size is None:
+            path.unlink(missing_ok=True)
+        else:
+            with open(path, "r+b") as fh:
+                fh.truncate(size)
+
+
+def _read_lines(rows):
+    """{fila: payload} de filas cuyo registro está en un archivo (la última línea de cada pk gana)."""
+    wanted = defaultdict(dict)
+    for row in rows:
+        wanted[row.file][row.source_id] = row
+    found = {}
+    for name, by_id in wanted.items():
+        with gzip.open(_path(name), "rt", encoding="utf-8") as fh:
+            for line in fh:
+                payload = json.loads(line)
+                row = by_id.get(payload["pk"])
+                if row is not None:
+                    found[row] = payload
+    return found
+
+
+# --------- Archivar ---------
+def _archive_chunk(kind, records):
+    model = MODELS[kind]
+    ids = [r.pk for r in records]
+    traces = defaultdict(list)
+    if model is Audiogram:
+        for th in Threshold.objects.filter(audiogram_id__in=ids):
+            traces[th.audiogram_id].append(th)
+    rows = []
+    for record in records:
+        payload = serializers.serialize("python", [record])[0]
+        if model is Audiogram:
+            payload["thresholds"] = serializers.serialize("python", traces[record.pk])
+        rows.append(ArchivedRecord(
+            kind=kind, source_id=record.pk, patient_id=record.patient_id, date=record.date,
+            import_key=getattr(record, "import_key", None) or "", payload=payload,
+        ))
+    written = []
+    try:
+        with transaction.atomic():
+            if settings.ARCHIVE_BACKEND == "jsonl":
+                _write_lines(kind, rows, written)
+            ArchivedRecord.objects.bulk_create(rows)
+            # Las señales de borrado refrescan resumen y caché de cada paciente; archivar no es un cambio clínico
+            with audit.paused():
+                model.objects.filter(pk__in=ids).delete()
+    except BaseException:
+        _undo_lines(written)  # sin líneas huérfanas (sin índice) en los archivos
+        raise
+
+
+def archive_all(years=None, kinds=None, dry_run=False, chunk_size=CHUNK_SIZE, log=None):
+    """Archiva por lotes (pk > último) lo anterior al horizonte; devuelve {tipo: registros}."""
+    before = horizon(years)
+    totals = {}
+    for kind in kinds or MODELS:
+        qs = candidates(kind, before).order_by("pk")
+        if dry_run:
+            totals[kind] = qs.count()
+            continue
+        total, last_pk = 0, 0
+        while True:
+            chunk = list(qs.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            dashboard.invalidate()  # se reconstruye después, sin ajustar contadores por fila
+            _archive_chunk(kind, chunk)
+            total += len(chunk)
+            last_pk = chunk[-1].pk
+            if log:
+                log(f"  {kind}: {total} registros archivados…")
+        totals[kind] = total
+    return totals
+
+
+def compact(names=None):
+    """
+    Reescribe los archivos JSONL (todos, o los `names` relativos a
+    ARCHIVE_DIR) dejando solo la última línea de cada registro que sigue en
+    ArchivedRecord: quita los restaurados y los de pacientes borrados.
+    Devuelve cuántas líneas quitó.
+    """
+    root = Path(settings.ARCHIVE_DIR)
+    if names is None:
+        names = [path.relative_to(root).as_posix() for path in sorted(root.glob("*/*.jsonl.gz"))]
+    dropped = 0
+    for name in names:
+        path = _path(name)
+        indexed = set(ArchivedRecord.objects.filter(file=name).values_list("source_id", flat=True))
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            seen = Counter(json.loads(line)["pk"] for line in fh)
+        removed = sum(seen.values()) - len(indexed & seen.keys())
+        if not removed:
+            continue
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(path, "rt", encoding="utf-8") as src, gzip.open(tmp, "wt", encoding="utf-8") as dst:
+            for line in src:
+                pk = json.loads(line)["pk"]
+                seen[pk] -= 1
+                if pk in indexed and not seen[pk]:  # la última línea de cada pk es la vigente
+                    dst.write(line)
+        os.replace(tmp, path)
+        dropped += removed
+    return dropped
+
+
+# --------- Restaurar ---------
+def _deserialize(payload):
+    return next(serializers.deserialize("python", [payload])).object
+
+
+def _payloads(rows):
+    payloads = {row: row.payload for row in rows if row.payload is not None}
+    payloads.update(_read_lines([row for row in rows if row.payload is None]))
+    return payloads
+
+
+def load(kind, source_id):
+    """El registro archivado como instancia sin guardar (la audiometría con sus trazos); None si no está."""
+    row = ArchivedRecord.objects.filter(kind=kind, source_id=source_id).first()
+    payload = _payloads([row]).get(row) if row else None
+    if payload is None:
+        return None
+    record = _deserialize(payload)
+    record.patient_id = row.patient_id
+    record.archived = row
+    if kind == "audiogram":
+        # Como un prefetch_related: ag.thresholds.all() no consulta la tabla activa
+        traces = record.thresholds.all()
+        traces._result_cache = [_deserialize(t) for t in payload.get("thresholds", ())]
+        traces._prefetch_done = True
+        record._prefetched_objects_cache = {"thresholds": traces}
+    return record
+
+
+def restore(kind, source_ids, patient_id=None):
+    """Devuelve a su tabla (mismo pk) los registros archivados indicados; devuelve cuántos."""
+    rows = ArchivedRecord.objects.filter(kind=kind, source_id__in=list(source_ids))
+    if patient_id is not None:
+        rows = rows.filter(patient_id=patient_id)
+    rows = list(rows)
+    if not rows:
+        return 0
+    payloads = _payloads(rows)
+    records = [_deserialize(payloads[row]) for row in rows]
+    for row, record in zip(rows, records):
+        record.patient_id = row.patient_id  # el payload conserva la ficha original (ver core.dedup)
+    traces = {row.source_id: [_deserialize(t) for t in payloads[row].get("thresholds", ())] for row in rows}
+    with transaction.atomic():
+        MODELS[kind].objects.bulk_create(records)
+        if kind == "audiogram":
+            Threshold.objects.bulk_create([th for ths in traces.values() for th in ths])
+            classification.store((ag, traces[ag.pk]) for ag in records)
+        ArchivedRecord.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    patients = {row.patient_id for row in rows}
+    summaries.refresh(patients)  # bulk_create no emite señales
+    patient_cache.bump(patients)
+    dashboard.invalidate()
+    return len(records)
+
+
+def get_or_archived(queryset, pk):
+    """Como get_object_or_404, pero si el registro está archivado lo lee del archivo (ver load)."""
+    model = queryset.model
+    try:
+        return queryset.get(pk=pk)
+    except model.DoesNotExist:
+        record = load(KINDS[model], pk)
+    if record is None:
+        raise Http404("Registro no encontrado.")
+    return record
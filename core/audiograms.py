@@ -0,0 +1,62 @@
+"""
+Guardado de una audiometría (cabecera + trazos) en una sola transacción.
+
+El PTA y el grado se calculan en memoria antes de escribir. Así la cabecera
+se guarda una vez y todos los trazos van en un único upsert
+(bulk_create con update_conflicts sobre la clave única audiogram/ear/pathway).
+Las sentencias son las mismas con 1 o con 5 trazos, y un error no deja
+exámenes con trazos a medias. La clasificación (core.classification) se
+guarda en la misma transacción, a partir de los mismos trazos. El upsert
+no emite señales: los cambios de cada trazo, y los trazos que se borran, se
+registran en core.audit antes de escribirlos.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import audit, classification
+from .bulk import upsert_options
+from .models import Threshold
+
+UNIQUE_FIELDS = ["audiogram", "ear", "pathway"]
+UPDATE_FIELDS = ["symbol", "levels"]
+
+
+def save_audiogram(a_form, t_formset):
+    """
+    Guarda un AudiogramForm y su ThresholdFormSet ya validados (alta o
+    edición) y devuelve la audiometría. Las filas extra sin cambios se
+    ignoran. En una edición se borran los trazos cuyo (oído, vía) ya no
+    viene en el formulario.
+    """
+    ag = a_form.save(commit=False)
+    editing = ag.pk is not None
+    traces = [f.save(commit=False) for f in t_formset.forms if f.instance.pk or f.has_changed()]
+
+    ag.ac_thresholds = [t for t in traces if t.pathway == "AC"]
+    for name, value in ag.compute_pta().items():
+        setattr(ag, name, value)
+
+    with transaction.atomic():
+        ag.save()
+        if editing:
+            stale = ag.thresholds.all()
+            if traces:
+                stale = stale.exclude(reduce(or_, (Q(ear=t.ear, pathway=t.pathway) for t in traces)))
+            stale = list(stale)
+            # Los trazos no tienen señal de borrado (ver core.audit), como en el inline del admin
+            for th in stale:
+                audit.deleted(th)
+            if stale:
+                Threshold.objects.filter(pk__in=[th.pk for th in stale]).delete()
+        for th in traces:
+            th.audiogram = ag
+            # Un trazo que cambia de (oído, vía) queda como modificación de su pk original
+            audit.saved(th, created=th.pk is None)
+            th.pk = None  # el upsert empareja por (audiogram, ear, pathway), no por pk
+        if traces:
+            Threshold.objects.bulk_create(traces, **upsert_options(Threshold, UNIQUE_FIELDS, UPDATE_FIELDS))
+        classification.store([(ag, traces)])
+    return ag
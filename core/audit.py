@@ -0,0 +1,242 @@
+"""
+Historial de cambios de datos clínicos: Patient, Audiogram y Threshold.
+
+Cada alta, modificación o borrado deja un AuditEntry con solo los campos que
+cambiaron ({campo: [antes, después]}; los umbrales, por frecuencia). Los
+valores anteriores son los que se leyeron del registro
+(AuditedModel.from_db), así que guardar no agrega lecturas.
+
+Las entradas se arman en memoria y pasan al lote recién al confirmarse la
+transacción (un rollback no deja rastro). El lote se escribe con un solo
+bulk_create:
+- en un request, al final (AuditMiddleware), con el usuario y la vista;
+- en un trabajo de core.jobs, al terminarlo (batch());
+- fuera de ambos (shell, comandos), cada entrada al confirmarse.
+
+No quedan en el historial las escrituras por lote sin señales (importación,
+fusión de RUT, backfills) ni el archivo de registros antiguos (paused()).
+Los trazos que save_audiogram escribe con un upsert se registran a mano; los
+trazos no tienen señal de borrado (un borrado en cascada los leería uno a
+uno): el borrado de una audiometría cubre sus trazos y el inline del admin
+registra los suyos.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .codec import ThresholdVector
+from .models import Audiogram, AuditEntry, Patient, Threshold
+
+logger = logging.getLogger("core.audit")
+
+_batch = contextvars.ContextVar("audit_batch", default=None)
+_paused = contextvars.ContextVar("audit_paused", default=False)
+
+
+# --------- Escritura por lotes ---------
+def _write(entries):
+    try:
+        AuditEntry.objects.bulk_create(entries)
+    except Exception:
+        # El cambio clínico ya está confirmado: un fallo del historial no lo revierte
+        logger.exception("No se pudieron escribir %d entradas de auditoría.", len(entries))
+
+
+class AuditBatch:
+    """Entradas confirmadas que se escriben juntas al cerrar el lote."""
+
+    def __init__(self, user_id=None, origin=""):
+        self.entries = []
+        self.user_id = user_id
+        self.origin = origin
+        self.closed = False
+
+    def add(self, entry):
+        if self.closed:  # transacción confirmada después del cierre: va sola
+            self._write([entry])
+        else:
+            self.entries.append(entry)
+
+    def close(self):
+        self.closed = True
+        entries, self.entries = self.entries, []
+        if entries:
+            self._write(entries)
+
+    def _write(self, entries):
+        for entry in entries:
+            entry.user_id = entry.user_id or self.user_id
+            entry.origin = entry.origin or self.origin[:100]
+        _write(entries)
+
+
+def _commit(batch, entry):
+    if batch is None:
+        _write([entry])
+    else:
+        batch.add(entry)
+
+
+@contextmanager
+def batch(user_id=None, origin=""):
+    """Agrupa las entradas confirmadas dentro del bloque y las escribe al salir."""
+    current = AuditBatch(user_id, origin)
+    token = _batch.set(current)
+    try:
+        yield current
+    finally:
+        _batch.reset(token)
+        current.close()
+
+
+@contextmanager
+def paused():
+    """Sin historial dentro del bloque (p. ej. core.archive: el registro no cambia, se mueve)."""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+# --------- Diferencias ---------
+def _values(instance):
+    values = {name: getattr(instance, name) for name in instance.AUDIT_FIELDS}
+    if isinstance(values.get("levels"), ThresholdVector):
+        values["levels"] = values["levels"].to_bytes()  # copia: el vector se modifica en el lugar
+    return values
+
+
+def _expand(values):
+    """levels (bytes) -> f_<freq>: el historial muestra qué umbral cambió."""
+    values = dict(values)
+    levels = values.pop("levels", None)
+    if levels is not None:
+        values.update((f"f_{freq}", level) for freq, level in ThresholdVector(levels).items())
+    return values
+
+
+def diff(old, new):
+    """{campo: [antes, después]} de los campos que difieren; vacío y None cuentan igual."""
+    old, new = _expand(old), _expand(new)
+    changes = {}
+    for name in dict.fromkeys([*old, *new]):
+        before, after = old.get(name), new.get(name)
+        if before != after and not (before in (None, "") and after in (None, "")):
+            changes[name] = [before, after]
+    return changes
+
+
+def _patient_id(instance):
+    if isinstance(instance, Patient):
+        return instance.pk
+    if isinstance(instance, Audiogram):
+        return instance.patient_id
+    if Threshold.audiogram.is_cached(instance):
+        return instance.audiogram.patient_id
+    return Audiogram.objects.filter(pk=instance.audiogram_id).values_list("patient_id", flat=True).first()
+
+
+def record(instance, action, changes):
+    """Deja la entrada lista para escribirse cuando se confirme la transacción."""
+    if _paused.get() or (action == "update" and not changes):
+        return
+    entry = AuditEntry(
+        patient_id=_patient_id(instance), model=instance._meta.model_name,
+        object_id=instance.pk, action=action, changes=changes,
+    )
+    transaction.on_commit(partial(_commit, _batch.get(), entry))
+
+
+def saved(instance, created):
+    """Registra el alta, o lo que cambió desde que se leyó (o guardó) la instancia."""
+    new = _values(instance)
+    old = {} if created else getattr(instance, "_audit_loaded", {})
+    record(instance, "create" if created else "update", diff(old, new))
+    instance._audit_loaded = new
+
+
+def deleted(instance):
+    record(instance, "delete", diff(getattr(instance, "_audit_loaded", None) or _values(instance), {}))
+
+
+def history(patient_id):
+    """Cambios de un paciente, del más reciente al más antiguo (un rango de audit_patient_at_idx)."""
+    return AuditEntry.objects.filter(patient_id=patient_id).order_by("-at", "-id")
+
+
+# --------- Señales ---------
+@receiver(pre_save, sender=Patient)
+@receiver(pre_save, sender=Audiogram)
+@receiver(pre_save, sender=Threshold)
+def _before_save(sender, instance, raw=False, **kwargs):
+    # Instancia armada a mano (no vino de from_db): única lectura, como en core.dashboard
+    if raw or instance._state.adding or hasattr(instance, "_audit_loaded"):
+        return
+    row = sender.objects.filter(pk=instance.pk).values(*sender.AUDIT_FIELDS).first() or {}
+    if isinstance(row.get("levels"), ThresholdVector):
+        row["levels"] = row["levels"].to_bytes()
+    instance._audit_loaded = row
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Audiogram)
+@receiver(post_save, sender=Threshold)
+def _on_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        saved(instance, created)
+
+
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Audiogram)
+def _on_deleted(sender, instance, **kwargs):
+    deleted(instance)
+
+
+# --------- Middleware ---------
+class AuditMiddleware:
+    """Un lote por request: sus entradas se escriben al final, con usuario y vista."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        current = AuditBatch()
+        token = _batch.set(current)
+        try:
+            return self.get_response(request)
+        finally:
+            _batch.reset(token)
+            self._close(request, current)
+
+    async def __acall__(self, request):
+        current = AuditBatch()
+        token = _batch.set(current)
+        try:
+            return await self.get_response(request)
+        finally:
+            _batch.reset(token)
+            if current.entries:
+                await sync_to_async(self._close)(request, current)
+            current.closed = True
+
+    def _close(self, request, current):
+        if current.entries:  # sin cambios no se toca request.user (sesión)
+            user = getattr(request, "user", None)
+            current.user_id = user.pk if user is not None and user.is_authenticated else None
+            match = getattr(request, "resolver_match", None)
+            current.origin = match.view_name if match else request.path
+        current.close()
@@ -0,0 +1,192 @@
+"""
+Autocompletado de pacientes (RUT o apellidos/nombres) desde un índice en
+memoria del proceso.
+
+El índice son dos listas ordenadas: (RUT normalizado, pk) y (palabra,
+search_name, pk) por cada palabra de search_name. Un prefijo se resuelve con
+bisect, sin tocar la base, y se leen solo las primeras entradas del rango:
+el costo depende del límite y no del total de pacientes. Con varias
+palabras se recorre el rango más chico y se exige que el resto calce por
+prefijo con alguna palabra del paciente (misma semántica que
+core.search.search_patients). Orden: palabra que calza y luego nombre.
+
+- Se carga completo con warm() (al iniciar el servidor, ver config/wsgi.py
+  y config/asgi.py, o en segundo plano al primer uso).
+- Las señales de Patient lo mantienen al día en este proceso. Los cambios
+  hechos en otros procesos se ven al recargarlo, cada
+  AUTOCOMPLETE_REFRESH_SECONDS.
+- Mientras está frío, search() responde con consultas indexadas a la base.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Patient
+from .normalize import fold_text, looks_like_rut, normalize_rut
+from .search import MAX_TOKENS, search_patients
+
+MIN_CHARS = 2
+FIELDS = ("pk", "rut", "rut_search", "search_name", "last_name", "first_name")
+_END = "\uffff"  # cota superior de cualquier texto normalizado
+
+Entry = namedtuple("Entry", "rut rut_search search_name label")
+
+
+def _entry(rut, rut_search, search_name, last_name, first_name):
+    return Entry(rut, rut_search, search_name, f"{last_name}, {first_name}")
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ruts = []     # [(rut_search, pk)] ordenada
+        self.words = []    # [(palabra, search_name, pk)] ordenada
+        self.entries = {}  # pk -> Entry
+        self.loaded_at = None
+
+    @property
+    def ready(self):
+        return self.loaded_at is not None
+
+    def is_stale(self):
+        return self.ready and time.monotonic() - self.loaded_at > settings.AUTOCOMPLETE_REFRESH_SECONDS
+
+    def load(self, rows):
+        """Reemplaza el contenido con filas FIELDS (se arma fuera del lock)."""
+        entries = {pk: _entry(*values) for pk, *values in rows}
+        ruts = sorted((e.rut_search, pk) for pk, e in entries.items() if e.rut_search)
+        words = sorted((w, e.search_name, pk) for pk, e in entries.items() for w in set(e.search_name.split()))
+        with self._lock:
+            self.ruts, self.words, self.entries = ruts, words, entries
+            self.loaded_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self.ruts, self.words, self.entries = [], [], {}
+            self.loaded_at = None
+
+    def _discard(self, pk):
+        old = self.entries.pop(pk, None)
+        if old is None:
+            return
+        keys = [(self.ruts, (old.rut_search, pk))] if old.rut_search else []
+        keys += [(self.words, (w, old.search_name, pk)) for w in set(old.search_name.split())]
+        for array, key in keys:
+            i = bisect_left(array, key)
+            if i < len(array) and array[i] == key:
+                del array[i]
+
+    def put(self, pk, *values):
+        entry = _entry(*values)
+        with self._lock:
+            self._discard(pk)
+            self.entries[pk] = entry
+            if entry.rut_search:
+                insort(self.ruts, (entry.rut_search, pk))
+            for w in set(entry.search_name.split()):
+                insort(self.words, (w, entry.search_name, pk))
+
+    def remove(self, pk):
+        with self._lock:
+            self._discard(pk)
+
+    @staticmethod
+    def _range(array, prefix):
+        return bisect_left(array, (prefix,)), bisect_left(array, (prefix + _END,))
+
+    def search(self, q, limit):
+        """[(pk, Entry)] de los primeros `limit` que calzan con `q`."""
+        with self._lock:
+            if looks_like_rut(q):
+                lo, hi = self._range(self.ruts, normalize_rut(q))
+                return [(pk, self.entries[pk]) for _, pk in self.ruts[lo:min(hi, lo + limit)]]
+
+            tokens = fold_text(q).split()[:MAX_TOKENS]
+            if not tokens:
+                return []
+            ranges = [self._range(self.words, tok) for tok in tokens]
+            lead = min(range(len(tokens)), key=lambda i: ranges[i][1] - ranges[i][0])
+            rest = tokens[:lead] + tokens[lead + 1:]
+            found, seen = [], set()
+            words_index = self.words
+            for i in range(*ranges[lead]):
+                pk = words_index[i][2]
+                if pk in seen:  # dos palabras del mismo paciente en el rango
+                    continue
+                seen.add(pk)
+                words = self.entries[pk].search_name.split()
+                if all(any(w.startswith(tok) for w in words) for tok in rest):
+                    found.append((pk, self.entries[pk]))
+                    if len(found) == limit:
+                        break
+            return found
+
+
+index = PrefixIndex()
+_warming = threading.Lock()
+logger = logging.getLogger("core.autocomplete")
+
+
+def warm():
+    """Carga el índice completo desde la base (una consulta, por bloques)."""
+    index.load(Patient.objects.order_by().values_list(*FIELDS).iterator(chunk_size=5000))
+
+
+def warm_async():
+    """warm() en un hilo aparte, si no hay otra carga en curso."""
+    if not settings.AUTOCOMPLETE_BACKGROUND_WARM or not _warming.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            warm()
+        except Exception:
+            logger.exception("No se pudo cargar el índice de autocompletado; se sigue usando la base.")
+        finally:
+            connections.close_all()  # conexiones de este hilo
+            _warming.release()
+
+    threading.Thread(target=run, name="autocomplete-warm", daemon=True).start()
+
+
+def _db_search(q, limit):
+    rows = search_patients(q).order_by("last_name", "first_name", "id").values_list(*FIELDS)[:limit]
+    return [(pk, _entry(*values)) for pk, *values in rows]
+
+
+def search(q, limit=None):
+    """
+    ([(pk, Entry)], origen) para `q`; origen es "index" o "db". Con menos de
+    MIN_CHARS caracteres no busca.
+    """
+    q = (q or "").strip()
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    if len(q) < MIN_CHARS:
+        return [], "index"
+    if not index.ready:
+        warm_async()
+        return _db_search(q, limit), "db"
+    if index.is_stale():
+        warm_async()  # se sigue respondiendo con el índice actual
+    return index.search(q, limit), "index"
+
+
+@receiver(post_save, sender=Patient)
+def _on_patient_saved(sender, instance, **kwargs):
+    if index.ready:
+        values = [getattr(instance, name) for name in FIELDS[1:]]
+        transaction.on_commit(lambda: index.put(instance.pk, *values))
+
+
+@receiver(post_delete, sender=Patient)
+def _on_patient_deleted(sender, instance, **kwargs):
+    if index.ready:
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk))
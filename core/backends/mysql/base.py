@@ -0,0 +1,124 @@
+"""
+Backend MySQL con pool de conexiones por proceso.
+
+Django abre una conexión por hilo. Con CONN_MAX_AGE=0 la cierra al final
+de cada request y con CONN_MAX_AGE>0 la conserva en ese hilo. Bajo ASGI
+cada request corre en su propio hilo, así que ninguna de las dos evita
+reconectar. Con este backend close() devuelve la conexión a un pool del
+proceso, y la siguiente apertura, desde cualquier hilo, la reutiliza.
+
+    DATABASES["default"] = {
+        "ENGINE": "core.backends.mysql",
+        "CONN_MAX_AGE": 0,                        # devolver al pool en cada request
+        "POOL": {"MAX_SIZE": 10, "RECYCLE": 300},  # conexiones ociosas / segundos de vida
+        ...
+    }
+"""
+import os
+import threading
+import time
+from functools import partial
+
+from django.db.backends.mysql import base
+
+DEFAULT_MAX_SIZE = 10
+DEFAULT_RECYCLE = 300
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Conexiones DB-API ociosas, reutilizables desde cualquier hilo."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, recycle=DEFAULT_RECYCLE):
+        self.max_size = max_size
+        self.recycle = recycle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _usable(self, raw):
+        # Conexiones heredadas de otro proceso (fork) no se reutilizan ni se cierran
+        return raw._pool_pid == os.getpid() and time.monotonic() - raw._pool_opened < self.recycle
+
+    def acquire(self, connect, health_check=False):
+        while True:
+            with self._lock:
+                raw = self._idle.pop() if self._idle else None
+            if raw is None:
+                raw = connect()
+                raw._pool_pid, raw._pool_opened = os.getpid(), time.monotonic()
+                return raw
+            if self._usable(raw) and (not health_check or _alive(raw)):
+                return raw
+            _discard(raw)
+
+    def release(self, raw):
+        if self._usable(raw) and _rollback(raw):
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append(raw)
+                    return
+        _discard(raw)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            _discard(raw)
+
+    @property
+    def size(self):
+        return len(self._idle)
+
+
+def _alive(raw):
+    try:
+        raw.ping()
+        return True
+    except Exception:
+        return False
+
+
+def _rollback(raw):
+    # Nada de una transacción a medias debe pasar al siguiente usuario
+    try:
+        raw.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _discard(raw):
+    if getattr(raw, "_pool_pid", None) != os.getpid():
+        return  # el socket es del proceso padre
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+def get_pool(alias, settings_dict):
+    # Por base destino: los tests cambian NAME de la misma alias a test_*
+    key = (alias, settings_dict["HOST"], settings_dict["PORT"], settings_dict["USER"], settings_dict["NAME"])
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict.get("POOL") or {}
+            _pools[key] = ConnectionPool(
+                options.get("MAX_SIZE", DEFAULT_MAX_SIZE), options.get("RECYCLE", DEFAULT_RECYCLE),
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        return self.pool.acquire(connect, self.settings_dict["CONN_HEALTH_CHECKS"])
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
@@ -0,0 +1,254 @@
+"""
+Benchmarks de las vistas principales sobre datos sintéticos.
+
+Para cada escala (n.º de pacientes) se regenera la base de prueba con
+core.synthetic y se mide cada caso con el cliente de pruebas de Django:
+latencia (mediana y p95) y cantidad de consultas. Los resultados se
+comparan con una línea base guardada en JSON.
+
+load_test() mide además throughput bajo carga concurrente de las vistas de
+lectura, sirviéndolas por los dos caminos de despliegue: WSGIHandler con un
+pool de hilos (como gunicorn gthread) y ASGIHandler con N clientes en un
+mismo event loop (como uvicorn). Se llama a los handlers en proceso, sin
+red, así que se compara solo el costo de Django + base de datos.
+"""
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .forms import THRESHOLD_INITIAL
+from .models import LDL, Anamnesis, Audiogram, Patient, SpeechAudiometry, Threshold
+from .synthetic import generate
+
+DEFAULT_SCALES = (1_000, 10_000, 100_000)
+LATENCY_TOLERANCE = 1.5  # se permite hasta 1.5× la mediana de la línea base
+QUERY_TOLERANCE = 0      # las consultas no pueden aumentar
+
+
+def _audiogram_post(patient):
+    data = {
+        "date": "2024-05-02", "exam_type": "TONAL", "transducer": "INSERT", "comments": "",
+        "form-TOTAL_FORMS": str(len(THRESHOLD_INITIAL)), "form-INITIAL_FORMS": "0",
+        "form-MIN_NUM_FORMS": "0", "form-MAX_NUM_FORMS": "1000",
+    }
+    for i, row in enumerate(THRESHOLD_INITIAL):
+        for key, value in row.items():
+            data[f"form-{i}-{key}"] = value
+        for f, db in ((500, 20), (1000, 25), (2000, 30), (4000, 45)):
+            data[f"form-{i}-f_{f}"] = str(db)
+    return data
+
+
+def cases(patient):
+    """(nombre, método, url, datos) de cada vista medida."""
+    surname = patient.last_name.split()[0][:4]
+    return [
+        ("home", "get", reverse("home"), None),
+        ("patient_list", "get", reverse("patient_list"), None),
+        ("patient_list_search", "get", reverse("patient_list"), {"q": surname}),
+        ("patient_detail", "get", reverse("patient_detail", args=[patient.pk]), None),
+        ("audiogram_create_post", "post", reverse("audiogram_create", args=[patient.pk]), _audiogram_post(patient)),
+    ]
+
+
+def reset_data():
+    for model in (Threshold, Audiogram, Anamnesis, SpeechAudiometry, LDL, Patient):
+        model.objects.all().delete()
+
+
+def measure(client, method, url, data, repeat):
+    timings, queries = [], 0
+    getattr(client, method)(url, data)  # calentamiento
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{url} respondió {response.status_code}")
+        queries = max(queries, len(ctx.captured_queries))
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "queries": queries,
+    }
+
+
+def run(scales=DEFAULT_SCALES, repeat=20, seed=0, log=print):
+    """Devuelve {escala: {caso: métricas}}."""
+    user, _ = get_user_model().objects.get_or_create(username="benchmark", defaults={"is_staff": True})
+    client = Client()
+    client.force_login(user)
+    results = {}
+    for scale in scales:
+        log(f"Escala {scale}: generando datos…")
+        reset_data()
+        generate(scale, seed=seed, batch_size=min(scale, 2000))
+        # Paciente con más historia: peor caso para la ficha
+        patient = Patient.objects.annotate(n=Count("audiograms")).order_by("-n", "pk").first()
+        results[str(scale)] = {}
+        for name, method, url, data in cases(patient):
+            metrics = measure(client, method, url, data, repeat)
+            results[str(scale)][name] = metrics
+            log(f"  {name:<24} {metrics['median_ms']:>8.2f} ms  p95 {metrics['p95_ms']:>8.2f} ms  {metrics['queries']:>3} queries")
+    return results
+
+
+def compare(results, baseline, latency_tolerance=LATENCY_TOLERANCE, query_tolerance=QUERY_TOLERANCE):
+    """Lista de regresiones (texto) de `results` respecto de `baseline`."""
+    problems = []
+    for scale, scale_cases in results.items():
+        for name, metrics in scale_cases.items():
+            ref = baseline.get(scale, {}).get(name)
+            if not ref:
+                continue
+            if metrics["queries"] > ref["queries"] + query_tolerance:
+                problems.append(f"{scale}/{name}: {metrics['queries']} queries (base {ref['queries']})")
+            if metrics["median_ms"] > ref["median_ms"] * latency_tolerance:
+                problems.append(f"{scale}/{name}: {metrics['median_ms']} ms (base {ref['median_ms']} ms)")
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+# --------- Carga concurrente: WSGI vs ASGI ---------
+LOAD_VIEWS = ("home", "patient_list", "patient_detail")
+
+
+def _load_paths(patient):
+    return [url for name, method, url, data in cases(patient) if name in LOAD_VIEWS and method == "get"]
+
+
+def _session_cookie(client):
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+def _wsgi_environ(path, cookie):
+    return {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver", "HTTP_COOKIE": cookie, "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+    }
+
+
+def _asgi_scope(path, cookie):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+
+def _load_metrics(timings, elapsed, errors):
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "rps": round(len(timings) / elapsed, 1) if elapsed else None,
+        "median_ms": round(statistics.median(timings), 2) if timings else None,
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2) if timings else None,
+        "errors": errors,
+    }
+
+
+def wsgi_load(paths, cookie, concurrency, total):
+    handler = WSGIHandler()
+    statuses = []
+
+    def one(i):
+        environ = _wsgi_environ(paths[i % len(paths)], cookie)
+        start = time.perf_counter()
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b"".join(response)
+        response.close()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(concurrency)))  # calentamiento
+        statuses.clear()
+        start = time.perf_counter()
+        timings = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+    return _load_metrics(timings, elapsed, sum(not s.startswith("200") for s in statuses))
+
+
+async def _asgi_load(paths, cookie, concurrency, total):
+    handler = ASGIHandler()
+    timings, errors = [], 0
+    queue = list(range(total))
+
+    async def one(i):
+        nonlocal errors
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        start = time.perf_counter()
+        await handler(_asgi_scope(paths[i % len(paths)], cookie), receive, send)
+        elapsed = (time.perf_counter() - start) * 1000
+        if sent[0].get("status") != 200:
+            errors += 1
+        return elapsed
+
+    async def client():
+        while queue:
+            timings.append(await one(queue.pop()))
+
+    await asyncio.gather(*(one(i) for i in range(concurrency)))  # calentamiento
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return _load_metrics(timings, time.perf_counter() - start, errors)
+
+
+def asgi_load(paths, cookie, concurrency, total):
+    return asyncio.run(_asgi_load(paths, cookie, concurrency, total))
+
+
+def load_test(scale, concurrency=(1, 8, 32), requests=300, seed=0, log=print):
+    """Devuelve {concurrencia: {"wsgi": métricas, "asgi": métricas}}."""
+    user, _ = get_user_model().objects.get_or_create(username="benchmark", defaults={"is_staff": True})
+    client = Client()
+    client.force_login(user)
+    log(f"Carga {scale} pacientes: generando datos…")
+    reset_data()
+    generate(scale, seed=seed, batch_size=min(scale, 2000))
+    patient = Patient.objects.annotate(n=Count("audiograms")).order_by("-n", "pk").first()
+    paths, cookie = _load_paths(patient), _session_cookie(client)
+    results = {}
+    for n in concurrency:
+        results[str(n)] = {
+            "wsgi": wsgi_load(paths, cookie, n, requests),
+            "asgi": asgi_load(paths, cookie, n, requests),
+        }
+        for mode, m in results[str(n)].items():
+            log(f"  {n:>3} concurrentes {mode}: {m['rps']:>8} req/s  mediana {m['median_ms']} ms  "
+                f"p95 {m['p95_ms']} ms  errores {m['errors']}")
+    return results
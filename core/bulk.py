@@ -0,0 +1,32 @@
+"""Utilidades de inserción masiva."""
+from django.db import connections, router
+
+
+def bulk_create_with_pks(model, objs, key, batch_size=None):
+    """
+    bulk_create que garantiza pks en los objetos devueltos. En MySQL
+    bulk_create no los devuelve, así que se resuelven por `key` (un campo
+    único ya asignado en cada objeto) con una consulta extra.
+    """
+    created = model.objects.bulk_create(objs, batch_size=batch_size)
+    if any(obj.pk is None for obj in created):
+        pks = dict(
+            model.objects.filter(**{f"{key}__in": [getattr(o, key) for o in created]})
+            .values_list(key, "pk")
+        )
+        for obj in created:
+            obj.pk = pks[getattr(obj, key)]
+    return created
+
+
+def upsert_options(model, unique_fields, update_fields):
+    """
+    kwargs de bulk_create para insertar o actualizar por una clave única.
+    MySQL resuelve el conflicto con ON DUPLICATE KEY y no acepta unique_fields.
+    """
+    features = connections[router.db_for_write(model)].features
+    return {
+        "update_conflicts": True,
+        "unique_fields": unique_fields if features.supports_update_conflicts_with_target else None,
+        "update_fields": update_fields,
+    }
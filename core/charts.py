@@ -0,0 +1,128 @@
+"""
+Render del audiograma en el servidor (SVG y, opcionalmente, PNG).
+
+Reproduce el gráfico que dibuja el script de audiogram_form.html: eje de
+frecuencia log2 (250–8k), eje dB HL de -10 a 120 hacia abajo y los símbolos
+O / X / < / > … por trazo. El resultado se guarda en la caché de Django con
+una clave derivada de los valores de los umbrales, así que exámenes con los
+mismos datos comparten la misma entrada.
+
+El PNG requiere `cairosvg` instalado; sin él solo se sirve SVG.
+"""
+import hashlib
+import math
+
+from django.core.cache import cache
+from django.utils.html import escape
+
+from .models import FREQS
+
+try:
+    import cairosvg
+except ImportError:  # dependencia opcional
+    cairosvg = None
+
+MIN_DB, MAX_DB, STEP_DB = -10, 120, 10
+COLORS = {"R": "#dc3545", "L": "#0d6efd", "B": "#14b8a6"}
+DEFAULT_SYMBOL = {"R": "O", "L": "X", "B": "◇"}
+PAD = {"l": 48, "r": 24, "t": 24, "b": 32}
+WIDTH, HEIGHT = 720, 520
+PLOT_W = WIDTH - PAD["l"] - PAD["r"]
+PLOT_H = HEIGHT - PAD["t"] - PAD["b"]
+
+CACHE_PREFIX = "chart"
+CACHE_TIMEOUT = 60 * 60 * 24 * 30  # contenido direccionado: nunca queda obsoleto
+
+
+def x_for_freq(freq):
+    lo, hi = math.log2(FREQS[0]), math.log2(FREQS[-1])
+    return PAD["l"] + (math.log2(freq) - lo) / (hi - lo) * PLOT_W
+
+
+def y_for_db(db):
+    clamped = max(MIN_DB, min(MAX_DB, db))
+    return PAD["t"] + (clamped - MIN_DB) / (MAX_DB - MIN_DB) * PLOT_H
+
+
+def _num(v):
+    return f"{v:.2f}".rstrip("0").rstrip(".")
+
+
+def traces_from_thresholds(thresholds):
+    """[(oído, vía, símbolo, {freq: dB})] ordenado de forma estable."""
+    traces = []
+    for th in thresholds:
+        points = {f: getattr(th, f"f_{f}") for f in FREQS}
+        traces.append((th.ear, th.pathway, th.symbol or DEFAULT_SYMBOL.get(th.ear, "O"), points))
+    return sorted(traces, key=lambda t: (t[0], t[1]))
+
+
+def chart_key(traces):
+    """Hash de contenido: mismos umbrales => misma clave (y misma imagen)."""
+    raw = ";".join(
+        f"{ear}{path}{sym}:" + ",".join("" if points[f] is None else str(points[f]) for f in FREQS)
+        for ear, path, sym, points in traces
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def render_svg(traces):
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+        f'width="{WIDTH}" height="{HEIGHT}" role="img" aria-label="Audiograma">',
+        f'<rect x="0" y="0" width="{WIDTH}" height="{HEIGHT}" fill="#fff" rx="12" ry="12"/>',
+    ]
+    # Grilla vertical por frecuencia
+    for f in FREQS:
+        x = _num(x_for_freq(f))
+        label = f"{f // 1000}k" if f >= 1000 else str(f)
+        out.append(f'<line x1="{x}" y1="{PAD["t"]}" x2="{x}" y2="{HEIGHT - PAD["b"]}" stroke="#e5e7eb"/>')
+        out.append(f'<text x="{x}" y="{HEIGHT - 8}" text-anchor="middle" font-size="12" fill="#334155">{label}</text>')
+    # Grilla horizontal cada 10 dB (0 dB resaltado)
+    for db in range(MIN_DB, MAX_DB + 1, STEP_DB):
+        y = _num(y_for_db(db))
+        stroke, width = ("#94a3b8", "1.5") if db == 0 else ("#e5e7eb", "1")
+        out.append(f'<line x1="{PAD["l"]}" y1="{y}" x2="{WIDTH - PAD["r"]}" y2="{y}" stroke="{stroke}" stroke-width="{width}"/>')
+        out.append(f'<text x="8" y="{_num(y_for_db(db) + 4)}" font-size="11" fill="#64748b">{db}</text>')
+    out.append(f'<rect x="{PAD["l"]}" y="{PAD["t"]}" width="{PLOT_W}" height="{PLOT_H}" fill="none" stroke="#cbd5e1" rx="8" ry="8"/>')
+
+    # Símbolos por trazo
+    out.append("<g>")
+    for ear, path, symbol, points in traces:
+        color = COLORS.get(ear, "#0f172a")
+        size = 18 if symbol in ("Δ", "◇") else 20
+        for f in FREQS:
+            v = points[f]
+            if v is None:
+                continue
+            x, y = x_for_freq(f), y_for_db(v)
+            out.append(
+                f'<text x="{_num(x)}" y="{_num(y)}" text-anchor="middle" dominant-baseline="central" '
+                f'font-size="{size}" fill="{color}" font-family="ui-sans-serif, system-ui">{escape(symbol)}</text>'
+            )
+            if path == "BC":
+                out.append(
+                    f'<line x1="{_num(x - 10)}" y1="{_num(y)}" x2="{_num(x + 10)}" y2="{_num(y)}" '
+                    f'stroke="{color}" stroke-dasharray="3,2"/>'
+                )
+    out.append("</g></svg>")
+    return "".join(out)
+
+
+def render_png(svg):
+    if cairosvg is None:
+        raise RuntimeError("PNG no disponible: instale cairosvg.")
+    return cairosvg.svg2png(bytestring=svg.encode("utf-8"))
+
+
+def get_chart(thresholds, fmt="svg"):
+    """(clave, contenido) desde la caché; renderiza solo si no existe."""
+    traces = traces_from_thresholds(thresholds)
+    key = chart_key(traces)
+    cache_key = f"{CACHE_PREFIX}:{fmt}:{key}"
+    content = cache.get(cache_key)
+    if content is None:
+        svg = render_svg(traces)
+        content = render_png(svg) if fmt == "png" else svg
+        cache.set(cache_key, content, CACHE_TIMEOUT)
+    return key, content
@@ -0,0 +1,205 @@
+"""
+Clasificación automática de audiometrías y banderas de revisión.
+
+classify() recibe los umbrales de muchos exámenes como arreglos NumPy
+(exámenes, oído, frecuencia) y decide todo sin recorrer valores en Python:
+
+    tipo       brecha aéreo-ósea media en 500/1k/2k Hz >= GAP_DB: conductiva
+               (vía ósea normal) o mixta; si no, neurosensorial. PTA normal
+               es "NORMAL"; sin vía ósea el tipo queda vacío.
+    grado      LOSS_DEGREE_LIMITS sobre el PTA ya guardado en Audiogram.
+    muesca     peor umbral aéreo en 3/4 kHz al menos NOTCH_DB sobre el mejor
+               de 1/2 kHz y sobre el mejor de 6/8 kHz (Coles et al.).
+    asimetría  diferencia interaural >= ASYMMETRY_DB en 2 o más frecuencias
+               entre 500 y 4000 Hz.
+    máscara    sin enmascaramiento registrado, la vía aérea supera a la ósea
+               (o aérea) del otro oído en la atenuación interaural del
+               transductor, o hay brecha aéreo-ósea > BC_MASKING_DB.
+
+El resultado se guarda en AudiogramClassification: al guardar o importar
+exámenes se clasifica con los datos ya en memoria (store), y el comando
+classify_audiograms completa por lotes lo que falte o tenga otra VERSION.
+"""
+import numpy as np
+from django.db.models import Count, Q
+
+from . import codec, patient_cache
+from .bulk import upsert_options
+from .models import FREQS, LOSS_DEGREE_LIMITS, Audiogram, AudiogramClassification, Threshold
+
+VERSION = 1  # cambiar al modificar criterios: reclasifica todo con el comando
+EARS = ("R", "L")
+SUFFIXES = ("right", "left")
+CHUNK_SIZE = 2000
+
+NORMAL_LIMIT = LOSS_DEGREE_LIMITS[0][0]
+GAP_DB = 15.0
+NOTCH_DB = 10.0
+ASYMMETRY_DB = 15.0
+ASYMMETRY_MIN_FREQS = 2
+BC_MASKING_DB = 10.0
+# Atenuación interaural mínima (dB) por transductor; en campo libre no aplica
+INTERAURAL_ATTENUATION = {"SUPRA": 40.0, "CIRCUM": 40.0, "INSERT": 55.0}
+
+HEADER_FIELDS = ("pk", "pta_right", "pta_left", "transducer", "masking_used")
+FLAG_FIELDS = ("notch_right", "notch_left", "asymmetry", "masking_missing")
+
+_LEVEL_IDX = [codec.INDEX[f] for f in FREQS]
+
+
+def _idx(*freqs):
+    return [FREQS.index(f) for f in freqs]
+
+
+_GAP_IDX = _idx(500, 1000, 2000)
+_NOTCH_IDX, _NOTCH_LOW, _NOTCH_HIGH = _idx(3000, 4000), _idx(1000, 2000), _idx(6000, 8000)
+_ASYM_IDX = _idx(500, 1000, 2000, 3000, 4000)
+_DEGREE_LIMITS = np.array([limit for limit, _ in LOSS_DEGREE_LIMITS], dtype=float)
+_DEGREES = np.array([degree for _, degree in LOSS_DEGREE_LIMITS] + ["PROFOUND", ""])
+
+
+# --------- Cálculo vectorizado ---------
+def _degree(pta):
+    idx = np.searchsorted(_DEGREE_LIMITS, np.nan_to_num(pta), side="left")
+    return _DEGREES[np.where(np.isnan(pta), len(_DEGREES) - 1, idx)]
+
+
+def classify(ac, bc, pta, transducer, masking_used):
+    """
+    Clasificación de n exámenes. `ac`/`bc`: (n, oídos, FREQS) en dB HL con
+    NaN donde no hay dato; `pta`: (n, oídos); `transducer`: n códigos;
+    `masking_used`: n booleanos. Devuelve {campo de AudiogramClassification: arreglo (n,)}.
+    """
+    ac, bc, pta = (np.asarray(a, dtype=float) for a in (ac, bc, pta))
+    gap = (ac - bc)[..., _GAP_IDX].mean(axis=-1)  # NaN si falta alguna frecuencia
+    bc_pta = bc[..., _GAP_IDX].mean(axis=-1)
+    kind = np.select(
+        [np.isnan(pta), pta <= NORMAL_LIMIT, np.isnan(gap), gap < GAP_DB, bc_pta <= NORMAL_LIMIT],
+        ["", "NORMAL", "", "SENSORINEURAL", "CONDUCTIVE"],
+        default="MIXED",
+    )
+
+    peak = np.fmax.reduce(ac[..., _NOTCH_IDX], axis=-1)
+    notch = (
+        (peak - np.fmin.reduce(ac[..., _NOTCH_LOW], axis=-1) >= NOTCH_DB)
+        & (peak - np.fmin.reduce(ac[..., _NOTCH_HIGH], axis=-1) >= NOTCH_DB)
+    )
+
+    interaural = np.abs(ac[:, 0] - ac[:, 1])[:, _ASYM_IDX]
+    asymmetry = (interaural >= ASYMMETRY_DB).sum(axis=-1) >= ASYMMETRY_MIN_FREQS
+
+    ia = np.array([INTERAURAL_ATTENUATION.get(t, np.nan) for t in transducer], dtype=float)
+    other = np.where(np.isnan(bc[:, ::-1]), ac[:, ::-1], bc[:, ::-1])  # mejor cóclea del otro oído
+    crossover = (ac - other) >= ia[:, None, None]
+    needs_masking = (crossover | (ac - bc > BC_MASKING_DB)).any(axis=(1, 2))
+    masking_missing = needs_masking & ~np.asarray(masking_used, dtype=bool)
+
+    result = {"asymmetry": asymmetry, "masking_missing": masking_missing}
+    degree = _degree(pta)
+    for i, suffix in enumerate(SUFFIXES):
+        result[f"type_{suffix}"] = kind[:, i]
+        result[f"degree_{suffix}"] = degree[:, i]
+        result[f"gap_{suffix}"] = np.round(gap[:, i], 1)
+        result[f"notch_{suffix}"] = notch[:, i]
+    result["flagged"] = np.logical_or.reduce([result[name] for name in FLAG_FIELDS])
+    return result
+
+
+# --------- Persistencia ---------
+UPDATE_FIELDS = ["version", "classified_at", *(
+    f"{name}_{suffix}" for name in ("type", "degree", "gap", "notch") for suffix in SUFFIXES
+), "asymmetry", "masking_missing", "flagged"]
+
+
+def _python(value):
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    return str(value)
+
+
+def _store(headers, traces):
+    """
+    `headers`: filas HEADER_FIELDS; `traces`: (fila, oído, vía, levels).
+    Clasifica todas de una vez y hace un upsert; devuelve cuántas quedaron marcadas.
+    """
+    if not headers:
+        return 0
+    n = len(headers)
+    ac, bc = np.full((n, len(EARS), len(FREQS)), np.nan), np.full((n, len(EARS), len(FREQS)), np.nan)
+    for i, ear, pathway, levels in traces:
+        if ear in EARS:
+            (ac if pathway == "AC" else bc)[i, EARS.index(ear)] = codec.to_float(levels.array()[_LEVEL_IDX])
+    _, pta_r, pta_l, transducer, masking = zip(*headers)
+    result = classify(ac, bc, np.array([pta_r, pta_l], dtype=float).T, transducer, masking)
+
+    rows = [
+        AudiogramClassification(
+            audiogram_id=header[0], version=VERSION,
+            **{name: _python(values[i]) for name, values in result.items()},
+        )
+        for i, header in enumerate(headers)
+    ]
+    AudiogramClassification.objects.bulk_create(
+        rows, **upsert_options(AudiogramClassification, ["audiogram"], UPDATE_FIELDS),
+    )
+    return int(result["flagged"].sum())
+
+
+def store(exams):
+    """Clasifica pares (audiometría guardada, trazos) ya en memoria, sin releerlos."""
+    exams = list(exams)
+    headers = [tuple(getattr(ag, name) for name in HEADER_FIELDS) for ag, _ in exams]
+    traces = [(i, th.ear, th.pathway, th.levels) for i, (_, ths) in enumerate(exams) for th in ths]
+    return _store(headers, traces)
+
+
+def _classify_chunk(headers):
+    row = {header[0]: i for i, header in enumerate(headers)}
+    traces = (
+        (row[exam_id], ear, pathway, levels)
+        for exam_id, ear, pathway, levels in Threshold.objects.filter(audiogram_id__in=row)
+        .values_list("audiogram_id", "ear", "pathway", "levels")
+    )
+    return _store(headers, traces)
+
+
+def refresh(audiogram_ids):
+    """Reclasifica desde la base (p. ej. tras editar trazos en el admin)."""
+    headers = list(Audiogram.objects.filter(pk__in=list(audiogram_ids)).values_list(*HEADER_FIELDS))
+    return _classify_chunk(headers)
+
+
+# --------- Modo lote ---------
+def pending():
+    """Audiometrías sin clasificar o clasificadas con otra VERSION."""
+    return Audiogram.objects.exclude(classification__version=VERSION)
+
+
+def classify_all(everything=False, chunk_size=CHUNK_SIZE, log=None):
+    """Clasifica por lotes (pk > último) lo pendiente, o todo; devuelve (exámenes, marcados)."""
+    qs = (Audiogram.objects.all() if everything else pending()).order_by("pk").values_list(*HEADER_FIELDS)
+    total = flagged = last_pk = 0
+    while True:
+        headers = list(qs.filter(pk__gt=last_pk)[:chunk_size])
+        if not headers:
+            if total:
+                patient_cache.bump_all()  # la ficha muestra la clasificación
+            return total, flagged
+        flagged += _classify_chunk(headers)
+        total += len(headers)
+        last_pk = headers[-1][0]
+        if log:
+            log(f"  {total} exámenes clasificados…")
+
+
+def totals():
+    """Conteos de la cola de revisión para informes y el comando."""
+    return AudiogramClassification.objects.aggregate(
+        exams=Count("pk"),
+        flagged=Count("pk", filter=Q(flagged=True)),
+        notch=Count("pk", filter=Q(notch_right=True) | Q(notch_left=True)),
+        asymmetry=Count("pk", filter=Q(asymmetry=True)),
+        masking_missing=Count("pk", filter=Q(masking_missing=True)),
+    )
@@ -0,0 +1,99 @@
+"""
+Codec compacto de umbrales: un byte (int8, dB HL) por frecuencia.
+
+El layout (EXT_FREQS) es fijo y solo puede crecer agregando frecuencias al
+final: vectores guardados con menos bytes se completan con NULL_LEVEL al
+leerlos. -128 representa "sin dato"; los valores válidos van de -127 a 127.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Convencionales + intermedias (125/750/1500) + alta frecuencia (HF)
+EXT_FREQS = (
+    125, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000,
+    9000, 10000, 11200, 12500, 14000, 16000,
+)
+HF_FREQS = EXT_FREQS[EXT_FREQS.index(9000):]
+VECTOR_SIZE = len(EXT_FREQS)
+NULL_LEVEL = -128
+INDEX = {f: i for i, f in enumerate(EXT_FREQS)}
+
+_EMPTY = bytes([NULL_LEVEL & 0xFF]) * VECTOR_SIZE
+
+
+class ThresholdVector:
+    """Umbrales de un trazo en un bytearray de VECTOR_SIZE bytes."""
+
+    __slots__ = ("_buf",)
+
+    def __init__(self, data: Optional[bytes] = None):
+        if data is None:
+            self._buf = bytearray(_EMPTY)
+            return
+        data = bytes(data)
+        if len(data) > VECTOR_SIZE:
+            raise ValueError(f"Vector de umbrales de {len(data)} bytes (máximo {VECTOR_SIZE}).")
+        self._buf = bytearray(data + _EMPTY[len(data):])
+
+    @classmethod
+    def from_dict(cls, levels: dict) -> "ThresholdVector":
+        vec = cls()
+        for freq, value in levels.items():
+            vec[freq] = value
+        return vec
+
+    def __getitem__(self, freq: int) -> Optional[int]:
+        raw = self._buf[INDEX[freq]]
+        value = raw - 256 if raw > 127 else raw
+        return None if value == NULL_LEVEL else value
+
+    def __setitem__(self, freq: int, value: Optional[int]):
+        if value is None:
+            value = NULL_LEVEL
+        elif not -127 <= int(value) <= 127:
+            raise ValueError(f"Umbral fuera de rango a {freq} Hz: {value} dB.")
+        self._buf[INDEX[freq]] = int(value) & 0xFF
+
+    def get(self, freq: int, default=None):
+        return self[freq] if freq in INDEX else default
+
+    def __len__(self):
+        return VECTOR_SIZE
+
+    def __eq__(self, other):
+        return isinstance(other, ThresholdVector) and self._buf == other._buf
+
+    def __repr__(self):
+        present = {f: v for f, v in self.items() if v is not None}
+        return f"ThresholdVector({present})"
+
+    def items(self, freqs: Iterable[int] = EXT_FREQS):
+        return [(f, self[f]) for f in freqs]
+
+    def as_dict(self, freqs: Iterable[int] = EXT_FREQS) -> dict:
+        return dict(self.items(freqs))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._buf)
+
+    def array(self) -> np.ndarray:
+        """Vista int8 sin copia sobre el buffer (escribible)."""
+        return np.frombuffer(self._buf, dtype=np.int8)
+
+    def as_float(self, freqs: Optional[Iterable[int]] = None) -> np.ndarray:
+        """float64 con NaN donde no hay dato, opcionalmente solo `freqs`."""
+        arr = self.array()
+        if freqs is not None:
+            arr = arr[[INDEX[f] for f in freqs]]
+        return to_float(arr)
+
+
+def stack(vectors: Iterable[ThresholdVector]) -> np.ndarray:
+    """Matriz int8 (n, VECTOR_SIZE) a partir de muchos vectores."""
+    joined = b"".join(v._buf for v in vectors)
+    return np.frombuffer(joined, dtype=np.int8).reshape(-1, VECTOR_SIZE)
+
+
+def to_float(levels: np.ndarray) -> np.ndarray:
+    return np.where(levels == NULL_LEVEL, np.nan, levels.astype(float))
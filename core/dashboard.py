@@ -0,0 +1,261 @@
+"""
+Indicadores del panel de inicio, mantenidos de forma incremental.
+
+Cada indicador es un contador entero en el caché "dashboard" que las señales
+post_save/post_delete de Audiogram y Anamnesis ajustan con incr, de modo que
+el panel solo hace un get_many por request. Si el caché está vacío (reinicio,
+expulsión, o después de un bulk_create, que no emite señales) el primer
+acceso los reconstruye con rebuild(), igual que el comando
+rebuild_dashboard_stats. La marca "ready" dura DASHBOARD_REFRESH_SECONDS:
+con un caché por proceso (locmem), lo que invalidan el worker, los comandos
+u otro proceso web se recoge en la siguiente reconstrucción. Con
+DASHBOARD_CACHE_BACKEND=file todos comparten los mismos contadores.
+
+Contadores:
+    exams:<lunes>          audiometrías por semana (fecha del examen)
+    degree:<grado>         audiometrías por grado de pérdida
+    anamnesis:<campo>      anamnesis totales / con tinnitus / con vértigo
+    patient:<id>           semana del último examen con pérdida del paciente
+    followup:<lunes>       pacientes cuyo último examen con pérdida cae en esa semana
+    followup:due           idem, ya vencidos (semanas <= followup:rolled)
+"""
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import TruncWeek
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import LOSS_DEGREE_CHOICES, Anamnesis, Audiogram, Patient
+
+CACHE_ALIAS = "dashboard"
+READY_KEY = "ready"
+ROLLED_KEY = "followup:rolled"
+DUE_KEY = "followup:due"
+LOSS_DEGREES = [code for code, _ in LOSS_DEGREE_CHOICES if code != "NORMAL"]
+TRACKED_FIELDS = {
+    Audiogram: ("date", "loss_degree"),
+    Anamnesis: ("tinnitus", "vertigo"),
+}
+SET_MANY_CHUNK = 5000
+_UNCHANGED = object()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def week_of(day):
+    """Lunes de la semana de `day`: balde de los contadores semanales."""
+    day = _as_date(day)
+    return day - timedelta(days=day.weekday())
+
+
+def follow_up_cutoff(today):
+    """Último balde semanal cuyo control anual ya está vencido en `today`."""
+    return week_of(today - timedelta(days=settings.DASHBOARD_FOLLOW_UP_DAYS))
+
+
+def _counters(model, values):
+    """Aporte de una fila (dict campo -> valor) a los contadores."""
+    if model is Audiogram:
+        return {f"exams:{week_of(values['date'])}": 1, f"degree:{values['loss_degree']}": 1}
+    return {
+        "anamnesis:total": 1,
+        "anamnesis:tinnitus": int(bool(values["tinnitus"])),
+        "anamnesis:vertigo": int(bool(values["vertigo"])),
+    }
+
+
+def _bump(key, delta):
+    if delta:
+        cache = _cache()
+        cache.add(key, 0)
+        cache.incr(key, delta)
+
+
+def _apply(old, new):
+    for key in old.keys() | new.keys():
+        _bump(key, new.get(key, 0) - old.get(key, 0))
+
+
+def is_ready():
+    return bool(_cache().get(READY_KEY))
+
+
+def invalidate():
+    """Descarta los contadores; se reconstruyen en la próxima lectura."""
+    _cache().delete(READY_KEY)
+
+
+# --------- Controles pendientes ---------
+def _follow_up_week(patient_id):
+    latest = (
+        Audiogram.objects.filter(patient_id=patient_id)
+        .order_by("-date", "-pk").values_list("date", "loss_degree").first()
+    )
+    if latest and latest[1] in LOSS_DEGREES:
+        return week_of(latest[0])
+    return None
+
+
+def _follow_up_key(week):
+    rolled = _cache().get(ROLLED_KEY)
+    return DUE_KEY if rolled is not None and week <= rolled else f"followup:{week}"
+
+
+def _refresh_follow_up(patient_id):
+    cache = _cache()
+    key = f"patient:{patient_id}"
+    old, new = cache.get(key), _follow_up_week(patient_id)
+    if old == new:
+        return
+    if old:
+        _bump(_follow_up_key(old), -1)
+    if new:
+        _bump(_follow_up_key(new), 1)
+        cache.set(key, new)
+    else:
+        cache.delete(key)
+
+
+def _roll_follow_ups(today):
+    """Suma a followup:due las semanas que vencieron desde la última lectura."""
+    cache = _cache()
+    cutoff = follow_up_cutoff(today)
+    rolled = cache.get(ROLLED_KEY)
+    if rolled is None or rolled >= cutoff:
+        return
+    keys = []
+    week = rolled + timedelta(days=7)
+    while week <= cutoff:
+        keys.append(f"followup:{week}")
+        week += timedelta(days=7)
+    cache.set(ROLLED_KEY, cutoff)
+    due = sum(cache.get_many(keys).values())
+    cache.delete_many(keys)
+    _bump(DUE_KEY, due)
+
+
+# --------- Reconstrucción y lectura ---------
+def rebuild(today=None):
+    """Recalcula todos los contadores desde la base (agregados por grupo)."""
+    today = today or date.today()
+    cache = _cache()
+    cache.clear()
+    values = {}
+
+    weekly = Audiogram.objects.annotate(week=TruncWeek("date")).values_list("week").annotate(n=Count("pk"))
+    for week, n in weekly.order_by():
+        values[f"exams:{week_of(week)}"] = n
+    for degree, n in Audiogram.objects.values_list("loss_degree").annotate(n=Count("pk")).order_by():
+        values[f"degree:{degree}"] = n
+    anamnesis = Anamnesis.objects.aggregate(
+        total=Count("pk"),
+        tinnitus=Count("pk", filter=Q(tinnitus=True)),
+        vertigo=Count("pk", filter=Q(vertigo=True)),
+    )
+    values.update({f"anamnesis:{name}": n for name, n in anamnesis.items()})
+
+    cutoff = follow_up_cutoff(today)
+    latest = Audiogram.objects.filter(patient=OuterRef("pk")).order_by("-date", "-pk")
+    pending = (
+        Patient.objects
+        .annotate(last_date=Subquery(latest.values("date")[:1]), last_degree=Subquery(latest.values("loss_degree")[:1]))
+        .filter(last_degree__in=LOSS_DEGREES)
+        .values_list("pk", "last_date")
+    )
+    values[DUE_KEY] = 0
+    for pk, last_date in pending.iterator(chunk_size=SET_MANY_CHUNK):
+        week = week_of(last_date)
+        values[f"patient:{pk}"] = week
+        key = DUE_KEY if week <= cutoff else f"followup:{week}"
+        values[key] = values.get(key, 0) + 1
+    values[ROLLED_KEY] = cutoff
+
+    items = list(values.items())
+    for start in range(0, len(items), SET_MANY_CHUNK):
+        cache.set_many(dict(items[start:start + SET_MANY_CHUNK]))
+    cache.set(READY_KEY, True, settings.DASHBOARD_REFRESH_SECONDS)
+    return len(values)
+
+
+def _pct(part, total):
+    return round(100 * part / total, 1) if total else None
+
+
+def summary(today=None):
+    """Indicadores del panel; O(1) consultas al caché una vez construido."""
+    today = today or date.today()
+    if not is_ready():
+        rebuild(today)
+    _roll_follow_ups(today)
+    week_key = f"exams:{week_of(today)}"
+    degree_keys = {code: f"degree:{code}" for code, _ in LOSS_DEGREE_CHOICES}
+    values = _cache().get_many([
+        week_key, DUE_KEY, "anamnesis:total", "anamnesis:tinnitus", "anamnesis:vertigo",
+        *degree_keys.values(),
+    ])
+    graded = sum(values.get(key, 0) for key in degree_keys.values())
+    anamneses = values.get("anamnesis:total", 0)
+    return {
+        "exams_week": values.get(week_key, 0),
+        "follow_ups": values.get(DUE_KEY, 0),
+        "degrees": [
+            {
+                "code": code, "label": label,
+                "count": values.get(degree_keys[code], 0),
+                "percent": _pct(values.get(degree_keys[code], 0), graded) or 0,
+            }
+            for code, label in LOSS_DEGREE_CHOICES
+        ],
+        "anamneses": anamneses,
+        "tinnitus_pct": _pct(values.get("anamnesis:tinnitus", 0), anamneses),
+        "vertigo_pct": _pct(values.get("anamnesis:vertigo", 0), anamneses),
+    }
+
+
+# --------- Señales ---------
+@receiver(pre_save, sender=Audiogram)
+@receiver(pre_save, sender=Anamnesis)
+def _remember_previous(sender, instance, update_fields=None, **kwargs):
+    """Guarda el aporte anterior de la fila para aplicar solo la diferencia."""
+    if not is_ready():
+        return
+    fields = TRACKED_FIELDS[sender]
+    if update_fields is not None and not set(fields) & set(update_fields):
+        instance._dashboard_previous = _UNCHANGED
+    elif instance._state.adding or instance.pk is None:
+        instance._dashboard_previous = {}
+    else:
+        row = sender.objects.filter(pk=instance.pk).values(*fields).first()
+        instance._dashboard_previous = _counters(sender, row) if row else {}
+
+
+@receiver(post_save, sender=Audiogram)
+@receiver(post_save, sender=Anamnesis)
+def _on_save(sender, instance, **kwargs):
+    previous = instance.__dict__.pop("_dashboard_previous", None)
+    if previous is None or previous is _UNCHANGED or not is_ready():
+        return
+    current = {f: getattr(instance, f) for f in TRACKED_FIELDS[sender]}
+    _apply(previous, _counters(sender, current))
+    if sender is Audiogram:
+        _refresh_follow_up(instance.patient_id)
+
+
+@receiver(post_delete, sender=Audiogram)
+@receiver(post_delete, sender=Anamnesis)
+def _on_delete(sender, instance, **kwargs):
+    if not is_ready():
+        return
+    current = {f: getattr(instance, f) for f in TRACKED_FIELDS[sender]}
+    _apply(_counters(sender, current), {})
+    if sender is Audiogram:
+        _refresh_follow_up(instance.patient_id)
@@ -0,0 +1,106 @@
+"""
+Fusión de pacientes duplicados por RUT.
+
+Dos fichas son el mismo paciente si tienen el mismo cuerpo de RUT
+(Patient.rut_body), aunque el texto difiera ("12345678-5" y
+"12.345.678-5"). En cada grupo se conserva la ficha más antigua (menor pk):
+hereda los datos que le falten de las otras, su RUT queda en forma canónica
+y las secciones clínicas de los duplicados (también sus registros
+archivados y su historial de cambios, core.audit) pasan a ella con un
+UPDATE por tabla y lote de grupos (CASE patient_id WHEN … THEN …). Después
+se borran las fichas sobrantes, ya vacías.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+
+from . import audit, autocomplete, dashboard, patient_cache, summaries
+from .models import LDL, Anamnesis, ArchivedRecord, Audiogram, AuditEntry, Patient, SpeechAudiometry
+from .rut import format_rut
+
+# anamneses, audiograms, speech_tests, ldl_tests y archived_records (core.archive): borrar la ficha
+# duplicada con registros archivados los borraría en cascada
+CHILD_MODELS = (Anamnesis, Audiogram, SpeechAudiometry, LDL, ArchivedRecord)
+FILL_FIELDS = ("birth_date", "sex", "phone", "email")
+CHUNK_SIZE = 500  # grupos por transacción
+
+
+def duplicate_bodies():
+    """Cuerpos de RUT con más de una ficha."""
+    return (
+        Patient.objects.exclude(rut_body=None).order_by().values("rut_body")
+        .annotate(n=Count("pk")).filter(n__gt=1).values_list("rut_body", flat=True)
+    )
+
+
+def _groups(bodies):
+    groups = defaultdict(list)
+    for p in Patient.objects.filter(rut_body__in=bodies).order_by("pk"):
+        groups[p.rut_body].append(p)
+    return list(groups.values())
+
+
+def _merge_chunk(groups):
+    target = {}  # pk duplicado -> pk conservado
+    keepers = []
+    for keeper, *duplicates in groups:
+        for dup in duplicates:
+            target[dup.pk] = keeper.pk
+            for name in FILL_FIELDS:
+                if not getattr(keeper, name) and getattr(dup, name):
+                    setattr(keeper, name, getattr(dup, name))
+        keeper.rut = format_rut(keeper.rut_body, keeper.rut_dv)
+        keeper.refresh_search_fields()
+        keeper.updated_at = timezone.now()
+        keepers.append(keeper)
+
+    repoint = Case(
+        *[When(patient_id=dup, then=Value(keep)) for dup, keep in target.items()],
+        output_field=IntegerField(),
+    )
+    moved = 0
+    with transaction.atomic():
+        for model in CHILD_MODELS:
+            moved += model.objects.filter(patient_id__in=target).update(patient_id=repoint)
+        # El historial sigue a la ficha conservada (no cuenta como registro clínico movido)
+        AuditEntry.objects.filter(patient_id__in=target).update(patient_id=repoint)
+        # Antes de actualizar: el RUT canónico puede ser el de un duplicado (rut es único).
+        # La fusión no queda en el historial (ver core.audit): la ficha no se borra, se une.
+        with audit.paused():
+            Patient.objects.filter(pk__in=target).delete()
+        Patient.objects.bulk_update(
+            keepers, ["rut", "rut_search", "search_name", "rut_body", "rut_dv", "updated_at", *FILL_FIELDS],
+        )
+    if autocomplete.index.ready:  # bulk_update no emite señales
+        for keeper in keepers:
+            autocomplete.index.put(keeper.pk, *(getattr(keeper, name) for name in autocomplete.FIELDS[1:]))
+    return [k.pk for k in keepers], len(target), moved
+
+
+def merge_duplicates(dry_run=False, chunk_size=CHUNK_SIZE, log=None):
+    """
+    Fusiona todos los grupos duplicados; devuelve (grupos, fichas eliminadas,
+    registros clínicos re-asignados). Con dry_run solo cuenta.
+    """
+    bodies = sorted(duplicate_bodies())
+    groups = removed = moved = 0
+    kept = []
+    for start in range(0, len(bodies), chunk_size):
+        chunk = _groups(bodies[start:start + chunk_size])
+        groups += len(chunk)
+        if dry_run:
+            removed += sum(len(g) - 1 for g in chunk)
+            continue
+        keepers, n_removed, n_moved = _merge_chunk(chunk)
+        kept += keepers
+        removed += n_removed
+        moved += n_moved
+        if log:
+            log(f"  {groups} grupos fusionados…")
+    if kept:
+        summaries.refresh(kept)
+        patient_cache.bump(kept)
+        dashboard.invalidate()  # contadores por paciente
+    return groups, removed, moved
@@ -0,0 +1,36 @@
+from base64 import b64encode
+
+from django.db import models
+
+from .codec import VECTOR_SIZE, ThresholdVector
+
+
+class ThresholdVectorField(models.BinaryField):
+    """BinaryField que guarda un ThresholdVector (VECTOR_SIZE bytes)."""
+
+    description = "Umbrales empaquetados (int8 por frecuencia)"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", VECTOR_SIZE)
+        kwargs.setdefault("default", ThresholdVector)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return ThresholdVector(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, ThresholdVector):
+            return value
+        return ThresholdVector(super().to_python(value))
+
+    def get_prep_value(self, value):
+        if isinstance(value, ThresholdVector):
+            value = value.to_bytes()
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        # Serialización (dumpdata): base64 de los bytes, como BinaryField
+        value = self.value_from_object(obj)
+        return "" if value is None else b64encode(value.to_bytes()).decode("ascii")
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL
+from . import rut
+from .models import EXT_FREQS, Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL
 
 class PatientForm(forms.ModelForm):
     class Meta:
@@ -15,6 +16,17 @@ class PatientForm(forms.ModelForm):
             "email": forms.EmailInput(attrs={"class": "form-control"}),
         }
 
+    def clean_rut(self):
+        """Valida el dígito verificador y guarda el RUT en forma canónica (12.345.678-5)."""
+        try:
+            body, dv = rut.parse(self.cleaned_data["rut"])
+        except rut.InvalidRut as exc:
+            raise forms.ValidationError(str(exc))
+        # Mismo cuerpo con otro formato ("12345678-5" vs "12.345.678-5") es el mismo paciente
+        if Patient.objects.filter(rut_body=body).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("Ya existe un paciente con este RUT.")
+        return rut.format_rut(body, dv)
+
 class AnamnesisForm(forms.ModelForm):
     class Meta:
         model = Anamnesis
@@ -72,25 +84,92 @@ SYMBOL_CHOICES = [
 ]
 
 
-class ThresholdForm(forms.ModelForm):
+# Un campo por frecuencia guardada en Threshold.levels (f_125 … f_16000)
+LEVEL_FIELDS = [f"f_{f}" for f in EXT_FREQS]
+MIN_DB, MAX_DB = -10, 120
+
+
+def _level_field():
+    return forms.IntegerField(
+        required=False, min_value=MIN_DB, max_value=MAX_DB,
+        widget=forms.NumberInput(attrs={"step": 1, "class": "form-control"}),
+    )
+
+
+# Campos declarados (no columnas del modelo): así también los ve el admin
+ThresholdLevelsForm = type(
+    "ThresholdLevelsForm", (forms.Form,), {name: _level_field() for name in LEVEL_FIELDS}
+)
+
+
+class ThresholdForm(forms.ModelForm, ThresholdLevelsForm):
     symbol = forms.ChoiceField(choices=SYMBOL_CHOICES, required=False)
 
     class Meta:
         model = Threshold
-        fields = [
-            "ear", "pathway", "symbol",
-            "f_250", "f_500", "f_1000", "f_2000", "f_3000", "f_4000", "f_6000", "f_8000"
-        ]
+        fields = ["ear", "pathway", "symbol", *LEVEL_FIELDS]
         widgets = {
             "ear": forms.Select(attrs={"class": "form-select"}),
             "pathway": forms.Select(attrs={"class": "form-select"}),
             "symbol": forms.Select(attrs={"class": "form-select"}),
-            **{f"f_{f}": forms.NumberInput(attrs={"step": 1, "class": "form-control"}) for f in (250,500,1000,2000,3000,4000,6000,8000)}
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            for name in LEVEL_FIELDS:
+                self.initial.setdefault(name, getattr(self.instance, name))
+
+    @property
+    def level_fields(self):
+        return [self[name] for name in LEVEL_FIELDS]
+
+    def save(self, commit=True):
+        # Copia los umbrales al vector empaquetado antes de guardar
+        for name in LEVEL_FIELDS:
+            setattr(self.instance, name, self.cleaned_data.get(name))
+        return super().save(commit=commit)
+
+# Trazos que se precargan en una audiometría nueva
+THRESHOLD_INITIAL = [
+    {"ear": "R", "pathway": "AC", "symbol": "O"},
+    {"ear": "L", "pathway": "AC", "symbol": "X"},
+    {"ear": "R", "pathway": "BC", "symbol": "<"},
+    {"ear": "L", "pathway": "BC", "symbol": ">"},
+    {"ear": "B", "pathway": "AC", "symbol": "◇"},  # Campo libre
+]
+
+class BaseThresholdFormSet(forms.BaseModelFormSet):
+    """
+    Trazos de una audiometría. Sin datos enviados, agrega como filas extra
+    los trazos de THRESHOLD_INITIAL que el examen aún no tiene (todos, si es
+    nuevo). (oído, vía) no puede repetirse: la base lo exige y el upsert de
+    core.audiograms depende de ello.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            present = {(t.ear, t.pathway) for t in self.get_queryset()}
+            self.initial_extra = [r for r in THRESHOLD_INITIAL if (r["ear"], r["pathway"]) not in present]
+            self.extra = len(self.initial_extra)
+
+    def clean(self):
+        super().clean()
+        seen = set()
+        for form in self.forms:
+            if not form.has_changed() and not form.instance.pk:
+                continue
+            key = (form.cleaned_data.get("ear"), form.cleaned_data.get("pathway"))
+            if key in seen:
+                raise forms.ValidationError("Hay dos trazos con el mismo oído y vía.")
+            seen.add(key)
+
+
 ThresholdFormSet = forms.modelformset_factory(
     Threshold,
     form=ThresholdForm,
+    formset=BaseThresholdFormSet,
     extra=0,
     can_delete=False
 )
@@ -122,3 +201,21 @@ class LDLForm(forms.ModelForm):
             "ldl_4k": forms.NumberInput(attrs={"class": "form-control"}),
             "notes": forms.TextInput(attrs={"class": "form-control"}),
         }
+
+
+class AudiogramImportForm(forms.Form):
+    file = forms.FileField(
+        label="Archivo exportado (CSV o XML)",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xml"}),
+    )
+
+
+class ExportForm(forms.Form):
+    date_from = forms.DateField(
+        label="Desde", required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+    )
+    date_to = forms.DateField(
+        label="Hasta", required=False,
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+    )
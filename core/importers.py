@@ -0,0 +1,272 @@
+"""
+Importación masiva de audiometrías desde archivos exportados por los
+audiómetros (CSV plano o XML estilo NOAH).
+
+Los archivos se leen en streaming; cada examen se valida con las mismas
+reglas de AudiogramForm/ThresholdForm y se inserta con bulk_create en
+transacciones por lote. Cada examen lleva un `import_key` único, por lo que
+reimportar el mismo archivo no duplica datos.
+"""
+import csv
+import hashlib
+import io
+import xml.etree.ElementTree as ET
+
+from django.db import transaction
+
+from . import classification, dashboard, patient_cache, summaries
+from .bulk import bulk_create_with_pks
+from .forms import AudiogramForm, ThresholdForm
+from .models import EXT_FREQS, ArchivedRecord, Audiogram, Patient, Threshold
+from .normalize import normalize_rut
+from .rut import parse_or_none as parse_rut
+
+DEFAULT_CHUNK_SIZE = 500
+HEADER_FIELDS = ("date", "exam_type", "transducer", "masking_used", "comments")
+THRESHOLD_FIELDS = ("ear", "pathway", "symbol", *[f"f_{f}" for f in EXT_FREQS])
+
+
+class ImportReport:
+    """Resumen de una importación: contadores y errores por fila."""
+
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors = []  # (línea, rut, mensaje)
+
+    def add_error(self, line, rut, message):
+        self.errors.append((line, rut, message))
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def write_errors(self, fh):
+        writer = csv.writer(fh)
+        writer.writerow(["linea", "rut", "error"])
+        writer.writerows(self.errors)
+
+    def __str__(self):
+        return f"{self.created} creados, {self.skipped} ya existentes, {self.failed} con errores"
+
+
+class ImportFileError(Exception):
+    """El archivo no se puede seguir leyendo (p. ej. XML mal formado) desde `line`."""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+
+class ExamRecord:
+    """Un examen leído del archivo (cabecera + trazos), aún sin validar."""
+
+    __slots__ = ("line", "rut", "exam_id", "header", "traces")
+
+    def __init__(self, line, rut, exam_id, header):
+        self.line = line
+        self.rut = rut
+        self.exam_id = exam_id
+        self.header = header
+        self.traces = []
+
+    @property
+    def import_key(self):
+        raw = "|".join([
+            normalize_rut(self.rut), self.exam_id or "",
+            self.header.get("date", ""), self.header.get("exam_type", ""),
+            self.header.get("transducer", ""),
+        ])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def rut_body(self):
+        """Cuerpo del RUT (índice Patient.rut_body), o None si no es válido."""
+        return parse_rut(self.rut)[0]
+
+
+# --------- Lectores ---------
+def _text_stream(fh):
+    if isinstance(fh, io.TextIOBase):
+        return fh
+    return io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+
+
+def read_csv(fh):
+    """
+    Una fila por trazo. Columnas: rut, date, exam_type, transducer,
+    masking_used, comments, exam_id (opcional), ear, pathway, symbol, f_125…f_16000.
+    Las filas consecutivas del mismo examen se agrupan.
+    """
+    reader = csv.DictReader(_text_stream(fh))
+    current, current_key = None, None
+    for line, row in enumerate(reader, start=2):
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+        header = {k: row.get(k, "") for k in HEADER_FIELDS}
+        record = ExamRecord(line, row.get("rut", ""), row.get("exam_id", ""), header)
+        if record.import_key != current_key:
+            if current is not None:
+                yield current
+            current, current_key = record, record.import_key
+        current.traces.append({k: row.get(k, "") for k in THRESHOLD_FIELDS})
+    if current is not None:
+        yield current
+
+
+def read_xml(fh):
+    """
+    Formato de sesión tipo NOAH:
+
+        <Sessions>
+          <Session id=".." rut=".." date="2024-05-02" exam_type="TONAL" transducer="INSERT" masking="0">
+            <Trace ear="R" pathway="AC" symbol="O">
+              <Point freq="500" db="20"/> ...
+            </Trace>
+          </Session>
+        </Sessions>
+
+    `line` es el n.º de sesión; un XML mal formado corta la lectura con
+    ImportFileError en la línea del archivo donde falló.
+    """
+    try:
+        yield from _read_sessions(fh)
+    except ET.ParseError as exc:
+        raise ImportFileError(exc.position[0], f"XML mal formado: {exc}") from exc
+
+
+def _read_sessions(fh):
+    line = 0
+    for _event, elem in ET.iterparse(fh, events=("end",)):
+        if elem.tag != "Session":
+            continue
+        line += 1
+        header = {
+            "date": elem.get("date", ""),
+            "exam_type": elem.get("exam_type", "TONAL"),
+            "transducer": elem.get("transducer", "INSERT"),
+            "masking_used": elem.get("masking", ""),
+            "comments": elem.findtext("Comments", ""),
+        }
+        record = ExamRecord(line, elem.get("rut", ""), elem.get("id", ""), header)
+        for trace in elem.iter("Trace"):
+            data = {k: "" for k in THRESHOLD_FIELDS}
+            data.update(ear=trace.get("ear", ""), pathway=trace.get("pathway", "AC"), symbol=trace.get("symbol", ""))
+            for point in trace.iter("Point"):
+                key = f"f_{point.get('freq')}"
+                if key in data:
+                    data[key] = point.get("db", "")
+            record.traces.append(data)
+        elem.clear()  # liberar memoria: el archivo puede ser muy grande
+        yield record
+
+
+def read_records(fh, fmt):
+    if fmt == "xml":
+        return read_xml(fh)
+    return read_csv(fh)
+
+
+def detect_format(filename):
+    return "xml" if str(filename).lower().endswith(".xml") else "csv"
+
+
+# --------- Validación e inserción ---------
+def _build(record, patient):
+    """Valida un examen con los formularios existentes y arma las instancias."""
+    header = dict(record.header)
+    if header.get("masking_used", "").lower() in ("", "0", "false", "no", "n"):
+        header.pop("masking_used", None)  # CheckboxInput: ausente = False
+    a_form = AudiogramForm(header)
+    if not a_form.is_valid():
+        return None, a_form.errors.as_text()
+
+    ag = a_form.save(commit=False)
+    ag.patient = patient
+    ag.import_key = record.import_key
+    thresholds = []
+    for trace in record.traces:
+        t_form = ThresholdForm(trace)
+        if not t_form.is_valid():
+            return None, t_form.errors.as_text()
+        thresholds.append(t_form.save(commit=False))
+
+    seen = [(t.ear, t.pathway) for t in thresholds]
+    if len(seen) != len(set(seen)):
+        return None, "Trazo (oído, vía) repetido en el mismo examen."
+
+    # PTA en memoria: mismo cálculo que refresh_pta() sin consultas extra
+    ag.ac_thresholds = [t for t in thresholds if t.pathway == "AC"]
+    for name, value in ag.compute_pta().items():
+        setattr(ag, name, value)
+    return (ag, thresholds), None
+
+
+def _flush(chunk, report):
+    bodies = {r.rut_body for r in chunk if r.rut_body}
+    patients = {}
+    for p in Patient.objects.filter(rut_body__in=bodies).order_by("pk"):
+        patients.setdefault(p.rut_body, p)
+    keys = [r.import_key for r in chunk]
+    existing = set(Audiogram.objects.filter(import_key__in=keys).values_list("import_key", flat=True))
+    existing.update(ArchivedRecord.objects.filter(import_key__in=keys).values_list("import_key", flat=True))
+
+    built = []
+    for record in chunk:
+        if record.import_key in existing:
+            report.skipped += 1
+            continue
+        if record.rut_body is None:
+            report.add_error(record.line, record.rut, "RUT inválido (dígito verificador o formato).")
+            continue
+        patient = patients.get(record.rut_body)
+        if patient is None:
+            report.add_error(record.line, record.rut, "Paciente no encontrado por RUT.")
+            continue
+        result, error = _build(record, patient)
+        if error:
+            report.add_error(record.line, record.rut, error)
+            continue
+        existing.add(record.import_key)  # duplicados dentro del mismo archivo
+        built.append(result)
+
+    if not built:
+        return
+    with transaction.atomic():
+        bulk_create_with_pks(Audiogram, [ag for ag, _ in built], "import_key")
+        rows = []
+        for ag, thresholds in built:
+            for th in thresholds:
+                th.audiogram_id = ag.pk
+                rows.append(th)
+        Threshold.objects.bulk_create(rows)
+        classification.store(built)
+    touched = {ag.patient_id for ag, _ in built}
+    summaries.refresh(touched)  # bulk_create no emite señales
+    patient_cache.bump(touched)
+    report.created += len(built)
+
+
+def import_audiograms(fh, fmt="csv", chunk_size=DEFAULT_CHUNK_SIZE, report=None, progress=None):
+    """
+    Importa todos los exámenes de `fh`; devuelve un ImportReport.
+    `progress(report)` se llama después de cada bloque (ver core.jobs). Si
+    el archivo se corta (ImportFileError), se importa lo leído hasta ahí y
+    el corte queda como un error más del reporte.
+    """
+    report = report or ImportReport()
+    chunk = []
+    try:
+        for record in read_records(fh, fmt):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                _flush(chunk, report)
+                chunk = []
+                if progress:
+                    progress(report)
+    except ImportFileError as exc:
+        report.add_error(exc.line, "", str(exc))
+    if chunk:
+        _flush(chunk, report)
+    if report.created:
+        dashboard.invalidate()  # bulk_create no emite señales
+    return report
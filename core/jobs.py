@@ -0,0 +1,317 @@
+"""
+Cola de trabajos en segundo plano respaldada por la base de datos.
+
+Las vistas encolan con enqueue() y responden de inmediato. `manage.py worker`
+reclama trabajos con un UPDATE condicional (QUEUED -> RUNNING). Así varios
+workers comparten la tabla sin broker ni bloqueos explícitos. Cada trabajo
+corre en un pool de hilos o de procesos. Un fallo se reintenta con espera
+exponencial hasta `max_attempts`. Mientras un trabajo corre, un hilo renueva
+su latido cada JOB_HEARTBEAT_SECONDS (aunque el handler no informe avance);
+uno sin latido por más de JOB_STALE_SECONDS (worker caído) vuelve a la cola.
+
+Un handler recibe un JobContext (payload, progress(), archivos de salida) y
+devuelve un dict JSON que queda en Job.result.
+"""
+import io
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import zipfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import archive, audit, classification, dedup, exports, prescription
+from .importers import ImportReport, import_audiograms
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 30          # segundos; se duplica en cada intento
+PROGRESS_INTERVAL = 1.0   # segundos mínimos entre escrituras de avance
+CLAIM_BATCH = 10
+
+HANDLERS = {}  # tipo -> (etiqueta, función)
+logger = logging.getLogger("core.jobs")
+
+
+def register(kind, label):
+    def decorator(fn):
+        HANDLERS[kind] = (label, fn)
+        return fn
+    return decorator
+
+
+def label_for(kind):
+    return HANDLERS.get(kind, (kind, None))[0]
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(kind, payload=None, user=None, input_file=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Crea un trabajo en cola; `input_file` (p. ej. un upload) se guarda con él."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    job = Job(
+        kind=kind, payload=payload or {}, max_attempts=max_attempts,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    if input_file is not None:
+        job.input_file.save(os.path.basename(input_file.name), input_file, save=False)
+    job.save()
+    return job
+
+
+class JobContext:
+    """Lo que recibe cada handler: payload, reporte de avance y salida."""
+
+    def __init__(self, job):
+        self.job = job
+        self.payload = job.payload
+        self._last_progress = 0.0
+
+    def progress(self, done, total=None, message="", force=False):
+        """Avance done/total (o solo mensaje); escribe como máximo 1 vez por segundo."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        fields = {"progress_message": str(message)[:200], "heartbeat": timezone.now()}
+        if total:
+            fields["progress"] = min(99, int(100 * done / total))
+        Job.objects.filter(pk=self.job.pk).update(**fields)
+
+    def save_output(self, name, content):
+        self.job.output_file.save(name, ContentFile(content), save=False)
+
+    @contextmanager
+    def open_output(self, name, mode="w+"):
+        """Archivo temporal que al cerrarse queda como Job.output_file."""
+        text = "b" not in mode
+        with tempfile.TemporaryFile(mode, **({"newline": "", "encoding": "utf-8"} if text else {})) as fh:
+            yield fh
+            fh.seek(0)
+            self.job.output_file.save(name, File(fh.buffer if text else fh), save=False)
+
+
+# --------- Reclamo y ejecución ---------
+def claim(worker=None):
+    """Marca como RUNNING el próximo trabajo disponible; devuelve su pk o None."""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status="QUEUED", run_after__lte=now)
+        .order_by("run_after", "pk").values_list("pk", flat=True)[:CLAIM_BATCH]
+    )
+    for pk in list(candidates):
+        claimed = Job.objects.filter(pk=pk, status="QUEUED").update(
+            status="RUNNING", worker=worker or worker_id(), attempts=F("attempts") + 1,
+            started_at=now, heartbeat=now, progress=0, progress_message="",
+        )
+        if claimed:  # otro worker pudo ganarlo entre el SELECT y el UPDATE
+            return pk
+    return None
+
+
+def requeue_stale(seconds=None):
+    """Devuelve a la cola los trabajos RUNNING sin latido (worker caído)."""
+    seconds = seconds or settings.JOB_STALE_SECONDS
+    limit = timezone.now() - timedelta(seconds=seconds)
+    stale = Job.objects.filter(status="RUNNING", heartbeat__lt=limit)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="FAILED", error="El worker dejó de responder.", finished_at=timezone.now(),
+    )
+    return failed + stale.update(status="QUEUED", run_after=timezone.now(), worker="")
+
+
+class Heartbeat(threading.Thread):
+    """Renueva Job.heartbeat cada `interval` segundos hasta stop()."""
+
+    def __init__(self, pk, interval=None):
+        super().__init__(name=f"job-{pk}-heartbeat", daemon=True)
+        self.pk = pk
+        self.interval = interval or settings.JOB_HEARTBEAT_SECONDS
+        self._stopped = threading.Event()
+
+    def beat(self):
+        Job.objects.filter(pk=self.pk, status="RUNNING").update(heartbeat=timezone.now())
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.beat()
+                except DatabaseError:
+                    logger.exception("No se pudo renovar el latido del trabajo %s.", self.pk)
+        finally:
+            connections.close_all()  # conexiones de este hilo
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _finish_failed(job, error):
+    job.error = error
+    if job.attempts < job.max_attempts:
+        job.status = "QUEUED"
+        job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = "FAILED"
+        job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "run_after", "finished_at"])
+
+
+def run(pk):
+    """Ejecuta un trabajo ya reclamado (en un hilo o proceso del pool)."""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=pk)
+        _label, handler = HANDLERS.get(job.kind, (None, None))
+        heartbeat = Heartbeat(job.pk)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"Tipo de trabajo desconocido: {job.kind}")
+            with audit.batch(job.created_by_id, f"job:{job.kind}"):
+                result = handler(JobContext(job))
+        except Exception:
+            _finish_failed(job, traceback.format_exc())
+            return job.status
+        finally:
+            heartbeat.stop()
+        job.status = "DONE"
+        job.result = result
+        job.progress = 100
+        job.error = ""
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "result", "progress", "error", "output_file", "finished_at"])
+        return job.status
+    finally:
+        close_old_connections()
+
+
+def init_process():
+    """Initializer del pool de procesos: cada proceso abre sus conexiones."""
+    import django
+
+    django.setup()
+    from django.db import connections
+
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+
+
+# --------- Handlers ---------
+def _date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def _dates(payload):
+    return _date(payload.get("date_from")), _date(payload.get("date_to"))
+
+
+@register("import_audiograms", "Importación de audiometrías")
+def _import_audiograms(ctx):
+    # Reintentar es seguro: los exámenes ya creados se omiten por import_key
+    report = ImportReport()
+    with ctx.job.input_file.open("rb") as upload:
+        raw, size = upload.file, ctx.job.input_file.size
+        import_audiograms(
+            raw, fmt=ctx.payload.get("format", "csv"), report=report,
+            progress=lambda r: ctx.progress(raw.tell(), size, str(r)),
+        )
+    if report.errors:
+        with ctx.open_output("errores_importacion.csv") as fh:
+            report.write_errors(fh)
+    return {
+        "created": report.created, "skipped": report.skipped, "failed": report.failed,
+        "errors": report.errors[:100],
+    }
+
+
+@register("export_csv", "Exportación CSV")
+def _export_csv(ctx):
+    kind = ctx.payload["kind"]
+    date_from, date_to = _dates(ctx.payload)
+    with ctx.open_output(f"{kind}_{date_from or 'inicio'}_{date_to or date.today()}.csv") as fh:
+        rows = exports.write_csv(fh, kind, date_from, date_to)
+    return {"rows": rows}
+
+
+@register("patient_reports", "Informes PDF por paciente")
+def _patient_reports(ctx):
+    date_from, date_to = _dates(ctx.payload)
+    total = exports.report_patient_count(date_from, date_to)
+    with ctx.open_output(f"informes_{date_from or 'inicio'}_{date_to or date.today()}.zip", "w+b") as fh:
+        with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as zf:
+            for n, patient in enumerate(exports.report_patients(date_from, date_to), start=1):
+                zf.writestr(f"{patient.rut_search or patient.pk}.pdf", exports.patient_report_pdf(patient, date_from, date_to))
+                ctx.progress(n, total, f"{n}/{total} informes")
+    return {"reports": total}
+
+
+class _ProgressStream(io.StringIO):
+    """stdout de un comando: la última línea escrita queda como mensaje de avance."""
+
+    def __init__(self, ctx):
+        super().__init__()
+        self.ctx = ctx
+
+    def write(self, text):
+        if text.strip():
+            self.ctx.progress(None, message=text.strip())
+        return super().write(text)
+
+
+@register("backfill_pta", "Recálculo de PTA")
+def _backfill_pta(ctx):
+    out = _ProgressStream(ctx)
+    call_command("backfill_pta", only_missing=ctx.payload.get("only_missing", False), stdout=out)
+    return {"log": out.getvalue().splitlines()[-1:]}
+
+
+@register("prescriptions", "Objetivos de audífono")
+def _prescriptions(ctx):
+    total = prescription.candidates().count()
+    created = prescription.precompute(
+        ctx.payload.get("rules"), log=lambda msg: ctx.progress(None, message=msg.strip()),
+    )
+    return {"candidates": total, "created": created}
+
+
+@register("classification", "Clasificación de audiometrías")
+def _classification(ctx):
+    total, flagged = classification.classify_all(
+        ctx.payload.get("everything", False), log=lambda msg: ctx.progress(None, message=msg.strip()),
+    )
+    return {"classified": total, "flagged": flagged}
+
+
+@register("merge_patients", "Fusión de pacientes duplicados")
+def _merge_patients(ctx):
+    groups, removed, moved = dedup.merge_duplicates(
+        ctx.payload.get("dry_run", False), log=lambda msg: ctx.progress(None, message=msg.strip()),
+    )
+    return {"groups": groups, "removed": removed, "moved": moved}
+
+
+@register("archive", "Archivo de registros antiguos")
+def _archive(ctx):
+    p = ctx.payload
+    totals = archive.archive_all(
+        p.get("years"), p.get("kinds"), p.get("dry_run", False),
+        log=lambda msg: ctx.progress(None, message=msg.strip()),
+    )
+    return {"archived": totals}
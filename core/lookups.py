@@ -0,0 +1,29 @@
+"""
+Lookup `prefix_search`: coincidencia por prefijo de palabra sobre columnas
+normalizadas (ver core.normalize.fold_text).
+
+- MySQL: MATCH ... AGAINST en modo booleano (requiere índice FULLTEXT).
+- Otros motores (SQLite): LIKE 'tok%' OR LIKE '% tok%'.
+"""
+from django.db import models
+from django.db.models import Lookup
+
+# innodb_ft_min_token_size por defecto; tokens más cortos no están en el índice
+MYSQL_FT_MIN_TOKEN = 3
+
+
+@models.CharField.register_lookup
+class PrefixSearch(Lookup):
+    lookup_name = "prefix_search"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        token = self.rhs
+        sql = f"({lhs} LIKE %s OR {lhs} LIKE %s)"
+        return sql, [*lhs_params, f"{token}%", *lhs_params, f"% {token}%"]
+
+    def as_mysql(self, compiler, connection):
+        if len(self.rhs) < MYSQL_FT_MIN_TOKEN:
+            return self.as_sql(compiler, connection)
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f"MATCH ({lhs}) AGAINST (%s IN BOOLEAN MODE)", [*lhs_params, f"+{self.rhs}*"]
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Archiva anamnesis, audiometrías, logoaudiometrías y LDL anteriores al horizonte "
+        "(ARCHIVE_AFTER_YEARS), salvo el último registro de cada sección y la audiometría basal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, help="Horizonte en años (por defecto ARCHIVE_AFTER_YEARS).")
+        parser.add_argument("--kind", action="append", choices=list(archive.MODELS), dest="kinds")
+        parser.add_argument("--chunk-size", type=int, default=archive.CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Solo cuenta lo que se archivaría.")
+        parser.add_argument(
+            "--compact", action="store_true",
+            help="Después, quita de los archivos JSONL las líneas sin índice (restaurados, pacientes borrados).",
+        )
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Solo encola el archivado para `manage.py worker`.",
+        )
+
+    def handle(self, *args, years, kinds, chunk_size, dry_run, compact=False, background=False, **options):
+        if background:
+            from core import jobs
+
+            job = jobs.enqueue("archive", {"years": years, "kinds": kinds, "dry_run": dry_run})
+            self.stdout.write(self.style.SUCCESS(f"Archivado encolado como trabajo #{job.pk}."))
+            return
+        totals = archive.archive_all(years, kinds, dry_run, chunk_size=chunk_size, log=self.stdout.write)
+        detail = ", ".join(f"{kind} {n}" for kind, n in totals.items())
+        verb = "Se archivarían" if dry_run else "Archivados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(totals.values())} registros anteriores a {archive.horizon(years)} ({detail})."
+        ))
+        if compact and not dry_run:
+            dropped = archive.compact()
+            self.stdout.write(self.style.SUCCESS(f"Quitadas {dropped} líneas sin índice de los archivos JSONL."))
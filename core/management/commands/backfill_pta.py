@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import dashboard, patient_cache, summaries
+from core.models import Audiogram
+
+PTA_FIELDS = ["pta_right", "pta_left", "pta_binaural", "loss_degree"]
+
+
+class Command(BaseCommand):
+    help = "Recalcula las columnas PTA / grado de pérdida de Audiogram por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--only-missing", action="store_true",
+            help="Procesa solo exámenes sin grado calculado.",
+        )
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Solo encola el recálculo para `manage.py worker`.",
+        )
+
+    def handle(self, *args, chunk_size, only_missing, background=False, **options):
+        if background:
+            from core import jobs
+
+            job = jobs.enqueue("backfill_pta", {"only_missing": only_missing})
+            self.stdout.write(self.style.SUCCESS(f"Recálculo encolado como trabajo #{job.pk}."))
+            return
+
+        qs = Audiogram.objects.order_by("pk")
+        if only_missing:
+            qs = qs.filter(loss_degree="")
+
+        last_pk = 0
+        total = 0
+        while True:
+            # Paginación por clave (pk > último) para no degradar con OFFSET
+            chunk = list(qs.filter(pk__gt=last_pk).with_pta()[:chunk_size])
+            if not chunk:
+                break
+            for ag in chunk:
+                for name, value in ag.compute_pta().items():
+                    setattr(ag, name, value)
+            with transaction.atomic():
+                Audiogram.objects.bulk_update(chunk, PTA_FIELDS)
+                touched = {ag.patient_id for ag in chunk}
+                summaries.refresh(touched)
+                patient_cache.bump(touched)
+            last_pk = chunk[-1].pk
+            total += len(chunk)
+            self.stdout.write(f"  {total} exámenes procesados…")
+
+        dashboard.invalidate()  # bulk_update no emite señales
+        self.stdout.write(self.style.SUCCESS(f"PTA recalculado para {total} exámenes."))
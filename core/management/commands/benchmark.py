@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia y consultas de las vistas principales sobre datos sintéticos "
+        "en una base de prueba desechable, y falla si hay regresión contra la línea base. "
+        "La base de prueba usa el motor del alias default (DB_ENGINE): compara solo "
+        "contra una línea base medida con el mismo motor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", nargs="+", type=int, default=list(benchmarks.DEFAULT_SCALES))
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--baseline", default=str(Path(settings.BASE_DIR) / "bench_baseline.json"))
+        parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como nueva línea base.")
+        parser.add_argument("--check", action="store_true",
+                            help="Falla (código distinto de 0) si no existe la línea base, p. ej. en CI.")
+        parser.add_argument("--tolerance", type=float, default=benchmarks.LATENCY_TOLERANCE,
+                            help="Factor máximo de latencia permitido respecto de la línea base.")
+        parser.add_argument("--load", action="store_true",
+                            help="En vez de la línea base, compara throughput WSGI vs ASGI bajo carga concurrente.")
+        parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+        parser.add_argument("--requests", type=int, default=300, help="Requests por nivel de concurrencia (--load).")
+
+    def handle(self, *args, scales, repeat, seed, baseline, save_baseline, tolerance, load, concurrency, requests,
+               check, **options):
+        if check and not (save_baseline or load) and not Path(baseline).exists():
+            raise CommandError(f"Sin línea base en {baseline}; genérala con --save-baseline.")
+        setup_test_environment()
+        # Nunca se mide sobre la base real: se crea (y destruye) la base de prueba.
+        # Solo para default: sin REPLICA_READS las vistas no leen de la réplica real.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        self.stdout.write(f"Motor: {connection.vendor} (base de prueba {connection.settings_dict['NAME']})")
+        try:
+            with override_settings(REPLICA_READS=False):
+                if load:
+                    for scale in scales:
+                        benchmarks.load_test(scale, concurrency, requests, seed=seed, log=self.stdout.write)
+                    return
+                results = benchmarks.run(scales, repeat=repeat, seed=seed, log=self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if save_baseline:
+            benchmarks.save_baseline(baseline, results)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {baseline}"))
+            return
+        if not Path(baseline).exists():
+            self.stdout.write(self.style.WARNING(f"Sin línea base en {baseline}; usa --save-baseline."))
+            return
+
+        problems = benchmarks.compare(results, benchmarks.load_baseline(baseline), latency_tolerance=tolerance)
+        if problems:
+            raise CommandError("Regresiones de rendimiento:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la línea base."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core import classification
+
+
+class Command(BaseCommand):
+    help = (
+        "Clasifica por lotes las audiometrías sin clasificar (tipo y grado por oído, "
+        "muesca 4 kHz, asimetría, enmascaramiento faltante) y resume la cola de revisión."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=classification.CHUNK_SIZE)
+        parser.add_argument(
+            "--all", action="store_true", dest="everything",
+            help="Reclasifica todas las audiometrías, no solo las pendientes.",
+        )
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Solo encola la clasificación para `manage.py worker`.",
+        )
+
+    def handle(self, *args, chunk_size, everything, background=False, **options):
+        if background:
+            from core import jobs
+
+            job = jobs.enqueue("classification", {"everything": everything})
+            self.stdout.write(self.style.SUCCESS(f"Clasificación encolada como trabajo #{job.pk}."))
+            return
+        total, flagged = classification.classify_all(everything, chunk_size=chunk_size, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"{total} exámenes clasificados, {flagged} para revisión."))
+        counts = classification.totals()
+        self.stdout.write(
+            f"Cola de revisión: {counts['flagged']}/{counts['exams']} "
+            f"(muesca 4 kHz {counts['notch']}, asimetría {counts['asymmetry']}, "
+            f"sin enmascaramiento {counts['masking_missing']})."
+        )
@@ -0,0 +1,39 @@
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = "Exporta a disco los datos clínicos de un período (CSV y, opcionalmente, PDF por paciente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("out_dir", help="Carpeta de destino.")
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+        parser.add_argument("--kinds", nargs="+", choices=list(exports.EXPORTS), default=list(exports.EXPORTS))
+        parser.add_argument("--pdf", action="store_true", help="Genera además un informe PDF por paciente.")
+
+    def handle(self, *args, out_dir, date_from, date_to, kinds, pdf, **options):
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+
+        for kind in kinds:
+            path = out / f"{kind}.csv"
+            with open(path, "w", newline="", encoding="utf-8") as fh:
+                count = exports.write_csv(fh, kind, date_from, date_to)
+            self.stdout.write(f"{path}: {count} filas")
+
+        if pdf:
+            pdf_dir = out / "informes"
+            pdf_dir.mkdir(exist_ok=True)
+            count = 0
+            for patient in exports.report_patients(date_from, date_to):
+                data = exports.patient_report_pdf(patient, date_from, date_to)
+                (pdf_dir / f"{patient.rut_search or patient.pk}.pdf").write_bytes(data)
+                count += 1
+            self.stdout.write(f"{pdf_dir}: {count} informes PDF")
+
+        self.stdout.write(self.style.SUCCESS("Exportación terminada."))
@@ -0,0 +1,35 @@
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.vendor import ASSETS, CDN
+
+
+class Command(BaseCommand):
+    help = (
+        "Descarga Bootstrap y Bootstrap Icons (versiones fijas) a static/vendor/ para "
+        "servirlos localmente (mientras falten, las páginas los piden al CDN). Correr una vez "
+        "con red, luego collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Vuelve a descargar los existentes.")
+
+    def handle(self, *args, force, **options):
+        root = Path(settings.STATICFILES_DIRS[0]) / "vendor"
+        for package, source, target in ASSETS:
+            dest = root / target
+            if dest.exists() and not force:
+                continue
+            url = f"{CDN}/{package}/{source}"
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    data = response.read()
+            except OSError as exc:
+                raise CommandError(f"No se pudo descargar {url}: {exc}")
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_bytes(data)
+            self.stdout.write(f"  {target} ({len(data) // 1024} KB)")
+        self.stdout.write(self.style.SUCCESS(f"Recursos locales en {root}."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Patient
+from core.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = "Genera datos clínicos sintéticos (pacientes, anamnesis, audiometrías, vocal, LDL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, patients, seed, batch_size, **options):
+        # Continúa la numeración de RUT si ya hay pacientes sintéticos
+        start = Patient.objects.count()
+        exams = generate(patients, seed=seed, batch_size=batch_size, start=start, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Creados {patients} pacientes y {exams} audiometrías."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import DEFAULT_CHUNK_SIZE, ImportReport, detect_format, import_audiograms
+
+
+class Command(BaseCommand):
+    help = "Importa audiometrías desde archivos exportados (CSV o XML tipo NOAH)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Archivos a importar.")
+        parser.add_argument("--format", choices=["csv", "xml"], help="Por defecto se deduce de la extensión.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--errors", help="Ruta de un CSV donde escribir las filas rechazadas.")
+
+    def handle(self, *args, paths, format, chunk_size, errors, **options):
+        total = ImportReport()
+        for path in paths:
+            fmt = format or detect_format(path)
+            report = ImportReport()
+            try:
+                with open(path, "rb") as fh:
+                    import_audiograms(fh, fmt=fmt, chunk_size=chunk_size, report=report)
+            except OSError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f"{path}: {report}")
+            total.created += report.created
+            total.skipped += report.skipped
+            total.errors += [(f"{path}:{line}", rut, msg) for line, rut, msg in report.errors]
+
+        if errors:
+            with open(errors, "w", newline="", encoding="utf-8") as fh:
+                total.write_errors(fh)
+            self.stdout.write(f"Errores escritos en {errors}")
+        style = self.style.SUCCESS if not total.failed else self.style.WARNING
+        self.stdout.write(style(f"Total: {total}"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core import dedup
+
+
+class Command(BaseCommand):
+    help = (
+        "Fusiona fichas de pacientes con el mismo RUT (mismo cuerpo, distinto formato): "
+        "conserva la más antigua y le re-asigna anamnesis, audiometrías, logoaudiometrías y LDL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=dedup.CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Solo informa los duplicados.")
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Solo encola la fusión para `manage.py worker`.",
+        )
+
+    def handle(self, *args, chunk_size, dry_run, background=False, **options):
+        if background:
+            from core import jobs
+
+            job = jobs.enqueue("merge_patients", {"dry_run": dry_run})
+            self.stdout.write(self.style.SUCCESS(f"Fusión encolada como trabajo #{job.pk}."))
+            return
+        groups, removed, moved = dedup.merge_duplicates(dry_run, chunk_size=chunk_size, log=self.stdout.write)
+        if dry_run:
+            self.stdout.write(f"{groups} RUT duplicados; se eliminarían {removed} fichas.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{groups} RUT fusionados: {removed} fichas eliminadas, {moved} registros re-asignados."
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core import prescription
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los objetivos de audífono que falten para el último examen de cada "
+        "candidato (usuarios de audífono o con pérdida). Pensado para cron nocturno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rule", action="append", choices=list(prescription.RULES), dest="rules",
+            help="Regla a calcular (repetible). Por defecto, todas.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=prescription.CHUNK_SIZE)
+        parser.add_argument(
+            "--background", action="store_true",
+            help="Solo encola el cálculo para `manage.py worker`.",
+        )
+
+    def handle(self, *args, rules, chunk_size, background=False, **options):
+        if background:
+            from core import jobs
+
+            job = jobs.enqueue("prescriptions", {"rules": rules})
+            self.stdout.write(self.style.SUCCESS(f"Cálculo encolado como trabajo #{job.pk}."))
+            return
+        created = prescription.precompute(rules, chunk_size=chunk_size, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"{created} objetivos nuevos."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import dashboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde la base los contadores del panel de inicio (caché 'dashboard'). Con "
+        "DASHBOARD_CACHE_BACKEND=file los ven todos los procesos; con locmem, cada proceso web "
+        "reconstruye los suyos al vencer DASHBOARD_REFRESH_SECONDS."
+    )
+
+    def handle(self, *args, **options):
+        count = dashboard.rebuild()
+        stats = dashboard.summary()
+        self.stdout.write(
+            f"Exámenes esta semana: {stats['exams_week']} · controles pendientes: {stats['follow_ups']} · "
+            f"anamnesis: {stats['anamneses']}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{count} contadores reconstruidos."))
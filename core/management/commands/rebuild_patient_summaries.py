@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import summaries
+
+
+class Command(BaseCommand):
+    help = "Recalcula la tabla PatientSummary (resumen por paciente de los listados)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=summaries.CHUNK_SIZE)
+
+    def handle(self, *args, chunk_size, **options):
+        total = summaries.rebuild(chunk_size=chunk_size, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"{total} resúmenes de paciente recalculados."))
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Ejecuta los trabajos en cola (core.jobs) en un pool de hilos o de procesos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Trabajos simultáneos.")
+        parser.add_argument(
+            "--pool", choices=["thread", "process"], default="thread",
+            help="process para trabajos intensivos en CPU (PDF, análisis).",
+        )
+        parser.add_argument("--poll", type=float, default=2.0, help="Segundos entre revisiones de la cola.")
+        parser.add_argument("--once", action="store_true", help="Procesa lo pendiente y termina.")
+
+    def handle(self, *args, concurrency, pool, poll, once, **options):
+        worker = jobs.worker_id()
+        if pool == "process":
+            connections.close_all()  # los hijos no deben heredar sockets abiertos
+            executor = ProcessPoolExecutor(concurrency, initializer=jobs.init_process)
+        else:
+            executor = ThreadPoolExecutor(concurrency, thread_name_prefix="job")
+        self.stdout.write(f"Worker {worker}: pool {pool} × {concurrency}")
+
+        running = {}
+        try:
+            while True:
+                requeued = jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(f"  {requeued} trabajos sin latido reencolados")
+                while len(running) < concurrency:
+                    pk = jobs.claim(worker)
+                    if pk is None:
+                        break
+                    running[executor.submit(jobs.run, pk)] = pk
+                    self.stdout.write(f"  trabajo #{pk} iniciado")
+                if not running:
+                    if once:
+                        break
+                    time.sleep(poll)
+                    continue
+                done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pk = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as exc:  # p. ej. un proceso del pool murió
+                        status = f"error del pool: {exc}"
+                    self.stdout.write(f"  trabajo #{pk}: {status}")
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo: esperando trabajos en curso…")
+        finally:
+            executor.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS("Worker detenido."))
@@ -0,0 +1,165 @@
+"""
+Instrumentación por request: tiempo total, consultas SQL (cantidad y
+tiempo, vía execute_wrappers), tiempo de render de templates y nombre de
+la vista. Funciona igual bajo WSGI y ASGI: el recolector del request viaja
+en una ContextVar, que asgiref copia a los hilos donde corre el ORM. Marca
+requests lentos y patrones N+1 (la misma SQL repetida muchas veces) en el
+logger "core.perf".
+
+Umbrales configurables en settings:
+    PERF_SLOW_REQUEST_MS, PERF_SLOW_QUERY_MS, PERF_N_PLUS_ONE, PERF_WINDOW
+"""
+import contextvars
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends import django as django_backend
+
+from .perf import conf, stats
+
+logger = logging.getLogger("core.perf")
+
+_template_ms = contextvars.ContextVar("template_ms", default=None)
+_recorder = contextvars.ContextVar("query_recorder", default=None)
+
+
+def _install_template_timer():
+    """Envuelve una vez el render del backend de templates de Django."""
+    template_cls = django_backend.Template
+    if getattr(template_cls.render, "_perf_timed", False):
+        return
+    original = template_cls.render
+
+    def render(self, context=None, request=None):
+        acc = _template_ms.get()
+        if acc is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            acc[0] += (time.perf_counter() - start) * 1000
+
+    render._perf_timed = True
+    template_cls.render = render
+
+
+class QueryRecorder:
+    """execute_wrapper que acumula cantidad, tiempo y SQL de cada consulta."""
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total_ms += elapsed
+            self.statements[sql] += 1
+            if elapsed >= self.slow_ms:
+                self.slow.append((elapsed, sql))
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_query_recorder(conn):
+    if _record_query not in conn.execute_wrappers:
+        conn.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created)
+def _on_connection_created(sender, connection, **kwargs):
+    # Cada hilo tiene sus propias conexiones (p. ej. los de sync_to_async)
+    _install_query_recorder(connection)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        _install_template_timer()
+        for conn in connections.all(initialized_only=True):
+            _install_query_recorder(conn)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder, tpl, tokens = self._start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(tokens)
+        return self._finish(request, response, recorder, tpl, start)
+
+    async def __acall__(self, request):
+        recorder, tpl, tokens = self._start()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(tokens)
+        return self._finish(request, response, recorder, tpl, start)
+
+    def _start(self):
+        recorder = QueryRecorder(conf("PERF_SLOW_QUERY_MS", 100))
+        tpl = [0.0]
+        return recorder, tpl, (_recorder.set(recorder), _template_ms.set(tpl))
+
+    def _stop(self, tokens):
+        _recorder.reset(tokens[0])
+        _template_ms.reset(tokens[1])
+
+    def _finish(self, request, response, recorder, tpl, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<sin ruta>"
+        flags = self._flags(view, request, total_ms, recorder)
+        stats.record(view, (total_ms, recorder.total_ms, recorder.count, tpl[0]), flags)
+
+        response["Server-Timing"] = (
+            f"total;dur={total_ms:.1f}, db;dur={recorder.total_ms:.1f};desc=\"{recorder.count} queries\", "
+            f"tpl;dur={tpl[0]:.1f}"
+        )
+        return response
+
+    def _flags(self, view, request, total_ms, recorder):
+        flags = []
+        if total_ms >= conf("PERF_SLOW_REQUEST_MS", 500):
+            flags.append("slow")
+            logger.warning(
+                "Request lento %s %s (%s): %.0f ms, %d queries / %.0f ms",
+                request.method, request.path, view, total_ms, recorder.count, recorder.total_ms,
+            )
+        for elapsed, sql in recorder.slow:
+            logger.warning("Query lenta (%.0f ms) en %s: %s", elapsed, view, sql[:500])
+
+        n_plus_one = conf("PERF_N_PLUS_ONE", 5)
+        repeated = [(sql, n) for sql, n in recorder.statements.items() if n >= n_plus_one]
+        if repeated:
+            flags.append("n+1")
+            for sql, n in repeated:
+                logger.warning("Posible N+1 en %s: %d× %s", view, n, sql[:500])
+        return flags
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.18 on 2026-10-17 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiogram',
+            name='loss_degree',
+            field=models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('MILD', 'Leve'), ('MODERATE', 'Moderada'), ('SEVERE', 'Severa'), ('PROFOUND', 'Profunda')], db_index=True, editable=False, max_length=10, verbose_name='Grado de pérdida'),
+        ),
+        migrations.AddField(
+            model_name='audiogram',
+            name='pta_binaural',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='PTA binaural'),
+        ),
+        migrations.AddField(
+            model_name='audiogram',
+            name='pta_left',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='PTA OI'),
+        ),
+        migrations.AddField(
+            model_name='audiogram',
+            name='pta_right',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='PTA OD'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.18 on 2026-10-17 14:46
+
+from django.db import migrations, models
+
+from core.normalize import fold_text, normalize_rut
+
+
+def populate_search_fields(apps, schema_editor):
+    Patient = apps.get_model("core", "Patient")
+    objects = Patient.objects.using(schema_editor.connection.alias)
+    batch = []
+    for p in objects.only("id", "rut", "first_name", "last_name").iterator(chunk_size=2000):
+        p.rut_search = normalize_rut(p.rut)
+        p.search_name = fold_text(f"{p.last_name} {p.first_name}")
+        batch.append(p)
+        if len(batch) >= 2000:
+            objects.bulk_update(batch, ["rut_search", "search_name"])
+            batch = []
+    if batch:
+        objects.bulk_update(batch, ["rut_search", "search_name"])
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Solo MySQL: índice FULLTEXT para el lookup prefix_search
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX patient_search_name_ft ON core_patient (search_name)"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute("DROP INDEX patient_search_name_ft ON core_patient")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_audiogram_pta_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='rut_search',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=170),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name', 'first_name'], name='patient_name_idx'),
+        ),
+        migrations.RunPython(populate_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.18 on 2026-10-17 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_patient_search_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiogram',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, unique=True),
+        ),
+    ]
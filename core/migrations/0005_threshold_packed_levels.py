@@ -0,0 +1,76 @@
+# Generated by Django 4.2.18 on 2026-10-17 14:55
+
+import logging
+
+import core.codec
+import core.fields
+from django.db import migrations
+
+from core.codec import ThresholdVector
+
+OLD_FREQS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000)
+OLD_COLS = [f"f_{f}" for f in OLD_FREQS]
+CHUNK = 2000
+
+logger = logging.getLogger("core.migrations")
+
+
+def legacy_vector(th):
+    """Vector con las columnas antiguas; un valor fuera de -127..127 queda sin dato (y se registra)."""
+    levels = {}
+    for f in OLD_FREQS:
+        value = getattr(th, f"f_{f}")
+        if value is not None and not -127 <= value <= 127:
+            logger.warning("Threshold %s: %s dB a %s Hz fuera de rango; queda sin dato.", th.pk, value, f)
+            value = None
+        levels[f] = value
+    return ThresholdVector.from_dict(levels)
+
+
+def pack_levels(apps, schema_editor):
+    Threshold = apps.get_model("core", "Threshold")
+    objects = Threshold.objects.using(schema_editor.connection.alias)
+    batch = []
+    for th in objects.only("id", *OLD_COLS).iterator(chunk_size=CHUNK):
+        th.levels = legacy_vector(th)
+        batch.append(th)
+        if len(batch) >= CHUNK:
+            objects.bulk_update(batch, ["levels"])
+            batch = []
+    if batch:
+        objects.bulk_update(batch, ["levels"])
+
+
+def unpack_levels(apps, schema_editor):
+    # Las frecuencias que no tenían columna (125, 750, HF…) se pierden
+    Threshold = apps.get_model("core", "Threshold")
+    objects = Threshold.objects.using(schema_editor.connection.alias)
+    batch = []
+    for th in objects.only("id", "levels").iterator(chunk_size=CHUNK):
+        for f in OLD_FREQS:
+            setattr(th, f"f_{f}", th.levels[f])
+        batch.append(th)
+        if len(batch) >= CHUNK:
+            objects.bulk_update(batch, OLD_COLS)
+            batch = []
+    if batch:
+        objects.bulk_update(batch, OLD_COLS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_audiogram_import_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='threshold',
+            name='levels',
+            field=core.fields.ThresholdVectorField(default=core.codec.ThresholdVector, max_length=17, verbose_name='Umbrales'),
+        ),
+        migrations.RunPython(pack_levels, unpack_levels),
+    ] + [
+        migrations.RemoveField(model_name='threshold', name=col)
+        for col in OLD_COLS
+    ]
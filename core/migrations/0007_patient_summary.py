@@ -0,0 +1,78 @@
+# Generated by Django 4.2.18 on 2026-10-17 15:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_summaries(apps, schema_editor):
+    # Mismo cálculo que core.summaries.rebuild(), con los modelos históricos
+    # (ese módulo usa modelos posteriores, p. ej. ArchivedRecord)
+    alias = schema_editor.connection.alias
+    Patient, PatientSummary = (apps.get_model("core", name) for name in ("Patient", "PatientSummary"))
+    Audiogram, Anamnesis = (apps.get_model("core", name) for name in ("Audiogram", "Anamnesis"))
+    clinical = [Anamnesis, Audiogram, apps.get_model("core", "SpeechAudiometry"), apps.get_model("core", "LDL")]
+
+    pks = list(Patient.objects.using(alias).order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(pks), 2000):
+        chunk = pks[start:start + 2000]
+        visits = {}
+        for model in clinical:
+            for pk, day in model.objects.using(alias).filter(patient_id__in=chunk).values_list("patient_id", "date"):
+                visits.setdefault(pk, set()).add(day)
+        exams, counts = {}, {}
+        for row in (Audiogram.objects.using(alias).filter(patient_id__in=chunk).order_by("date", "pk")
+                    .values("patient_id", "date", "pta_right", "pta_left", "loss_degree")):
+            exams[row["patient_id"]] = row  # queda la última
+            counts[row["patient_id"]] = counts.get(row["patient_id"], 0) + 1
+        anamnesis = {
+            row["patient_id"]: row
+            for row in (Anamnesis.objects.using(alias).filter(patient_id__in=chunk).order_by("date", "pk")
+                        .values("patient_id", "tinnitus", "vertigo", "hearing_aids"))
+        }
+
+        summaries = []
+        for pk in chunk:
+            exam, history = exams.get(pk, {}), anamnesis.get(pk, {})
+            ptas = [p for p in (exam.get("pta_right"), exam.get("pta_left")) if p is not None]
+            summaries.append(PatientSummary(
+                patient_id=pk,
+                last_visit=max(visits[pk]) if pk in visits else None,
+                visit_count=len(visits.get(pk, ())),
+                exam_count=counts.get(pk, 0),
+                last_exam_date=exam.get("date"),
+                last_pta_right=exam.get("pta_right"),
+                last_pta_left=exam.get("pta_left"),
+                last_pta_worst=max(ptas, default=None),
+                last_loss_degree=exam.get("loss_degree") or "",
+                **{name: bool(history.get(name)) for name in ("tinnitus", "vertigo", "hearing_aids")},
+            ))
+        PatientSummary.objects.using(alias).bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.patient')),
+                ('last_visit', models.DateField(blank=True, db_index=True, null=True, verbose_name='Última visita')),
+                ('visit_count', models.PositiveIntegerField(default=0, verbose_name='Visitas')),
+                ('exam_count', models.PositiveIntegerField(default=0, verbose_name='Audiometrías')),
+                ('last_exam_date', models.DateField(blank=True, null=True, verbose_name='Última audiometría')),
+                ('last_pta_right', models.FloatField(blank=True, null=True, verbose_name='Último PTA OD')),
+                ('last_pta_left', models.FloatField(blank=True, null=True, verbose_name='Último PTA OI')),
+                ('last_pta_worst', models.FloatField(blank=True, db_index=True, null=True, verbose_name='Último PTA (peor oído)')),
+                ('last_loss_degree', models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('MILD', 'Leve'), ('MODERATE', 'Moderada'), ('SEVERE', 'Severa'), ('PROFOUND', 'Profunda')], db_index=True, max_length=10, verbose_name='Último grado de pérdida')),
+                ('tinnitus', models.BooleanField(default=False, verbose_name='Acúfenos / Tinnitus')),
+                ('vertigo', models.BooleanField(default=False, verbose_name='Vértigo')),
+                ('hearing_aids', models.BooleanField(default=False, verbose_name='Uso de audífonos')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.18 on 2026-10-17 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_patient_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('rule', models.CharField(choices=[('NAL-R', 'NAL-R'), ('POGO', 'POGO'), ('HALF', 'Medio gain (Lybarger)')], max_length=10, verbose_name='Regla')),
+                ('targets', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
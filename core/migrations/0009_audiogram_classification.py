@@ -0,0 +1,33 @@
+# Generated by Django 4.2.18 on 2026-10-17 15:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_prescription_target'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudiogramClassification',
+            fields=[
+                ('audiogram', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='classification', serialize=False, to='core.audiogram')),
+                ('version', models.PositiveSmallIntegerField(default=0)),
+                ('type_right', models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('CONDUCTIVE', 'Conductiva'), ('SENSORINEURAL', 'Neurosensorial'), ('MIXED', 'Mixta')], max_length=15, verbose_name='Tipo OD')),
+                ('type_left', models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('CONDUCTIVE', 'Conductiva'), ('SENSORINEURAL', 'Neurosensorial'), ('MIXED', 'Mixta')], max_length=15, verbose_name='Tipo OI')),
+                ('degree_right', models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('MILD', 'Leve'), ('MODERATE', 'Moderada'), ('SEVERE', 'Severa'), ('PROFOUND', 'Profunda')], max_length=10, verbose_name='Grado OD')),
+                ('degree_left', models.CharField(blank=True, choices=[('NORMAL', 'Normal'), ('MILD', 'Leve'), ('MODERATE', 'Moderada'), ('SEVERE', 'Severa'), ('PROFOUND', 'Profunda')], max_length=10, verbose_name='Grado OI')),
+                ('gap_right', models.FloatField(blank=True, null=True, verbose_name='Brecha aéreo-ósea OD')),
+                ('gap_left', models.FloatField(blank=True, null=True, verbose_name='Brecha aéreo-ósea OI')),
+                ('notch_right', models.BooleanField(default=False, verbose_name='Muesca 4 kHz OD')),
+                ('notch_left', models.BooleanField(default=False, verbose_name='Muesca 4 kHz OI')),
+                ('asymmetry', models.BooleanField(default=False, verbose_name='Asimetría interaural')),
+                ('masking_missing', models.BooleanField(default=False, verbose_name='Requería enmascaramiento')),
+                ('flagged', models.BooleanField(db_index=True, default=False, verbose_name='Para revisión')),
+                ('classified_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.18 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+from core.rut import parse_or_none
+
+
+def populate_rut_body(apps, schema_editor):
+    Patient = apps.get_model("core", "Patient")
+    objects = Patient.objects.using(schema_editor.connection.alias)
+    batch = []
+    for p in objects.only("id", "rut").iterator(chunk_size=2000):
+        p.rut_body, p.rut_dv = parse_or_none(p.rut)
+        batch.append(p)
+        if len(batch) >= 2000:
+            objects.bulk_update(batch, ["rut_body", "rut_dv"])
+            batch = []
+    if batch:
+        objects.bulk_update(batch, ["rut_body", "rut_dv"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_patient_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='rut_body',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='rut_dv',
+            field=models.CharField(blank=True, editable=False, max_length=1),
+        ),
+        migrations.RunPython(populate_rut_body, migrations.RunPython.noop),
+    ]
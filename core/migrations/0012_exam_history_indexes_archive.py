@@ -0,0 +1,60 @@
+# Generated by Django 4.2.18 on 2026-10-17 15:38
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_patient_rut_body'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('anamnesis', 'Anamnesis'), ('audiogram', 'Audiometría'), ('speech', 'Audiometría vocal'), ('ldl', 'LDL')], max_length=10, verbose_name='Tipo')),
+                ('source_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('import_key', models.CharField(blank=True, db_index=True, max_length=40)),
+                ('payload', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('file', models.CharField(blank=True, max_length=200)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='anamnesis',
+            index=models.Index(fields=['patient', '-date', '-id'], name='anamnesis_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiogram',
+            index=models.Index(fields=['patient', '-date', '-id'], name='audiogram_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ldl',
+            index=models.Index(fields=['patient', '-date', '-id'], name='ldl_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speechaudiometry',
+            index=models.Index(fields=['patient', '-date', '-id'], name='speech_patient_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedrecord',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='core.patient'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['patient', '-date', '-id'], name='archived_patient_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedrecord',
+            constraint=models.UniqueConstraint(fields=('kind', 'source_id'), name='archived_record_source_uniq'),
+        ),
+    ]
@@ -1,9 +1,17 @@
 from __future__ import annotations
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 from datetime import date
 from typing import Optional
 
+from . import lookups  # noqa: F401  (registra el lookup prefix_search)
+from .codec import EXT_FREQS, HF_FREQS, ThresholdVector  # noqa: F401
+from .fields import ThresholdVectorField
+from .normalize import fold_text, normalize_rut
+from .rut import parse_or_none as parse_rut
+
 SEX_CHOICES = (
     ("M", "Masculino"),
     ("F", "Femenino"),
@@ -35,9 +43,88 @@ TRANSDUCER_CHOICES = (
     ("SPEAKER", "Parlante"),
 )
 
+# Frecuencias convencionales (gráfico, PTA). Threshold guarda además las
+# intermedias y de alta frecuencia: ver core.codec.EXT_FREQS.
 FREQS = [250, 500, 1000, 2000, 3000, 4000, 6000, 8000]
 
-class Patient(models.Model):
+LOSS_DEGREE_CHOICES = (
+    ("NORMAL", "Normal"),
+    ("MILD", "Leve"),
+    ("MODERATE", "Moderada"),
+    ("SEVERE", "Severa"),
+    ("PROFOUND", "Profunda"),
+)
+
+# Límite superior (dB HL, inclusive) de cada grado; sobre el último es profunda
+LOSS_DEGREE_LIMITS = (
+    (20, "NORMAL"),
+    (40, "MILD"),
+    (70, "MODERATE"),
+    (90, "SEVERE"),
+)
+
+# PTA por edad: Adulto = (500, 1000, 2000); Pediátrico = (1000, 2000, 4000)
+PTA_ADULT = (500, 1000, 2000)
+PTA_PEDIATRIC = (1000, 2000, 4000)
+PEDIATRIC_MAX_AGE = 15  # regla simple: < 15 años es pediátrico
+
+
+def pta_frequencies(age: Optional[int]) -> tuple:
+    """Tripleta de frecuencias PTA según la edad a la fecha del examen."""
+    pediatric = (age is not None and age < PEDIATRIC_MAX_AGE)
+    return PTA_PEDIATRIC if pediatric else PTA_ADULT
+
+
+def pta_from_threshold(th, triple) -> Optional[float]:
+    """Promedio de la tripleta sobre un Threshold; None si falta algún valor."""
+    if th is None:
+        return None
+    values = [getattr(th, "f_{}".format(fq), None) for fq in triple]
+    vals = [v for v in values if isinstance(v, (int, float))]
+    if len(vals) < 3:
+        return None
+    return round(sum(vals) / 3.0, 1)
+
+
+def loss_degree_for(pta: Optional[float]) -> str:
+    """Grado de pérdida para un PTA; '' si no hay PTA."""
+    if pta is None:
+        return ""
+    for limit, degree in LOSS_DEGREE_LIMITS:
+        if pta <= limit:
+            return degree
+    return "PROFOUND"
+
+
+HISTORY_LIMIT = 5  # registros por sección en la ficha del paciente (core.patient_cache)
+
+
+class AuditedModel(models.Model):
+    """
+    Modelo con historial de cambios (core.audit). Al leerse de la base guarda
+    los valores de AUDIT_FIELDS (attnames): el diff de un save() sale de
+    ellos, sin volver a leer la fila.
+    """
+    AUDIT_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._audit_loaded = {
+            name: loaded[name].to_bytes() if isinstance(loaded[name], ThresholdVector) else loaded[name]
+            for name in cls.AUDIT_FIELDS
+            if name in loaded and loaded[name] is not models.DEFERRED
+        }
+        return instance
+
+
+class Patient(AuditedModel):
+    AUDIT_FIELDS = ("rut", "first_name", "last_name", "birth_date", "sex", "phone", "email")
+
     rut = models.CharField("RUT", max_length=20, unique=True)
     first_name = models.CharField("Nombres", max_length=80)
     last_name = models.CharField("Apellidos", max_length=80)
@@ -46,13 +133,38 @@ class Patient(models.Model):
     phone = models.CharField("Teléfono", max_length=30, blank=True)
     email = models.EmailField("Email", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # clave del caché de fragmentos de la ficha
+
+    # Columnas normalizadas para búsqueda (se recalculan en save())
+    rut_search = models.CharField(max_length=20, blank=True, editable=False, db_index=True)
+    search_name = models.CharField(max_length=170, blank=True, editable=False, db_index=True)
+    # RUT canónico (core.rut): cuerpo entero + DV; null si el RUT no es válido
+    rut_body = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    rut_dv = models.CharField(max_length=1, blank=True, editable=False)
 
     class Meta:
         ordering = ["last_name", "first_name"]
+        indexes = [
+            models.Index(fields=["last_name", "first_name"], name="patient_name_idx"),
+        ]
 
     def __str__(self):
         return f"{self.last_name}, {self.first_name} — {self.rut}"
 
+    def refresh_search_fields(self):
+        self.rut_search = normalize_rut(self.rut)
+        self.search_name = fold_text(f"{self.last_name} {self.first_name}")
+        self.rut_body, self.rut_dv = parse_rut(self.rut)
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields, "rut_search", "search_name", "rut_body", "rut_dv", "updated_at",
+            }
+        super().save(*args, **kwargs)
+
     def age_on(self, on_date: date | None = None) -> int | None:
         if not self.birth_date:
             return None
@@ -84,10 +196,32 @@ class Anamnesis(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [models.Index(fields=["patient", "-date", "-id"], name="anamnesis_patient_date_idx")]
+
+
+class AudiogramQuerySet(models.QuerySet):
+    def with_pta(self):
+        """
+        Precarga paciente y umbrales aéreos para calcular PTA sin consultas
+        por fila: 2 queries en total sin importar cuántos exámenes haya.
+        """
+        return self.select_related("patient").prefetch_related(
+            models.Prefetch(
+                "thresholds",
+                queryset=Threshold.objects.filter(pathway="AC"),
+                to_attr="ac_thresholds",
+            )
+        )
+
+
+class Audiogram(AuditedModel):
+    """
+    Cabecera del examen (tipo, transductor, etc.). PTA se calcula desde
+    Thresholds y se guarda desnormalizado (pta_*, loss_degree) para poder
+    filtrar/ordenar en la BD; ver refresh_pta().
+    """
+    AUDIT_FIELDS = ("patient_id", "date", "exam_type", "transducer", "masking_used", "comments")
 
-
-class Audiogram(models.Model):
-    """Cabecera del examen (tipo, transductor, etc.). PTA se calcula desde Thresholds."""
     patient = models.ForeignKey('Patient', on_delete=models.CASCADE, related_name="audiograms")
     date = models.DateField(default=timezone.now)
     exam_type = models.CharField(max_length=10, choices=AUDIOMETRY_TYPE_CHOICES, default="TONAL")
@@ -95,46 +229,70 @@ class Audiogram(models.Model):
     masking_used = models.BooleanField("Se usó enmascaramiento", default=False)
     comments = models.TextField("Comentarios", blank=True)
 
+    # PTA desnormalizado (dB HL); se mantiene con refresh_pta()
+    pta_right = models.FloatField("PTA OD", null=True, blank=True, editable=False, db_index=True)
+    pta_left = models.FloatField("PTA OI", null=True, blank=True, editable=False, db_index=True)
+    pta_binaural = models.FloatField("PTA binaural", null=True, blank=True, editable=False, db_index=True)
+    # Grado según el peor oído (o binaural si no hay OD/OI)
+    loss_degree = models.CharField(
+        "Grado de pérdida", max_length=10, choices=LOSS_DEGREE_CHOICES,
+        blank=True, editable=False, db_index=True,
+    )
+    # Clave de idempotencia para exámenes importados (ver core.importers)
+    import_key = models.CharField(max_length=40, null=True, blank=True, unique=True, editable=False)
+
+    objects = AudiogramQuerySet.as_manager()
+
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [models.Index(fields=["patient", "-date", "-id"], name="audiogram_patient_date_idx")]
+
+    def _ac_threshold(self, ear: str):
+        # Usa los umbrales precargados por with_pta() si existen
+        prefetched = self.__dict__.get("ac_thresholds")
+        if prefetched is not None:
+            return next((t for t in prefetched if t.ear == ear), None)
+        return self.thresholds.filter(ear=ear, pathway="AC").first()
 
-    # --- PTA por edad: Adulto = (500, 1000, 2000); Pediátrico = (1000, 2000, 4000)
     def pta(self, ear: str, on_date: Optional[date] = None) -> Optional[float]:
         if ear not in ("R", "L", "B"):
             return None
 
         # Determinar esquema por edad
-        age = self.patient.age_on(self.date)
-        pediatric = (age is not None and age < 15)  # regla simple
-        triple = (1000, 2000, 4000) if pediatric else (500, 1000, 2000)
+        triple = pta_frequencies(self.patient.age_on(self.date))
 
         # Buscar thresholds AÉREA del oído indicado (o binaural)
-        qs = self.thresholds.filter(ear=ear, pathway="AC").first()
-        if not qs:
-            return None
-
-        values = [getattr(qs, "f_{}".format(fq), None) for fq in triple]
-        vals = [v for v in values if isinstance(v, (int, float))]
-        if len(vals) < 3:
-            return None
-
-        return round(sum(vals) / 3.0, 1)
-
-    @property
-    def pta_right(self) -> Optional[float]:
-        return self.pta("R")
-
-    @property
-    def pta_left(self) -> Optional[float]:
-        return self.pta("L")
-
-    @property
-    def pta_binaural(self) -> Optional[float]:
-        return self.pta("B")
-
-
-class Threshold(models.Model):
+        return pta_from_threshold(self._ac_threshold(ear), triple)
+
+    def compute_pta(self) -> dict:
+        """Valores PTA/grado calculados desde los Thresholds (sin guardar)."""
+        values = {
+            "pta_right": self.pta("R"),
+            "pta_left": self.pta("L"),
+            "pta_binaural": self.pta("B"),
+        }
+        ears = [v for v in (values["pta_right"], values["pta_left"]) if v is not None]
+        worst = max(ears) if ears else values["pta_binaural"]
+        values["loss_degree"] = loss_degree_for(worst)
+        return values
+
+    def refresh_pta(self, save: bool = True) -> dict:
+        """Recalcula las columnas PTA; llamar después de guardar Thresholds."""
+        # Una sola consulta para los tres oídos (mismo atributo que with_pta)
+        self.ac_thresholds = list(self.thresholds.filter(pathway="AC"))
+        values = self.compute_pta()
+        for name, value in values.items():
+            setattr(self, name, value)
+        if save and self.pk:
+            # save(update_fields) y no .update(): emite post_save (core.dashboard)
+            self.save(update_fields=list(values))
+        return values
+
+
+class Threshold(AuditedModel):
     """Umbrales por oído y vía. Incluye símbolo para el gráfico (opcional)."""
+    AUDIT_FIELDS = ("audiogram_id", "ear", "pathway", "symbol", "levels")
+
     audiogram = models.ForeignKey(Audiogram, on_delete=models.CASCADE, related_name="thresholds")
     ear = models.CharField(max_length=1, choices=EAR_CHOICES)
     pathway = models.CharField(max_length=2, choices=PATHWAY_CHOICES, default="AC")
@@ -144,20 +302,29 @@ class Threshold(models.Model):
     # "<" (OD ósea sin máscara), ">" (OI ósea sin máscara), "[", "]" con máscara, etc.
     symbol = models.CharField("Símbolo", max_length=2, blank=True)
 
-    # Umbrales por frecuencia (dB HL)
-    f_250  = models.IntegerField(null=True, blank=True)
-    f_500  = models.IntegerField(null=True, blank=True)
-    f_1000 = models.IntegerField(null=True, blank=True)
-    f_2000 = models.IntegerField(null=True, blank=True)
-    f_3000 = models.IntegerField(null=True, blank=True)
-    f_4000 = models.IntegerField(null=True, blank=True)
-    f_6000 = models.IntegerField(null=True, blank=True)
-    f_8000 = models.IntegerField(null=True, blank=True)
+    # Umbrales por frecuencia (dB HL), un byte por frecuencia de EXT_FREQS.
+    # Se leen/escriben con los atributos f_125 … f_16000 (ver abajo).
+    levels = ThresholdVectorField("Umbrales")
 
     class Meta:
         unique_together = ("audiogram", "ear", "pathway")
 
 
+def _level_property(freq):
+    def fget(self):
+        return self.levels[freq]
+
+    def fset(self, value):
+        self.levels[freq] = value
+
+    return property(fget, fset, doc=f"Umbral a {freq} Hz (dB HL)")
+
+
+# Threshold.f_250, Threshold.f_500, …: acceso por frecuencia sobre `levels`
+for _freq in EXT_FREQS:
+    setattr(Threshold, f"f_{_freq}", _level_property(_freq))
+
+
 class SpeechAudiometry(models.Model):
     """Audiometría vocal: SRT/SDT y comprensión de la palabra (WRS)."""
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="speech_tests")
@@ -170,6 +337,7 @@ class SpeechAudiometry(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [models.Index(fields=["patient", "-date", "-id"], name="speech_patient_date_idx")]
 
 
 class LDL(models.Model):
@@ -185,3 +353,203 @@ class LDL(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [models.Index(fields=["patient", "-date", "-id"], name="ldl_patient_date_idx")]
+
+
+class PatientSummary(models.Model):
+    """
+    Una fila por paciente con lo que muestran los listados (última visita,
+    último PTA, grado, banderas de la última anamnesis). Se mantiene desde
+    core.summaries; el listado ordena y filtra sobre estas columnas sin
+    consultar las tablas clínicas.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    last_visit = models.DateField("Última visita", null=True, blank=True, db_index=True)
+    visit_count = models.PositiveIntegerField("Visitas", default=0)
+    exam_count = models.PositiveIntegerField("Audiometrías", default=0)
+    last_exam_date = models.DateField("Última audiometría", null=True, blank=True)
+    last_pta_right = models.FloatField("Último PTA OD", null=True, blank=True)
+    last_pta_left = models.FloatField("Último PTA OI", null=True, blank=True)
+    last_pta_worst = models.FloatField("Último PTA (peor oído)", null=True, blank=True, db_index=True)
+    last_loss_degree = models.CharField(
+        "Último grado de pérdida", max_length=10, choices=LOSS_DEGREE_CHOICES, blank=True, db_index=True,
+    )
+    # Última anamnesis
+    tinnitus = models.BooleanField("Acúfenos / Tinnitus", default=False)
+    vertigo = models.BooleanField("Vértigo", default=False)
+    hearing_aids = models.BooleanField("Uso de audífonos", default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resumen de {self.patient_id}"
+
+
+LOSS_TYPE_CHOICES = (
+    ("NORMAL", "Normal"),
+    ("CONDUCTIVE", "Conductiva"),
+    ("SENSORINEURAL", "Neurosensorial"),
+    ("MIXED", "Mixta"),
+)
+
+
+class AudiogramClassification(models.Model):
+    """
+    Tipo y grado de pérdida por oído y banderas de revisión de una
+    audiometría, calculados en lote por core.classification. Tipo vacío:
+    sin vía ósea suficiente para decidir.
+    """
+    audiogram = models.OneToOneField(
+        Audiogram, on_delete=models.CASCADE, primary_key=True, related_name="classification",
+    )
+    version = models.PositiveSmallIntegerField(default=0)
+    type_right = models.CharField("Tipo OD", max_length=15, choices=LOSS_TYPE_CHOICES, blank=True)
+    type_left = models.CharField("Tipo OI", max_length=15, choices=LOSS_TYPE_CHOICES, blank=True)
+    degree_right = models.CharField("Grado OD", max_length=10, choices=LOSS_DEGREE_CHOICES, blank=True)
+    degree_left = models.CharField("Grado OI", max_length=10, choices=LOSS_DEGREE_CHOICES, blank=True)
+    gap_right = models.FloatField("Brecha aéreo-ósea OD", null=True, blank=True)
+    gap_left = models.FloatField("Brecha aéreo-ósea OI", null=True, blank=True)
+    notch_right = models.BooleanField("Muesca 4 kHz OD", default=False)
+    notch_left = models.BooleanField("Muesca 4 kHz OI", default=False)
+    asymmetry = models.BooleanField("Asimetría interaural", default=False)
+    masking_missing = models.BooleanField("Requería enmascaramiento", default=False)
+    # Alguna de las banderas anteriores: cola de revisión clínica
+    flagged = models.BooleanField("Para revisión", default=False, db_index=True)
+    classified_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Clasificación de {self.audiogram_id}"
+
+
+PRESCRIPTION_RULE_CHOICES = (
+    ("NAL-R", "NAL-R"),
+    ("POGO", "POGO"),
+    ("HALF", "Medio gain (Lybarger)"),
+)
+
+
+class PrescriptionTarget(models.Model):
+    """
+    Objetivos de ganancia de inserción ya calculados (ver core.prescription).
+    La clave es un hash de la regla y de los umbrales/LDL de entrada, no del
+    examen: audiometrías con los mismos valores comparten la fila.
+    """
+    key = models.CharField(max_length=40, unique=True)
+    rule = models.CharField("Regla", max_length=10, choices=PRESCRIPTION_RULE_CHOICES)
+    targets = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.rule} {self.key[:8]}"
+
+
+ARCHIVE_KIND_CHOICES = (
+    ("anamnesis", "Anamnesis"),
+    ("audiogram", "Audiometría"),
+    ("speech", "Audiometría vocal"),
+    ("ldl", "LDL"),
+)
+
+
+class ArchivedRecord(models.Model):
+    """
+    Registro clínico antiguo sacado de las tablas activas por core.archive.
+    El registro completo (con sus trazos, si es audiometría) va en `payload`
+    o, con ARCHIVE_BACKEND=jsonl, como una línea de `file`. Al pedirlo se
+    restaura con su pk original.
+    """
+    kind = models.CharField("Tipo", max_length=10, choices=ARCHIVE_KIND_CHOICES)
+    source_id = models.BigIntegerField()
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="archived_records")
+    date = models.DateField()
+    import_key = models.CharField(max_length=40, blank=True, db_index=True)  # reimportar no duplica
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    file = models.CharField(max_length=200, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-date", "-id"]
+        constraints = [models.UniqueConstraint(fields=["kind", "source_id"], name="archived_record_source_uniq")]
+        indexes = [models.Index(fields=["patient", "-date", "-id"], name="archived_patient_date_idx")]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.source_id} ({self.date})"
+
+
+AUDIT_ACTION_CHOICES = (
+    ("create", "Alta"),
+    ("update", "Modificación"),
+    ("delete", "Eliminación"),
+)
+
+
+class AuditEntry(models.Model):
+    """
+    Cambio de un Patient, Audiogram o Threshold (core.audit). Solo se
+    agregan filas. `changes` lleva únicamente los campos que cambiaron,
+    {campo: [antes, después]}. Sin FK real al paciente: el historial
+    sobrevive a la ficha.
+    """
+    patient = models.ForeignKey(
+        Patient, on_delete=models.DO_NOTHING, db_constraint=False, related_name="audit_entries",
+    )
+    at = models.DateTimeField("Fecha", default=timezone.now)
+    model = models.CharField("Modelo", max_length=20)
+    object_id = models.BigIntegerField(null=True, blank=True)  # trazo nuevo del upsert: sin pk
+    action = models.CharField("Acción", max_length=6, choices=AUDIT_ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+",
+    )
+    origin = models.CharField("Origen", max_length=100, blank=True)  # vista o trabajo
+
+    class Meta:
+        ordering = ["-at", "-id"]
+        indexes = [models.Index(fields=["patient", "-at", "-id"], name="audit_patient_at_idx")]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.model} #{self.object_id} ({self.at:%Y-%m-%d %H:%M})"
+
+
+JOB_STATUS_CHOICES = (
+    ("QUEUED", "En cola"),
+    ("RUNNING", "En ejecución"),
+    ("DONE", "Terminado"),
+    ("FAILED", "Fallido"),
+)
+
+
+class Job(models.Model):
+    """Trabajo en segundo plano (core.jobs); lo ejecuta `manage.py worker`."""
+    kind = models.CharField("Tipo", max_length=40)
+    status = models.CharField("Estado", max_length=10, choices=JOB_STATUS_CHOICES, default="QUEUED")
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    input_file = models.FileField(upload_to="jobs/input/%Y/%m/", blank=True)
+    output_file = models.FileField(upload_to="jobs/output/%Y/%m/", blank=True)
+
+    progress = models.PositiveSmallIntegerField("Avance (%)", default=0)
+    progress_message = models.CharField(max_length=200, blank=True)
+    attempts = models.PositiveSmallIntegerField("Intentos", default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    error = models.TextField(blank=True)
+
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [models.Index(fields=["status", "run_after"], name="job_queue_idx")]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in ("QUEUED", "RUNNING")
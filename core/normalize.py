@@ -0,0 +1,28 @@
+"""Normalización de texto para búsquedas (nombres sin tildes, RUT compacto)."""
+import re
+import unicodedata
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_RUT_CHARS = re.compile(r"[^0-9K]+")
+_RUT_LIKE = re.compile(r"^[\d.\s-]*\d[\d.\s-]*[kK]?$")
+
+
+def fold_text(text: str) -> str:
+    """'Muñoz  Pérez' -> 'munoz perez' (minúsculas, sin tildes, solo alfanumérico)."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    ascii_text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", ascii_text.lower()).strip()
+
+
+def normalize_rut(text: str) -> str:
+    """'12.345.678-k' -> '12345678K' (solo dígitos y dígito verificador K)."""
+    if not text:
+        return ""
+    return _RUT_CHARS.sub("", text.upper())
+
+
+def looks_like_rut(text: str) -> bool:
+    """True si el texto es un RUT (completo o parcial) y no un nombre."""
+    return bool(text) and bool(_RUT_LIKE.match(text.strip()))
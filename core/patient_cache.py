@@ -0,0 +1,197 @@
+"""
+Caché de lectura de pacientes y de los datos de su ficha.
+
+Las vistas piden el paciente (get_patient) o la ficha completa (detail:
+últimas anamnesis, audiometrías con PTA y clasificación, vocal, LDL,
+registros archivados y tendencia) a este módulo. Si no está en el caché "objects" se lee de la base
+y se guarda. Al navegar dentro de una visita (ficha → nueva audiometría →
+ficha) las siguientes lecturas no tocan la base.
+
+Las claves llevan una versión por paciente y una generación global:
+
+    <tipo>:<pk>:<generación>:<versión>
+
+Guardar o borrar un paciente o cualquier sección clínica cambia su versión
+(bump), ahora y otra vez al confirmar la transacción: las entradas viejas
+quedan huérfanas y el LRU las descarta. Los procesos por lote que escriben
+sin señales llaman a bump() con los pacientes tocados, o a bump_all() si
+recorren toda la tabla. Las versiones son marcas de tiempo: una lectura
+hecha en la réplica no se guarda si el último cambio tiene menos de
+REPLICA_PIN_SECONDS (la réplica podría no tenerlo todavía).
+
+El backend es locmem con MAX_ENTRIES (LRU, por proceso) o file
+(OBJECT_CACHE_BACKEND=file), compartido por los procesos del servidor.
+Con locmem y varios procesos, un cambio se ve en los demás recién cuando la
+entrada expira (OBJECT_CACHE_TIMEOUT).
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404
+
+from . import analytics
+from .models import HISTORY_LIMIT, LDL, Anamnesis, Audiogram, Patient, SpeechAudiometry
+from .routers import reading_from_replica
+
+CACHE_ALIAS = "objects"
+ARCHIVED_LIMIT = 20  # registros archivados (core.archive) listados en la ficha
+GENERATION_KEY = "generation"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+# --------- Métricas ---------
+class CacheStats:
+    """Aciertos y fallos por tipo de entrada (en memoria del proceso)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()  # (tipo, "hit"|"miss") -> veces
+
+    def record(self, kind, hit):
+        with self._lock:
+            self.counts[(kind, "hit" if hit else "miss")] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+    def summary(self):
+        with self._lock:
+            counts = dict(self.counts)
+        rows = []
+        for kind in sorted({kind for kind, _ in counts}):
+            hits, misses = counts.get((kind, "hit"), 0), counts.get((kind, "miss"), 0)
+            rows.append({"kind": kind, "hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses)})
+        return rows
+
+
+stats = CacheStats()
+
+
+# --------- Versiones ---------
+def _version_key(pk):
+    return f"v:{pk}"
+
+
+def _lookup(kind, pk):
+    """(clave vigente, valor en caché o None, ns del último cambio)."""
+    cache = _cache()
+    names = (GENERATION_KEY, _version_key(pk))
+    versions = cache.get_many(names)
+    for name in names:
+        if name not in versions:
+            # Versión inicial negativa: única, pero no cuenta como cambio reciente
+            initial = -time.time_ns()
+            cache.add(name, initial, None)
+            versions[name] = cache.get(name, initial)  # otro proceso pudo ganar: se relee
+    key = f"{kind}:{pk}:{versions[GENERATION_KEY]}:{versions[names[1]]}"
+    value = cache.get(key)
+    stats.record(kind, value is not None)
+    return key, value, max(0, *versions.values())
+
+
+def _storable(changed_at):
+    """Lo leído de la réplica se guarda solo si el último cambio ya debería estar en ella."""
+    return not reading_from_replica() or time.time_ns() - changed_at > settings.REPLICA_PIN_SECONDS * 10**9
+
+
+def _bump_now(patient_ids):
+    version = time.time_ns()
+    _cache().set_many({_version_key(pk): version for pk in patient_ids}, None)
+
+
+def bump(patient_ids):
+    """Invalida lo cacheado de esos pacientes (ahora y al confirmar la transacción)."""
+    patient_ids = {pk for pk in patient_ids if pk is not None}
+    if patient_ids:
+        _bump_now(patient_ids)
+        transaction.on_commit(lambda: _bump_now(patient_ids))
+
+
+def bump_all():
+    """Invalida todas las entradas (procesos que recorren toda la tabla)."""
+    _cache().set(GENERATION_KEY, time.time_ns(), None)
+
+
+# --------- Lecturas ---------
+def get_patient(pk):
+    """Patient por pk desde el caché; Patient.DoesNotExist si no existe."""
+    key, patient, changed_at = _lookup("patient", pk)
+    if patient is None:
+        patient = Patient.objects.get(pk=pk)
+        if _storable(changed_at):
+            _cache().set(key, patient)
+    return patient
+
+
+def get_patient_or_404(pk):
+    try:
+        return get_patient(pk)
+    except (Patient.DoesNotExist, ValueError):
+        raise Http404("Paciente no encontrado.")
+
+
+async def _alist(qs):
+    return [obj async for obj in qs]
+
+
+async def _load_detail(pk):
+    # Secciones independientes, acotadas a los últimos registros, en paralelo
+    try:
+        p = await Patient.objects.aget(pk=pk)
+    except Patient.DoesNotExist:
+        raise Http404("Paciente no encontrado.")
+    anamneses, audiograms, speech, ldl, archived, trend = await asyncio.gather(
+        _alist(p.anamneses.all()[:HISTORY_LIMIT]),
+        _alist(p.audiograms.select_related("classification")[:HISTORY_LIMIT]),
+        _alist(p.speech_tests.all()[:HISTORY_LIMIT]),
+        _alist(p.ldl_tests.all()[:HISTORY_LIMIT]),
+        _alist(p.archived_records.only("patient_id", "kind", "source_id", "date")[:ARCHIVED_LIMIT]),
+        sync_to_async(analytics.patient_trend)(p),
+    )
+    return {
+        "patient": p, "anamneses": anamneses, "audiograms": audiograms, "speech": speech, "ldl": ldl,
+        "archived": archived, "trend": trend,
+    }
+
+
+async def detail(pk):
+    """Contexto de la ficha del paciente (dict), desde el caché o la base."""
+    key, data, changed_at = await sync_to_async(_lookup)("detail", pk)
+    if data is None:
+        data = await _load_detail(pk)
+        if _storable(changed_at):
+            patient_key = key.replace("detail:", "patient:", 1)
+            await sync_to_async(_cache().set_many)({key: data, patient_key: data["patient"]})
+    return data
+
+
+# --------- Señales ---------
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def _on_patient_changed(sender, instance, **kwargs):
+    bump([instance.pk])
+
+
+@receiver(post_save, sender=Anamnesis)
+@receiver(post_save, sender=Audiogram)
+@receiver(post_save, sender=SpeechAudiometry)
+@receiver(post_save, sender=LDL)
+@receiver(post_delete, sender=Anamnesis)
+@receiver(post_delete, sender=Audiogram)
+@receiver(post_delete, sender=SpeechAudiometry)
+@receiver(post_delete, sender=LDL)
+def _on_section_changed(sender, instance, **kwargs):
+    # Trazos y clasificación se escriben junto con su Audiogram (save_audiogram, admin)
+    bump([instance.patient_id])
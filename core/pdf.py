@@ -0,0 +1,83 @@
+"""
+Generador PDF mínimo (solo texto) para informes clínicos.
+
+Evita agregar una dependencia pesada: escribe páginas A4 con Helvetica /
+Helvetica-Bold en WinAnsiEncoding (acentos y ñ), con salto de página
+automático.
+"""
+import zlib
+
+PAGE_W, PAGE_H = 595, 842  # A4 en puntos
+MARGIN = 50
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class PDFDocument:
+    def __init__(self, title=""):
+        self.title = title
+        self.pages = []
+        self._ops = []
+        self._y = PAGE_H - MARGIN
+
+    def _new_page(self):
+        if self._ops:
+            self.pages.append(self._ops)
+        self._ops = []
+        self._y = PAGE_H - MARGIN
+
+    def line(self, text="", size=10, bold=False, indent=0):
+        leading = size * 1.4
+        if self._y - leading < MARGIN:
+            self._new_page()
+        self._y -= leading
+        font = "F2" if bold else "F1"
+        self._ops.append(
+            f"BT /{font} {size} Tf {MARGIN + indent} {self._y:.1f} Td ({_escape(text)}) Tj ET"
+        )
+
+    def space(self, height=6):
+        self._y -= height
+
+    def render(self):
+        if self._ops or not self.pages:
+            self.pages.append(self._ops)
+            self._ops = []
+
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # Pages: se completa abajo
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+        kids = []
+        for ops in self.pages:
+            stream = zlib.compress("\n".join(ops).encode("cp1252", errors="replace"))
+            objects.append(
+                b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream"
+            )
+            content_ref = len(objects)
+            objects.append(
+                (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+                 f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_ref} 0 R >>").encode()
+            )
+            kids.append(f"{len(objects)} 0 R")
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+        info = f"<< /Title ({_escape(self.title)}) /Producer (Sistema Audiologia) >>".encode("cp1252", errors="replace")
+        objects.append(info)
+
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for i, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for off in offsets:
+            out += b"%010d 00000 n \n" % off
+        out += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, len(objects), xref,
+        )
+        return bytes(out)
@@ -0,0 +1,65 @@
+"""
+Métricas de rendimiento por vista (en memoria del proceso).
+
+PerformanceMiddleware registra una muestra por request; aquí se guardan
+las últimas PERF_WINDOW muestras de cada vista y se calculan percentiles
+para la página de staff. Cada worker de gunicorn tiene su propio registro.
+"""
+import threading
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+
+METRICS = ("total_ms", "db_ms", "queries", "template_ms")
+
+
+def conf(name, default):
+    return getattr(settings, name, default)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class RequestStats:
+    """Ventana deslizante de muestras por vista + contadores de alertas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=conf("PERF_WINDOW", 1000)))
+        self.flags = Counter()  # (vista, tipo) -> veces
+
+    def record(self, view, sample, flags=()):
+        with self._lock:
+            self._samples[view].append(sample)
+            for flag in flags:
+                self.flags[(view, flag)] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.flags.clear()
+
+    def summary(self, pcts=(50, 95, 99)):
+        with self._lock:
+            snapshot = {view: list(samples) for view, samples in self._samples.items()}
+            flags = dict(self.flags)
+        rows = []
+        for view, samples in sorted(snapshot.items()):
+            row = {"view": view, "count": len(samples), "flags": {}}
+            for i, metric in enumerate(METRICS):
+                values = sorted(s[i] for s in samples)
+                row[metric] = {p: percentile(values, p) for p in pcts}
+            for (v, flag), n in flags.items():
+                if v == view:
+                    row["flags"][flag] = n
+            rows.append(row)
+        return rows
+
+
+stats = RequestStats()
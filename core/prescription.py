@@ -0,0 +1,234 @@
+"""
+Objetivos de ganancia de inserción para adaptación de audífonos.
+
+prescribe() trabaja sobre arreglos NumPy de umbrales (dB HL) con cualquier
+número de ejes iniciales (oídos, pacientes…). Devuelve la ganancia por
+nivel de entrada y frecuencia, sin recorrer valores en Python. La misma
+función sirve para un examen o para toda la cohorte de candidatos.
+
+Reglas (ganancia para habla a 65 dB):
+    HALF    medio gain (Lybarger): 0.5·HTL
+    POGO    0.5·HTL − 10 dB a 250 Hz y − 5 dB a 500 Hz
+    NAL-R   0.05·(H500+H1k+H2k) + 0.31·HTL + k(f)
+A todas se suma 0.25 de la brecha aéreo-ósea cuando hay vía ósea. Para
+50 y 80 dB la ganancia se ajusta con una compresión que crece con la
+pérdida (aproximación lineal por tramos, no NAL-NL2). La ganancia nunca es
+negativa y la salida (entrada + ganancia) no supera el LDL medido,
+interpolado entre 500 y 4000 Hz.
+
+Los resultados se memorizan en PrescriptionTarget con una clave derivada de
+la regla y de los valores de entrada: exámenes con los mismos umbrales y
+LDL comparten el cálculo. precompute() los deja listos para todos los
+candidatos a audífono (comando precompute_prescriptions, pensado para cron
+nocturno).
+"""
+import hashlib
+
+import numpy as np
+from django.db.models import OuterRef, Q, Subquery
+
+from . import codec
+from .models import (
+    LDL, LOSS_DEGREE_CHOICES, PRESCRIPTION_RULE_CHOICES, Audiogram, PatientSummary,
+    PrescriptionTarget, Threshold,
+)
+
+RULE_VERSION = 1  # cambiar al modificar fórmulas: invalida las claves anteriores
+RULES = dict(PRESCRIPTION_RULE_CHOICES)
+DEFAULT_RULE = "NAL-R"
+FREQS = (250, 500, 1000, 1500, 2000, 3000, 4000, 6000)
+INPUT_LEVELS = (50, 65, 80)  # dB: habla suave, media, fuerte
+EARS = ("R", "L")
+LDL_FREQS = (500, 1000, 2000, 4000)
+LDL_FIELDS = ("ldl_500", "ldl_1k", "ldl_2k", "ldl_4k")
+CANDIDATE_DEGREES = [code for code, _ in LOSS_DEGREE_CHOICES if code != "NORMAL"]
+CONDUCTIVE_FACTOR = 0.25
+CHUNK_SIZE = 1000
+
+_FREQS = np.array(FREQS, dtype=float)
+_LEVELS = np.array(INPUT_LEVELS, dtype=float)
+_LEVEL_IDX = [codec.INDEX[f] for f in FREQS]
+_NAL_IDX = [FREQS.index(f) for f in (500, 1000, 2000)]
+_NAL_K = np.array([-17, -8, 1, 1, -1, -2, -2, -2], dtype=float)
+_POGO_K = np.array([-10, -5, 0, 0, 0, 0, 0, 0], dtype=float)
+
+# Interpolación fija de LDL_FREQS a FREQS (constante fuera de 500–4000 Hz)
+_x, _t = np.log2(LDL_FREQS), np.log2(_FREQS)
+_LDL_HI = np.clip(np.searchsorted(_x, _t), 1, len(_x) - 1)
+_LDL_LO = _LDL_HI - 1
+_LDL_W = np.clip((_t - _x[_LDL_LO]) / (_x[_LDL_HI] - _x[_LDL_LO]), 0, 1)
+
+
+# --------- Cálculo vectorizado ---------
+def _gain_65(rule, ac):
+    if rule == "HALF":
+        return 0.5 * ac
+    if rule == "POGO":
+        return 0.5 * ac + _POGO_K
+    if rule == "NAL-R":
+        x = 0.05 * ac[..., _NAL_IDX].sum(axis=-1, keepdims=True)  # NaN si falta alguna
+        return x + 0.31 * ac + _NAL_K
+    raise ValueError(f"Regla de prescripción desconocida: {rule}")
+
+
+def compression_ratio(ac):
+    """1:1 hasta 20 dB HL, luego +0.1 por cada 5 dB, tope 3:1."""
+    return np.clip(1 + (ac - 20) / 50, 1, 3)
+
+
+def _ldl_limit(ldl):
+    """LDL (..., LDL_FREQS) llevado a FREQS: huecos con el vecino, interpolación en log f."""
+    filled = np.array(ldl, dtype=float)
+    for j in range(1, len(LDL_FREQS)):
+        filled[..., j] = np.where(np.isnan(filled[..., j]), filled[..., j - 1], filled[..., j])
+    for j in range(len(LDL_FREQS) - 2, -1, -1):
+        filled[..., j] = np.where(np.isnan(filled[..., j]), filled[..., j + 1], filled[..., j])
+    return filled[..., _LDL_LO] * (1 - _LDL_W) + filled[..., _LDL_HI] * _LDL_W
+
+
+def prescribe(ac, bc=None, ldl=None, rule=DEFAULT_RULE):
+    """
+    Ganancia de inserción (dB) de forma (..., len(INPUT_LEVELS), len(FREQS)).
+
+    `ac`/`bc`: umbrales aéreos/óseos (..., len(FREQS)), NaN donde no hay
+    dato. `ldl`: (..., len(LDL_FREQS)). Frecuencias sin umbral aéreo quedan
+    NaN.
+    """
+    ac = np.asarray(ac, dtype=float)
+    gain = _gain_65(rule, ac)
+    if bc is not None:
+        gap = np.nan_to_num(np.clip(ac - np.asarray(bc, dtype=float), 0, None))
+        gain = gain + CONDUCTIVE_FACTOR * gap
+
+    slope = 1 - 1 / compression_ratio(ac)
+    gain = gain[..., None, :] + (65 - _LEVELS)[:, None] * slope[..., None, :]
+    if ldl is not None:
+        headroom = _ldl_limit(ldl)[..., None, :] - _LEVELS[:, None]
+        gain = np.fmin(gain, np.where(np.isnan(gain), np.nan, headroom))
+    return np.round(np.clip(gain, 0, None), 1)
+
+
+# --------- Entradas desde la base ---------
+def _levels(vector):
+    return codec.to_float(vector.array()[_LEVEL_IDX])
+
+
+def _empty(*shape):
+    return np.full(shape, np.nan)
+
+
+def target_key(rule, ac, bc, ldl):
+    raw = f"{rule}|{RULE_VERSION}|".encode() + b"".join(
+        np.ascontiguousarray(a, dtype=np.float32).tobytes() for a in (ac, bc, ldl)
+    )
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _as_json(gain):
+    """{oído: [[dB por frecuencia] por nivel]} con None en lugar de NaN."""
+    return {
+        ear: [[None if np.isnan(v) else float(v) for v in row] for row in gain[i]]
+        for i, ear in enumerate(EARS)
+    }
+
+
+def _latest_ldl(exam_dates):
+    """{(paciente, oído): fila LDL} más reciente hasta la fecha del examen de cada paciente."""
+    qs = (
+        LDL.objects.filter(patient_id__in=exam_dates, ear__in=EARS).order_by("date", "pk")
+        .values_list("patient_id", "ear", "date", *LDL_FIELDS)
+    )
+    latest = {}
+    for patient_id, ear, day, *values in qs:
+        if day <= exam_dates[patient_id]:
+            latest[patient_id, ear] = [np.nan if v is None else v for v in values]
+    return latest
+
+
+def exam_inputs(audiogram, thresholds=None, ldl=None):
+    """Arreglos (ac, bc, ldl) por oído (EARS) de una audiometría."""
+    thresholds = audiogram.thresholds.all() if thresholds is None else thresholds
+    ac, bc = _empty(len(EARS), len(FREQS)), _empty(len(EARS), len(FREQS))
+    for th in thresholds:
+        if th.ear in EARS:
+            (ac if th.pathway == "AC" else bc)[EARS.index(th.ear)] = _levels(th.levels)
+    if ldl is None:
+        ldl = _latest_ldl({audiogram.patient_id: audiogram.date})
+    ldl_arr = np.array([ldl.get((audiogram.patient_id, ear), [np.nan] * len(LDL_FREQS)) for ear in EARS])
+    return ac, bc, ldl_arr
+
+
+def targets_for(audiogram, rule=DEFAULT_RULE):
+    """Objetivos de una audiometría (memorizados por valores de entrada)."""
+    ac, bc, ldl = exam_inputs(audiogram)
+    key = target_key(rule, ac, bc, ldl)
+    target = PrescriptionTarget.objects.filter(key=key).first()
+    if target is None:
+        target = PrescriptionTarget(key=key, rule=rule, targets=_as_json(prescribe(ac, bc, ldl, rule)))
+        PrescriptionTarget.objects.bulk_create([target], ignore_conflicts=True)
+    return target.targets
+
+
+# --------- Modo lote ---------
+def candidates():
+    """Pacientes a evaluar para audífono: usuarios actuales o con pérdida en su último examen."""
+    return PatientSummary.objects.filter(Q(hearing_aids=True) | Q(last_loss_degree__in=CANDIDATE_DEGREES))
+
+
+def _latest_exams(patient_ids):
+    latest = Audiogram.objects.filter(patient=OuterRef("patient")).order_by("-date", "-pk")
+    return list(
+        PatientSummary.objects.filter(patient_id__in=patient_ids)
+        .annotate(exam_id=Subquery(latest.values("pk")[:1]), exam_date=Subquery(latest.values("date")[:1]))
+        .exclude(exam_id=None)
+        .values_list("patient_id", "exam_id", "exam_date")
+    )
+
+
+def _compute_chunk(patient_ids, rules):
+    exams = _latest_exams(patient_ids)
+    if not exams:
+        return 0
+    row = {exam_id: i for i, (_, exam_id, _) in enumerate(exams)}
+    ac, bc = _empty(len(exams), len(EARS), len(FREQS)), _empty(len(exams), len(EARS), len(FREQS))
+    rows = Threshold.objects.filter(audiogram_id__in=row, ear__in=EARS).values_list("audiogram_id", "ear", "pathway", "levels")
+    for exam_id, ear, pathway, levels in rows:
+        (ac if pathway == "AC" else bc)[row[exam_id], EARS.index(ear)] = _levels(levels)
+    latest_ldl = _latest_ldl({pid: day for pid, _, day in exams})
+    ldl = np.array([
+        [latest_ldl.get((pid, ear), [np.nan] * len(LDL_FIELDS)) for ear in EARS] for pid, _, _ in exams
+    ])
+
+    created = 0
+    for rule in rules:
+        keys = [target_key(rule, ac[i], bc[i], ldl[i]) for i in range(len(exams))]
+        existing = set(PrescriptionTarget.objects.filter(key__in=keys).values_list("key", flat=True))
+        todo = {}
+        for i, key in enumerate(keys):
+            if key not in existing:
+                todo.setdefault(key, i)  # umbrales repetidos: se calculan una vez
+        todo = list(todo.values())
+        if not todo:
+            continue
+        gains = prescribe(ac[todo], bc[todo], ldl[todo], rule)  # todos los exámenes de una vez
+        PrescriptionTarget.objects.bulk_create(
+            [PrescriptionTarget(key=keys[i], rule=rule, targets=_as_json(g)) for i, g in zip(todo, gains)],
+            ignore_conflicts=True,
+        )
+        created += len(todo)
+    return created
+
+
+def precompute(rules=None, chunk_size=CHUNK_SIZE, log=None):
+    """Calcula los objetivos que falten para el último examen de cada candidato."""
+    rules = rules or list(RULES)
+    ids = candidates().order_by("pk").values_list("pk", flat=True)
+    created, last_pk = 0, 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return created
+        created += _compute_chunk(chunk, rules)
+        last_pk = chunk[-1]
+        if log:
+            log(f"  {created} objetivos calculados…")
@@ -0,0 +1,85 @@
+"""
+Lecturas desde la réplica.
+
+Las vistas de consulta más frecuentes (listado y ficha de pacientes) se
+decoran con read_from_replica: mientras corren, ReplicaRouter manda las
+lecturas de los modelos de core a la alias REPLICA_ALIAS, si está
+configurada y REPLICA_READS está activo. Las escrituras, la sesión y el usuario siguen en default.
+
+Una réplica puede ir atrasada. Para que quien acaba de guardar vea su
+cambio, PinPrimaryMiddleware marca con una cookie corta al cliente que hizo
+un POST, y mientras dure sus lecturas vuelven a default.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA_ALIAS = "replica"
+PIN_COOKIE = "primary_pin"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_configured():
+    return settings.REPLICA_READS and REPLICA_ALIAS in settings.DATABASES
+
+
+def read_from_replica(view):
+    """Decorador para vistas async de solo lectura."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not replica_configured() or request.COOKIES.get(PIN_COOKIE):
+            return await view(request, *args, **kwargs)
+        token = _use_replica.set(True)  # sync_to_async copia el contexto
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+def reading_from_replica():
+    """True dentro de una vista read_from_replica que está usando la réplica."""
+    return _use_replica.get()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label == "core":
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # misma base de datos, distinta conexión
+
+
+class PinPrimaryMiddleware:
+    """Después de una escritura, lecturas de ese cliente a default por REPLICA_PIN_SECONDS."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._pin(request, await self.get_response(request))
+
+    def _pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS") and replica_configured():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
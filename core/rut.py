@@ -0,0 +1,69 @@
+"""
+RUT chileno: validación (módulo 11) y forma canónica.
+
+Un RUT se guarda como cuerpo entero + dígito verificador (Patient.rut_body,
+Patient.rut_dv). "12.345.678-5", "12345678-5" y "123456785" son el mismo
+cuerpo 12345678, así que la búsqueda exacta es una sonda sobre un índice
+entero y los duplicados por formato se detectan (ver el comando
+merge_duplicate_patients).
+"""
+import re
+
+from .normalize import normalize_rut
+
+MAX_BODY = 99_999_999
+_COMPACT = re.compile(r"^(\d{1,8})([0-9K])$")
+
+
+class InvalidRut(ValueError):
+    pass
+
+
+def check_digit(body: int) -> str:
+    """Dígito verificador (módulo 11) del cuerpo del RUT."""
+    total, factor = 0, 2
+    while body:
+        total += (body % 10) * factor
+        body //= 10
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - total % 11
+    return {11: "0", 10: "K"}.get(dv, str(dv))
+
+
+def parse(text: str) -> tuple[int, str]:
+    """
+    (cuerpo, dv) de un RUT en cualquier formato habitual. El último carácter
+    es siempre el dígito verificador. InvalidRut si no es un RUT o si el
+    dígito no corresponde.
+    """
+    match = _COMPACT.match(normalize_rut(text))
+    if not match:
+        raise InvalidRut("RUT con formato inválido.")
+    body, dv = int(match.group(1)), match.group(2)
+    if not 0 < body <= MAX_BODY:
+        raise InvalidRut("RUT fuera de rango.")
+    if check_digit(body) != dv:
+        raise InvalidRut("Dígito verificador incorrecto.")
+    return body, dv
+
+
+def parse_or_none(text: str):
+    """Como parse(), pero (None, "") si no es válido (datos históricos)."""
+    try:
+        return parse(text)
+    except InvalidRut:
+        return None, ""
+
+
+def is_valid(text: str) -> bool:
+    return parse_or_none(text)[0] is not None
+
+
+def format_rut(body: int, dv: str | None = None) -> str:
+    """12345678 -> '12.345.678-5'."""
+    return f"{body:,}".replace(",", ".") + "-" + (dv or check_digit(body))
+
+
+def canonical(text: str) -> str:
+    """Forma de presentación única de un RUT válido (InvalidRut si no lo es)."""
+    return format_rut(*parse(text))
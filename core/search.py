@@ -0,0 +1,38 @@
+"""Búsqueda de pacientes sobre columnas normalizadas e indexadas."""
+from django.db.models import Q
+
+from .models import Patient
+from .normalize import fold_text, looks_like_rut, normalize_rut
+from .rut import parse_or_none as parse_rut
+
+MAX_TOKENS = 5
+
+
+def search_patients(q: str, qs=None):
+    """
+    Filtra pacientes por RUT o por nombre (prefijo de palabra sobre
+    search_name). Un RUT completo y válido con DV explícito ("…-5", "…K") es
+    una igualdad sobre el índice entero rut_body; uno parcial, un prefijo
+    sobre rut_search. No hay LIKE con comodín inicial sobre las columnas
+    originales.
+    """
+    if qs is None:
+        qs = Patient.objects.all()
+    q = (q or "").strip()
+    if not q:
+        return qs
+
+    if looks_like_rut(q):
+        if "-" in q or q[-1] in "kK":
+            body = parse_rut(q)[0]
+            if body is not None:
+                return qs.filter(rut_body=body)
+        return qs.filter(rut_search__startswith=normalize_rut(q))
+
+    tokens = fold_text(q).split()[:MAX_TOKENS]
+    if not tokens:
+        return qs.none()
+    cond = Q()
+    for tok in tokens:
+        cond &= Q(search_name__prefix_search=tok)
+    return qs.filter(cond)
@@ -0,0 +1,72 @@
+// Sugerencias mientras se escribe en el buscador de pacientes.
+// El input declara data-autocomplete-url; Enter sin sugerencia elegida envía el formulario.
+(function(){
+  const input = document.querySelector("input[data-autocomplete-url]");
+  if (!input) return;
+  const url = input.dataset.autocompleteUrl;
+  const DEBOUNCE_MS = 150, MIN_CHARS = 2;
+
+  const list = document.createElement("div");
+  list.className = "list-group position-absolute shadow-sm d-none";
+  list.style.zIndex = 1050;
+  list.style.top = "100%";
+  list.style.left = 0;
+  list.style.right = 0;
+  input.parentElement.style.position = "relative";
+  input.parentElement.appendChild(list);
+
+  let timer = null, controller = null, active = -1;
+
+  function hide(){ list.classList.add("d-none"); list.innerHTML = ""; active = -1; }
+
+  function render(results){
+    list.innerHTML = "";
+    active = -1;
+    results.forEach(r => {
+      const a = document.createElement("a");
+      a.className = "list-group-item list-group-item-action d-flex justify-content-between";
+      a.href = r.url;
+      const name = document.createElement("span");
+      name.textContent = r.name;
+      const rut = document.createElement("span");
+      rut.className = "text-secondary small";
+      rut.textContent = r.rut;
+      a.append(name, rut);
+      list.appendChild(a);
+    });
+    list.classList.toggle("d-none", results.length === 0);
+  }
+
+  function highlight(i){
+    const items = list.querySelectorAll("a");
+    if (!items.length) return;
+    active = (i + items.length) % items.length;
+    items.forEach((el, j) => el.classList.toggle("active", j === active));
+  }
+
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (q.length < MIN_CHARS) { hide(); return; }
+    timer = setTimeout(() => {
+      if (controller) controller.abort();
+      controller = new AbortController();
+      fetch(url + "?q=" + encodeURIComponent(q), {headers: {"Accept": "application/json"}, signal: controller.signal})
+        .then(r => r.json())
+        .then(data => { if (data.q.trim() === input.value.trim()) render(data.results); })
+        .catch(() => {});
+    }, DEBOUNCE_MS);
+  });
+
+  input.addEventListener("keydown", (ev) => {
+    if (ev.key === "ArrowDown") { ev.preventDefault(); highlight(active + 1); }
+    else if (ev.key === "ArrowUp") { ev.preventDefault(); highlight(active - 1); }
+    else if (ev.key === "Escape") { hide(); }
+    else if (ev.key === "Enter" && active >= 0) {
+      ev.preventDefault();
+      window.location = list.querySelectorAll("a")[active].href;
+    }
+  });
+
+  input.addEventListener("blur", () => setTimeout(hide, 150));
+})();
@@ -0,0 +1,33 @@
+"""
+Almacenamiento de estáticos para producción.
+
+ManifestStaticFilesStorage agrega el hash del contenido al nombre
+(app.3f2a9c.css), así el navegador los guarda por tiempo indefinido y cada
+despliegue cambia la URL solo de lo que cambió. Además se deja una copia
+.gz junto a cada archivo de texto para que el servidor web la entregue ya
+comprimida (nginx: gzip_static on).
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESS_EXTENSIONS = (".css", ".js", ".map", ".svg", ".txt", ".json")
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and processed and not isinstance(processed, Exception):
+                self._compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def _compress(self, name):
+        if not name.endswith(COMPRESS_EXTENSIONS):
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            self.delete(name + ".gz")
+            self._save(name + ".gz", ContentFile(compressed))
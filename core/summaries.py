@@ -0,0 +1,149 @@
+"""
+Resumen por paciente (PatientSummary) para los listados.
+
+Las señales de Patient y de las secciones clínicas anotan qué paciente
+cambió, y al confirmar la transacción refresh() recalcula solo esas filas.
+Son tres consultas (anotada, fechas de visita, upsert), sin importar
+cuántos registros se escribieron. bulk_create/bulk_update no emiten
+señales: quien los use llama a refresh() con los pacientes tocados, o a
+rebuild() (comando rebuild_patient_summaries).
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bulk import upsert_options
+from .models import LDL, Anamnesis, ArchivedRecord, Audiogram, Patient, PatientSummary, SpeechAudiometry
+
+CLINICAL_MODELS = (Anamnesis, Audiogram, SpeechAudiometry, LDL)
+# ArchivedRecord (core.archive) también cuenta en visitas y audiometrías
+EXAM_FIELDS = {  # columna del resumen -> campo de la última audiometría
+    "last_exam_date": "date",
+    "last_pta_right": "pta_right",
+    "last_pta_left": "pta_left",
+    "last_loss_degree": "loss_degree",
+}
+ANAMNESIS_FIELDS = ("tinnitus", "vertigo", "hearing_aids")
+UPDATE_FIELDS = [
+    "last_visit", "visit_count", "exam_count", *EXAM_FIELDS, "last_pta_worst",
+    *ANAMNESIS_FIELDS, "updated_at",
+]
+CHUNK_SIZE = 500
+
+_local = threading.local()
+
+
+def _visits(lookup):
+    """{paciente: (n.º de días con alguna atención, último día)}."""
+    dates = [
+        model.objects.filter(**{f"patient__{k}": v for k, v in lookup.items()})
+        .order_by().values_list("patient_id", "date")
+        for model in (*CLINICAL_MODELS, ArchivedRecord)
+    ]
+    visits = {}
+    for pk, day in dates[0].union(*dates[1:]):  # UNION descarta días repetidos
+        count, last = visits.get(pk, (0, day))
+        visits[pk] = (count + 1, max(last, day))
+    return visits
+
+
+def _summaries(lookup):
+    latest_exam = Audiogram.objects.filter(patient=OuterRef("pk")).order_by("-date", "-pk")
+    latest_anamnesis = Anamnesis.objects.filter(patient=OuterRef("pk")).order_by("-date", "-pk")
+    exam_count, archived_count = (
+        qs.filter(patient=OuterRef("pk")).order_by().values("patient").annotate(n=Count("pk")).values("n")
+        for qs in (Audiogram.objects.all(), ArchivedRecord.objects.filter(kind="audiogram"))
+    )
+    rows = Patient.objects.filter(**lookup).order_by().annotate(
+        exam_count=(
+            Coalesce(Subquery(exam_count), Value(0), output_field=IntegerField())
+            + Coalesce(Subquery(archived_count), Value(0), output_field=IntegerField())
+        ),
+        **{name: Subquery(latest_exam.values(field)[:1]) for name, field in EXAM_FIELDS.items()},
+        **{name: Subquery(latest_anamnesis.values(name)[:1]) for name in ANAMNESIS_FIELDS},
+    ).values("pk", "exam_count", *EXAM_FIELDS, *ANAMNESIS_FIELDS)
+    visits = _visits(lookup)
+
+    for row in rows:
+        pk = row.pop("pk")
+        row["visit_count"], row["last_visit"] = visits.get(pk, (0, None))
+        ptas = [p for p in (row["last_pta_right"], row["last_pta_left"]) if p is not None]
+        row["last_pta_worst"] = max(ptas, default=None)
+        row["last_loss_degree"] = row["last_loss_degree"] or ""
+        for name in ANAMNESIS_FIELDS:
+            row[name] = bool(row[name])
+        yield PatientSummary(patient_id=pk, **row)
+
+
+def _save(lookup):
+    summaries = list(_summaries(lookup))
+    if summaries:
+        PatientSummary.objects.bulk_create(summaries, **upsert_options(PatientSummary, ["patient"], UPDATE_FIELDS))
+    return len(summaries)
+
+
+def refresh(patient_ids):
+    """Recalcula el resumen de los pacientes indicados; devuelve cuántos."""
+    patient_ids = sorted(set(patient_ids))
+    return sum(
+        _save({"pk__in": patient_ids[start:start + CHUNK_SIZE]})
+        for start in range(0, len(patient_ids), CHUNK_SIZE)
+    )
+
+
+def rebuild(chunk_size=CHUNK_SIZE, log=None):
+    """Recalcula todos los resúmenes por rangos de pk (sin OFFSET)."""
+    pks = Patient.objects.order_by("pk").values_list("pk", flat=True)
+    total, last_pk = 0, 0
+    while True:
+        chunk = list(pks.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return total
+        total += _save({"pk__range": (chunk[0], chunk[-1])})
+        last_pk = chunk[-1]
+        if log:
+            log(f"  {total} pacientes…")
+
+
+# --------- Señales ---------
+def _pending():
+    if not hasattr(_local, "pending"):
+        _local.pending = set()
+    return _local.pending
+
+
+def _flush():
+    pending = _pending()
+    if pending:
+        ids = list(pending)
+        pending.clear()
+        refresh(ids)
+
+
+def schedule(patient_id):
+    """Refresca el resumen del paciente al confirmar la transacción en curso."""
+    _pending().add(patient_id)
+    # Un callback por escritura, pero solo el primero encuentra pacientes pendientes
+    transaction.on_commit(_flush)
+
+
+@receiver(post_save, sender=Patient)
+def _on_patient_created(sender, instance, created, **kwargs):
+    if created:
+        schedule(instance.pk)
+
+
+@receiver(post_save, sender=Anamnesis)
+@receiver(post_save, sender=Audiogram)
+@receiver(post_save, sender=SpeechAudiometry)
+@receiver(post_save, sender=LDL)
+@receiver(post_delete, sender=Anamnesis)
+@receiver(post_delete, sender=Audiogram)
+@receiver(post_delete, sender=SpeechAudiometry)
+@receiver(post_delete, sender=LDL)
+def _on_clinical_change(sender, instance, **kwargs):
+    schedule(instance.patient_id)
@@ -0,0 +1,142 @@
+"""
+Generador de datos clínicos sintéticos (para benchmarks y demos).
+
+Crea pacientes con RUT válido (módulo 11), anamnesis, audiometrías con los
+cinco trazos estándar de audiogram_create (THRESHOLD_INITIAL), audiometría
+vocal y LDL. Inserta todo con bulk_create por lotes (y el resumen por
+paciente de cada lote); es determinista para una misma semilla.
+"""
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from . import classification, dashboard, summaries
+from .bulk import bulk_create_with_pks
+from .forms import THRESHOLD_INITIAL
+from .models import FREQS, LDL, Anamnesis, Audiogram, Patient, SpeechAudiometry, Threshold
+from .rut import format_rut
+
+FIRST_NAMES = [
+    "José", "María", "Juan", "Ana", "Luis", "Carmen", "Carlos", "Francisca", "Jorge", "Camila",
+    "Pedro", "Valentina", "Diego", "Javiera", "Felipe", "Constanza", "Matías", "Catalina",
+    "Sebastián", "Fernanda", "Cristián", "Daniela", "Rodrigo", "Ignacia", "Tomás", "Sofía",
+]
+LAST_NAMES = [
+    "González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez",
+    "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández", "Torres", "Araya",
+    "Flores", "Espinoza", "Valenzuela", "Castillo", "Tapia", "Reyes", "Gutiérrez", "Castro",
+    "Pizarro", "Álvarez", "Vásquez", "Sánchez", "Fernández", "Ramírez", "Carrasco", "Núñez",
+]
+COMPLAINTS = [
+    "Control anual", "Disminución de audición", "Acúfeno en oído derecho",
+    "Evaluación ocupacional", "Sensación de oído tapado", "Control audífonos", "",
+]
+RUT_BASE = 5_000_000
+
+
+def _thresholds(rng, age, noise):
+    """Valores (dB HL) plausibles por frecuencia según edad y exposición a ruido."""
+    base = max(0, age - 30) * 0.5
+    values = {}
+    for f in FREQS:
+        presby = base * (1 + FREQS.index(f) / 4)
+        notch = 20 if noise and f in (3000, 4000, 6000) else 0
+        db = presby + notch + rng.gauss(5, 6)
+        values[f] = int(max(-10, min(120, round(db / 5) * 5)))
+    return values
+
+
+def _exam(rng, patient, exam_date, noise):
+    age = patient.age_on(exam_date) or 40
+    ag = Audiogram(
+        patient=patient, date=exam_date,
+        exam_type="PLAY" if age < 6 else "TONAL",
+        transducer=rng.choice(["INSERT", "SUPRA", "CIRCUM"]),
+        masking_used=rng.random() < 0.3,
+    )
+    traces = []
+    for row in THRESHOLD_INITIAL:
+        if row["ear"] == "B" and rng.random() < 0.8:
+            values = {}  # campo libre solo a veces
+        else:
+            values = _thresholds(rng, age, noise)
+            if row["pathway"] == "BC":
+                values = {f: max(-10, v - rng.choice([0, 5, 10])) for f, v in values.items() if 500 <= f <= 4000}
+        traces.append(Threshold(**row, **{f"f_{f}": v for f, v in values.items()}))
+    ag.ac_thresholds = [t for t in traces if t.pathway == "AC"]
+    for name, value in ag.compute_pta().items():
+        setattr(ag, name, value)
+    return ag, traces
+
+
+def _batch(rng, start, size, today):
+    patients = []
+    for i in range(start, start + size):
+        body = RUT_BASE + i
+        p = Patient(
+            rut=format_rut(body),
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+            birth_date=today - timedelta(days=rng.randint(3 * 365, 90 * 365)),
+            sex=rng.choice("MF"),
+            phone=f"+569{rng.randint(10_000_000, 99_999_999)}",
+        )
+        p.refresh_search_fields()
+        patients.append(p)
+    bulk_create_with_pks(Patient, patients, "rut")
+
+    anamneses, speech, ldl, exams = [], [], [], []
+    for p in patients:
+        noise = rng.random() < 0.25
+        visits = sorted(today - timedelta(days=rng.randint(0, 10 * 365)) for _ in range(rng.randint(1, 4)))
+        for d in visits:
+            anamneses.append(Anamnesis(
+                patient=p, date=d, main_complaint=rng.choice(COMPLAINTS),
+                hearing_loss=rng.random() < 0.4, tinnitus=rng.random() < 0.2,
+                vertigo=rng.random() < 0.1, noise_exposure=noise,
+                hearing_aids=rng.random() < 0.1,
+            ))
+            exams.append(_exam(rng, p, d, noise))
+            if rng.random() < 0.5:
+                speech.append(SpeechAudiometry(
+                    patient=p, date=d, ear=rng.choice("RL"),
+                    srt=rng.randrange(0, 60, 5), wrs_percent=rng.randrange(60, 101, 4), wrs_level_db=rng.randrange(40, 80, 5),
+                ))
+            if rng.random() < 0.2:
+                ldl.append(LDL(
+                    patient=p, date=d, ear=rng.choice("RL"),
+                    **{k: rng.randrange(85, 120, 5) for k in ("ldl_500", "ldl_1k", "ldl_2k", "ldl_4k")},
+                ))
+
+    Anamnesis.objects.bulk_create(anamneses)
+    SpeechAudiometry.objects.bulk_create(speech)
+    LDL.objects.bulk_create(ldl)
+    audiograms = [ag for ag, _ in exams]
+    for n, ag in enumerate(audiograms):
+        ag.import_key = f"synthetic:{start}:{n}"  # permite resolver pks en MySQL
+    bulk_create_with_pks(Audiogram, audiograms, "import_key")
+    rows = []
+    for ag, traces in exams:
+        for th in traces:
+            th.audiogram_id = ag.pk
+            rows.append(th)
+    Threshold.objects.bulk_create(rows)
+    classification.store(exams)
+    summaries.refresh(p.pk for p in patients)
+    return len(audiograms)
+
+
+def generate(patients, seed=0, batch_size=1000, start=0, log=None):
+    """Crea `patients` pacientes con historia clínica; devuelve n.º de audiometrías."""
+    rng = random.Random(seed)
+    today = date.today()
+    total = 0
+    for offset in range(0, patients, batch_size):
+        size = min(batch_size, patients - offset)
+        with transaction.atomic():
+            total += _batch(rng, start + offset, size, today)
+        if log:
+            log(f"  {offset + size}/{patients} pacientes…")
+    dashboard.invalidate()
+    return total
@@ -0,0 +1,11 @@
+from django import template
+
+from .. import vendor
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_static(target):
+    """{% vendor_static 'bootstrap/css/bootstrap.min.css' %}: local o, si falta, CDN (core.vendor)."""
+    return vendor.url(target)
@@ -1,3 +1,1494 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+from datetime import date, timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import (
+    analytics, archive, audit, autocomplete, benchmarks, charts, classification, dashboard, dedup, exports, jobs,
+    patient_cache, perf, prescription, routers, rut, summaries, synthetic, vendor,
+)
+from .forms import PatientForm, ThresholdForm
+from .importers import import_audiograms
+from .middleware import PerformanceMiddleware
+from .search import search_patients
+from .models import EXT_FREQS, ArchivedRecord, AudiogramClassification, AuditEntry, Job, Patient, PatientSummary, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL, loss_degree_for
+
+
+def add_history(patient, n):
+    """Crea n registros de cada sección clínica para el paciente."""
+    for i in range(n):
+        Anamnesis.objects.create(patient=patient, main_complaint=f"Consulta {i}")
+        ag = Audiogram.objects.create(patient=patient, date=date(2020, 1, 1))
+        Threshold.objects.create(audiogram=ag, ear="R", f_500=10, f_1000=20, f_2000=30)
+        Threshold.objects.create(audiogram=ag, ear="L", f_500=15, f_1000=25, f_2000=35)
+        ag.refresh_pta()
+        SpeechAudiometry.objects.create(patient=patient, srt=20, wrs_percent=90)
+        LDL.objects.create(patient=patient, ldl_500=95)
+
+
+class PatientDetailQueriesTests(TestCase):
+    # sesión + usuario + paciente + 4 secciones + archivados + serie de umbrales (tendencia)
+    EXPECTED_QUERIES = 9
+
+    def setUp(self):
+        self.user = User.objects.create_user("fono", password="clave-segura-123")
+        self.client.force_login(self.user)
+
+    def test_query_count_is_constant(self):
+        for n in (1, 10, 40):
+            p = Patient.objects.create(rut=f"{n}-K", first_name="Ana", last_name="Soto", birth_date=date(1980, 5, 1))
+            add_history(p, n)
+            with self.assertNumQueries(self.EXPECTED_QUERIES):
+                response = self.client.get(reverse("patient_detail", args=[p.pk]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context["audiograms"]), min(n, 5))
+
+    def test_sections_show_latest_records(self):
+        p = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        add_history(p, 7)
+        response = self.client.get(reverse("patient_detail", args=[p.pk]))
+        latest = list(p.audiograms.all()[:5])
+        self.assertEqual(response.context["audiograms"], latest)
+        self.assertEqual(response.context["audiograms"][0].pta_right, 20.0)
+
+
+class PtaBatchTests(TestCase):
+    def setUp(self):
+        self.adult = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto", birth_date=date(1970, 1, 1))
+        self.child = Patient.objects.create(rut="2-7", first_name="Tomás", last_name="Soto", birth_date=date(2016, 6, 1))
+
+    def exam(self, patient, traces):
+        ag = Audiogram.objects.create(patient=patient, date=date(2022, 1, 1))
+        for ear, levels in traces.items():
+            Threshold.objects.create(audiogram=ag, ear=ear, **levels)
+        # La vía ósea no entra en el PTA
+        Threshold.objects.create(audiogram=ag, ear="R", pathway="BC", f_500=90, f_1000=90, f_2000=90)
+        return ag
+
+    def test_with_pta_uses_two_queries_for_any_number_of_exams(self):
+        for n in (1, 10):
+            for _ in range(n):
+                self.exam(self.adult, {"R": {"f_500": 10, "f_1000": 20, "f_2000": 30}})
+            with self.assertNumQueries(2):  # exámenes + paciente, y trazos aéreos
+                values = [(ag.pta("R"), ag.pta("L")) for ag in Audiogram.objects.with_pta()]
+            self.assertEqual(len(values), Audiogram.objects.count())
+            self.assertEqual(set(values), {(20.0, None)})
+
+    def test_pta_by_age_and_degree_from_worst_ear(self):
+        adult = self.exam(self.adult, {
+            "R": {"f_500": 10, "f_1000": 20, "f_2000": 30},
+            "L": {"f_500": 40, "f_1000": 50, "f_2000": 75},
+        })
+        child = self.exam(self.child, {"R": {"f_500": 90, "f_1000": 30, "f_2000": 40, "f_4000": 50}})
+        partial = self.exam(self.adult, {"B": {"f_500": 10, "f_1000": 20}})  # falta 2000 Hz
+        by_pk = {ag.pk: ag.compute_pta() for ag in Audiogram.objects.with_pta()}
+        self.assertEqual(by_pk[adult.pk], {
+            "pta_right": 20.0, "pta_left": 55.0, "pta_binaural": None, "loss_degree": "MODERATE",
+        })
+        self.assertEqual(by_pk[child.pk]["pta_right"], 40.0)  # 1000/2000/4000 antes de los 15 años
+        self.assertEqual(by_pk[child.pk]["loss_degree"], "MILD")
+        self.assertEqual(by_pk[partial.pk], {
+            "pta_right": None, "pta_left": None, "pta_binaural": None, "loss_degree": "",
+        })
+
+    def test_loss_degree_limits_are_inclusive(self):
+        cases = {None: "", 20: "NORMAL", 20.1: "MILD", 40: "MILD", 70: "MODERATE", 90: "SEVERE", 90.1: "PROFOUND"}
+        self.assertEqual({pta: loss_degree_for(pta) for pta in cases}, cases)
+
+
+class PtaColumnsTests(TestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto", birth_date=date(1970, 1, 1))
+
+    def test_refresh_pta_persists_columns_for_filtering(self):
+        ag = Audiogram.objects.create(patient=self.patient, date=date(2022, 1, 1))
+        Threshold.objects.create(audiogram=ag, ear="R", f_500=50, f_1000=60, f_2000=70)
+        with self.assertNumQueries(2):  # trazos aéreos + UPDATE de las columnas
+            ag.refresh_pta()
+        stored = Audiogram.objects.values("pta_right", "pta_left", "loss_degree").get(pk=ag.pk)
+        self.assertEqual(stored, {"pta_right": 60.0, "pta_left": None, "loss_degree": "MODERATE"})
+        self.assertEqual(list(Audiogram.objects.filter(pta_right__gte=55)), [ag])
+
+        sql, params = Audiogram.objects.filter(loss_degree="MODERATE").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("USING INDEX", plan)
+
+    def test_backfill_fills_missing_columns_in_chunks(self):
+        exams = Audiogram.objects.bulk_create([
+            Audiogram(patient=self.patient, date=date(2022, 1, day)) for day in range(1, 6)
+        ])
+        Threshold.objects.bulk_create([
+            Threshold(audiogram=ag, ear="L", f_500=10 * i, f_1000=10 * i, f_2000=10 * i)
+            for i, ag in enumerate(exams, start=1)
+        ])
+        Audiogram.objects.filter(pk=exams[0].pk).update(loss_degree="SEVERE")  # ya calculado (a propósito, mal)
+
+        out = io.StringIO()
+        call_command("backfill_pta", chunk_size=2, only_missing=True, stdout=out)
+        self.assertIn("PTA recalculado para 4 exámenes", out.getvalue())
+        degrees = dict(Audiogram.objects.values_list("pk", "loss_degree"))
+        self.assertEqual([degrees[ag.pk] for ag in exams], ["SEVERE", "NORMAL", "MILD", "MILD", "MODERATE"])
+
+        call_command("backfill_pta", chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(Audiogram.objects.get(pk=exams[0].pk).loss_degree, "NORMAL")
+        self.assertEqual(Audiogram.objects.get(pk=exams[4].pk).pta_left, 50.0)
+
+
+class PatientSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        self.munoz = Patient.objects.create(rut="12.345.678-5", first_name="José Ignacio", last_name="Muñoz Pérez")
+        self.soto = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        self.sotomayor = Patient.objects.create(rut="11111111-1", first_name="Luis", last_name="Sotomayor")
+
+    def found(self, q):
+        return set(search_patients(q).values_list("last_name", flat=True))
+
+    def test_names_match_word_prefixes_without_accents(self):
+        self.assertEqual(self.found("muñoz"), {"Muñoz Pérez"})
+        self.assertEqual(self.found("PEREZ jose"), {"Muñoz Pérez"})  # cualquier orden
+        self.assertEqual(self.found("ign"), {"Muñoz Pérez"})         # inicio de cualquier palabra
+        self.assertEqual(self.found("sot"), {"Soto", "Sotomayor"})
+        self.assertEqual(self.found("oto"), set())                   # no es prefijo de palabra
+        self.assertEqual(self.found("soto luis"), {"Sotomayor"})
+
+    def test_rut_full_is_exact_and_partial_is_prefix(self):
+        self.assertEqual(self.found("12345678-5"), {"Muñoz Pérez"})
+        self.assertEqual(self.found("12.345.678-5"), {"Muñoz Pérez"})
+        self.assertEqual(self.found("1234"), {"Muñoz Pérez"})
+        self.assertEqual(self.found("1"), {"Muñoz Pérez", "Soto", "Sotomayor"})
+        self.assertEqual(self.found("12345678-0"), set())  # DV incorrecto: prefijo que no existe
+
+        sql, params = search_patients("12345678-5").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("rut_body", plan)  # igualdad sobre el índice entero
+
+    def test_list_pages_with_constant_queries(self):
+        synthetic.generate(45, batch_size=45)
+        counts = []
+        for page in (1, 2, 3):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse("patient_list"), {"page": page})
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1)
+        response = self.client.get(reverse("patient_list"), {"q": "sotomay"})
+        self.assertEqual([p.pk for p in response.context["patients"]], [self.sotomayor.pk])
+
+
+class ImportTests(TestCase):
+    CSV_HEADER = "rut,exam_id,date,exam_type,transducer,masking_used,comments,ear,pathway,symbol,f_500,f_1000,f_2000\n"
+
+    def setUp(self):
+        self.patient = Patient.objects.create(rut="12.345.678-5", first_name="Ana", last_name="Soto")
+
+    def csv(self, *rows):
+        return io.BytesIO((self.CSV_HEADER + "".join(f"{row}\n" for row in rows)).encode("utf-8"))
+
+    def test_csv_groups_traces_and_reimport_is_idempotent(self):
+        rows = (
+            "12345678-5,A1,2024-05-02,TONAL,INSERT,0,,R,AC,O,20,30,40",
+            "12345678-5,A1,2024-05-02,TONAL,INSERT,0,,L,AC,X,10,10,10",
+            "12.345.678-5,A2,2024-06-02,TONAL,INSERT,1,Control,R,AC,O,50,50,50",
+        )
+        report = import_audiograms(self.csv(*rows))
+        self.assertEqual((report.created, report.skipped, report.failed), (2, 0, 0))
+        first = self.patient.audiograms.get(date=date(2024, 5, 2))
+        self.assertEqual(first.thresholds.count(), 2)
+        self.assertEqual((first.pta_right, first.pta_left), (30.0, 10.0))
+        self.assertTrue(self.patient.audiograms.get(date=date(2024, 6, 2)).masking_used)
+        self.assertTrue(AudiogramClassification.objects.filter(audiogram=first).exists())
+
+        report = import_audiograms(self.csv(*rows))
+        self.assertEqual((report.created, report.skipped), (0, 2))
+        self.assertEqual(Threshold.objects.count(), 3)
+
+    def test_xml_sessions(self):
+        xml = b"""<Sessions>
+          <Session id="S1" rut="12345678-5" date="2024-05-02" exam_type="TONAL" transducer="SUPRA" masking="1">
+            <Comments>Ruido</Comments>
+            <Trace ear="R" pathway="AC" symbol="O"><Point freq="500" db="25"/><Point freq="4000" db="60"/></Trace>
+            <Trace ear="R" pathway="BC"><Point freq="500" db="15"/><Point freq="99" db="5"/></Trace>
+          </Session>
+        </Sessions>"""
+        report = import_audiograms(io.BytesIO(xml), fmt="xml")
+        self.assertEqual((report.created, report.failed), (1, 0))
+        ag = self.patient.audiograms.get()
+        self.assertEqual((ag.transducer, ag.masking_used, ag.comments), ("SUPRA", True, "Ruido"))
+        right = ag.thresholds.get(pathway="AC")
+        self.assertEqual((right.f_500, right.f_4000, right.f_1000), (25, 60, None))
+
+    def test_malformed_xml_is_reported_with_its_line(self):
+        xml = b"""<Sessions>
+          <Session id="S1" rut="12345678-5" date="2024-05-02" exam_type="TONAL" transducer="SUPRA">
+            <Trace ear="R" pathway="AC"><Point freq="500" db="25"/></Trace>
+          </Session>
+          <Session id="S2" rut="12345678-5" date="2024-06-02">
+            <Trace ear="R" pathway="AC"><Point freq="500" db="30"></Trace>
+          </Session>
+        </Sessions>"""
+        report = import_audiograms(io.BytesIO(xml), fmt="xml")
+        self.assertEqual((report.created, report.failed), (1, 1))  # lo leído antes del error se importa
+        line, rut, message = report.errors[0]
+        self.assertEqual((line, rut), (6, ""))
+        self.assertIn("XML mal formado", message)
+
+    def test_bad_rows_are_reported_without_stopping(self):
+        report = import_audiograms(self.csv(
+            "12345678-0,B1,2024-05-02,TONAL,INSERT,0,,R,AC,O,20,30,40",  # DV incorrecto
+            "1-9,B2,2024-05-02,TONAL,INSERT,0,,R,AC,O,20,30,40",  # sin ficha
+            "12345678-5,B3,2024-13-40,TONAL,INSERT,0,,R,AC,O,20,30,40",  # fecha inválida
+            "12345678-5,B4,2024-05-02,TONAL,INSERT,0,,R,AC,O,20,30,400",  # fuera de rango
+            "12345678-5,B5,2024-05-03,TONAL,INSERT,0,,R,AC,O,20,30,40",
+        ))
+        self.assertEqual((report.created, report.failed), (1, 4))
+        self.assertEqual([(line, rut) for line, rut, _ in report.errors], [
+            (2, "12345678-0"), (3, "1-9"), (4, "12345678-5"), (5, "12345678-5"),
+        ])
+        self.assertIn("RUT inválido", report.errors[0][2])
+        self.assertIn("Paciente no encontrado", report.errors[1][2])
+        out = io.StringIO()
+        report.write_errors(out)
+        self.assertEqual(out.getvalue().splitlines()[0], "linea,rut,error")
+        self.assertEqual(len(list(csv.reader(io.StringIO(out.getvalue())))), 5)
+
+    def test_failed_chunk_rolls_back_and_resume_skips_committed(self):
+        rows = [f"12345678-5,C{i},2024-05-0{i},TONAL,INSERT,0,,R,AC,O,20,30,40" for i in (1, 2, 3)]
+        store = classification.store
+        calls = []
+
+        def failing_store(items):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("falla en el segundo bloque")
+            return store(items)
+
+        with mock.patch.object(classification, "store", failing_store):
+            with self.assertRaises(RuntimeError):
+                import_audiograms(self.csv(*rows), chunk_size=1)
+        # El primer bloque quedó completo; el segundo no dejó exámenes sin trazos
+        self.assertEqual(list(self.patient.audiograms.values_list("date__day", flat=True)), [1])
+        self.assertEqual(Threshold.objects.count(), 1)
+
+        report = import_audiograms(self.csv(*rows), chunk_size=1)
+        self.assertEqual((report.created, report.skipped), (2, 1))
+        self.assertEqual(Threshold.objects.count(), 3)
+
+
+class ChartTests(TestCase):
+    SVG = "{http://www.w3.org/2000/svg}"
+
+    def setUp(self):
+        caches["default"].clear()
+        p = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        self.ag = Audiogram.objects.create(patient=p, date=date(2022, 1, 1))
+        Threshold.objects.create(audiogram=self.ag, ear="R", f_250=10, f_1000=20, f_8000=120)
+        Threshold.objects.create(audiogram=self.ag, ear="L", pathway="BC", symbol="<", f_500=15, f_4000=-10)
+
+    def test_svg_is_well_formed_with_one_symbol_per_point(self):
+        root = ET.fromstring(charts.render_svg(charts.traces_from_thresholds(self.ag.thresholds.all())))
+        self.assertEqual(root.tag, f"{self.SVG}svg")
+        self.assertEqual((root.get("width"), root.get("height")), (str(charts.WIDTH), str(charts.HEIGHT)))
+        symbols = [t for t in root.iter(f"{self.SVG}text") if t.get("dominant-baseline") == "central"]
+        # 3 puntos aéreos (O) + 2 óseos (<); las frecuencias sin valor no se dibujan
+        self.assertEqual(sorted(t.text for t in symbols), ["<", "<", "O", "O", "O"])
+        dashed = [line for line in root.iter(f"{self.SVG}line") if line.get("stroke-dasharray")]
+        self.assertEqual(len(dashed), 2)  # solo la vía ósea lleva el trazo segmentado
+
+    def test_axes_map_to_plot_area_and_clamp(self):
+        self.assertEqual(charts.x_for_freq(250), charts.PAD["l"])
+        self.assertEqual(charts.x_for_freq(8000), charts.WIDTH - charts.PAD["r"])
+        self.assertAlmostEqual(charts.x_for_freq(1000), charts.PAD["l"] + charts.PLOT_W * 2 / 5)  # log2: 2 de 5 octavas
+        self.assertEqual(charts.y_for_db(-10), charts.PAD["t"])
+        self.assertEqual(charts.y_for_db(120), charts.HEIGHT - charts.PAD["b"])
+        self.assertEqual(charts.y_for_db(130), charts.y_for_db(120))
+        self.assertEqual(charts.y_for_db(-20), charts.y_for_db(-10))
+
+    def test_same_levels_share_key_and_cache_entry(self):
+        key, svg = charts.get_chart(self.ag.thresholds.all())
+        other = Audiogram.objects.create(patient=self.ag.patient, date=date(2023, 1, 1))
+        for th in self.ag.thresholds.all():
+            th.pk, th.audiogram = None, other
+            th.save()
+        with mock.patch.object(charts, "render_svg") as render:
+            self.assertEqual(charts.get_chart(other.thresholds.all()), (key, svg))
+        render.assert_not_called()
+
+        th = other.thresholds.get(ear="R")
+        th.f_2000 = 40
+        th.save()
+        changed, _ = charts.get_chart(other.thresholds.all())
+        self.assertNotEqual(changed, key)
+
+    def test_view_revalidates_so_edits_show_up(self):
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        url = reverse("audiogram_chart", args=[self.ag.pk])
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        th = self.ag.thresholds.get(ear="R")
+        th.f_2000 = 40
+        th.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Muñoz", birth_date=date(1970, 1, 1))
+        for day, level in ((date(2021, 5, 1), 20), (date(2023, 5, 1), 35)):
+            ag = Audiogram.objects.create(patient=self.patient, date=day)
+            Threshold.objects.create(audiogram=ag, ear="R", f_1000=level, f_4000=level + 10)
+            ag.refresh_pta()
+
+    def rows(self, kind, date_from=None, date_to=None):
+        response = exports.stream_csv(kind, date_from, date_to)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8"))))
+
+    def test_streamed_csv_parses_with_decoded_levels(self):
+        header, *rows = self.rows("thresholds")
+        self.assertEqual(header[:6], ["audiometria_id", "rut", "fecha", "oido", "via", "simbolo"])
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(len(row) == len(header) for row in rows))
+        column = {name: i for i, name in enumerate(header)}
+        self.assertEqual([(r[column["1000"]], r[column["4000"]], r[column["500"]]) for r in rows],
+                         [("20", "30", ""), ("35", "45", "")])
+
+        header, *rows = self.rows("audiograms", date_from=date(2022, 1, 1))
+        self.assertEqual([r[header.index("fecha")] for r in rows], ["2023-05-01"])
+        self.assertEqual(self.rows("patients", date_to=date(2020, 1, 1)), [self.rows("patients")[0]])
+
+    def test_write_csv_returns_rows_without_header(self):
+        fh = io.StringIO()
+        self.assertEqual(exports.write_csv(fh, "audiograms"), 2)
+        self.assertEqual(len(list(csv.reader(io.StringIO(fh.getvalue())))), 3)
+        self.assertEqual(exports.write_csv(io.StringIO(), "ldl"), 0)
+
+    def assertWellFormedPdf(self, pdf):
+        self.assertTrue(pdf.startswith(b"%PDF-1.4\n"))
+        self.assertTrue(pdf.endswith(b"%%EOF\n"))
+        startxref = int(pdf.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+        self.assertTrue(pdf[startxref:].startswith(b"xref\n"))
+        offsets = [int(line[:10]) for line in pdf[startxref:].split(b"\n") if line.endswith(b" n ")]
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[offset:].startswith(b"%d 0 obj\n" % number))
+        return int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", pdf).group(1))
+
+    def test_patient_report_pdf_is_well_formed(self):
+        pdf = exports.patient_report_pdf(self.patient)
+        self.assertEqual(self.assertWellFormedPdf(pdf), 1)
+        streams = re.findall(rb"stream\n(.*?)\nendstream", pdf, re.S)
+        text = zlib.decompress(streams[0]).decode("cp1252")
+        self.assertIn("(Muñoz, Ana — RUT 1-9)", text)
+        self.assertIn("2023-05-01", text)
+
+        add_history(self.patient, 40)
+        self.assertGreater(self.assertWellFormedPdf(exports.patient_report_pdf(self.patient)), 1)
+
+
+class AnalyticsTests(TestCase):
+    # 2016-01-01 -> 2020-01-01 -> 2024-01-01: 1461 días cada tramo, t = 0, 4 y 8 años exactos
+    DATES = (date(2016, 1, 1), date(2020, 1, 1), date(2024, 1, 1))
+
+    def setUp(self):
+        self.worker = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        self.other = Patient.objects.create(rut="2-7", first_name="Luis", last_name="Rojas")
+        self.office = Patient.objects.create(rut="3-5", first_name="Eva", last_name="Díaz")
+        for p in (self.worker, self.other):
+            Anamnesis.objects.create(patient=p, noise_exposure=True)
+        # 2/3/4 kHz por examen
+        self.exams(
+            self.worker, R=[(10, 10, 20), (10, 10, 30), (15, 20, 50)], L=[(10, 10, 10), (10, 10, 10), (15, 15, 15)],
+        )
+        self.exams(self.other, R=[(10, 10, 20), (10, 10, 40)], dates=self.DATES[1:])
+        self.exams(self.office, R=[(10, 10, 10), (50, 50, 50)], dates=self.DATES[1:])
+
+    def exams(self, patient, dates=DATES, **ears):
+        for i, day in enumerate(dates):
+            ag = Audiogram.objects.create(patient=patient, date=day)
+            for ear, levels in ears.items():
+                Threshold.objects.create(audiogram=ag, ear=ear, **dict(zip(("f_2000", "f_3000", "f_4000"), levels[i])))
+            # La vía ósea no entra en el STS ni en la pendiente aérea
+            Threshold.objects.create(audiogram=ag, ear="R", pathway="BC", f_2000=90, f_3000=90, f_4000=90)
+
+    def test_shift_and_slope_match_hand_computed_values(self):
+        series = analytics.load_series(Threshold.objects.filter(audiogram__patient=self.worker))
+        self.assertEqual(series.years_since_baseline().tolist(), [0.0, 4.0, 8.0])
+        # OD: (5 + 10 + 30) / 3 = 15 dB; OI: 5 dB
+        np.testing.assert_allclose(series.sts_shift(), [[0, 0], [10 / 3, 0], [15, 5]])
+        self.assertEqual(series.sts().tolist(), [[False, False], [False, False], [True, False]])
+        # 4 kHz OD 20, 30, 50: Σ(t - 4)(y - ȳ) / Σ(t - 4)² = 120 / 32; OI 10, 10, 15: 20 / 32
+        k4 = analytics.FREQS.index(4000)
+        np.testing.assert_allclose(series.slopes()[0, :, 0, k4], [3.75, 0.625])
+
+        trend = analytics.patient_trend(self.worker)
+        self.assertEqual(
+            {k: trend[k] for k in ("exams", "shift_right", "shift_left", "sts_right", "sts_left", "slope_left")},
+            {"exams": 3, "shift_right": 15.0, "shift_left": 5.0, "sts_right": True, "sts_left": False, "slope_left": 0.6},
+        )
+        self.assertEqual((trend["baseline_date"], trend["last_date"]), (self.DATES[0], self.DATES[2]))
+        single = Patient.objects.create(rut="4-3", first_name="Sol", last_name="Paz")
+        self.exams(single, R=[(10, 10, 10)], dates=self.DATES[:1])
+        self.assertIsNone(analytics.patient_trend(single))
+
+    def test_cohort_report_covers_noise_exposed_patients(self):
+        with self.assertNumQueries(2):  # umbrales de la cohorte + pacientes (in_bulk)
+            rows = {row["patient"]: row for row in analytics.cohort_sts_report()}
+        self.assertEqual(set(rows), {self.worker, self.other})
+        self.assertEqual(
+            [(r["exams"], r["shift_right"], r["sts"], r["slope_right"]) for r in (rows[self.worker], rows[self.other])],
+            [(3, 15.0, True, 3.8), (2, 6.7, False, 5.0)],  # 20 -> 40 dB en 4 años
+        )
+        self.assertEqual((rows[self.other]["shift_left"], rows[self.other]["slope_left"]), (None, None))
+
+
+@override_settings(PERF_SLOW_REQUEST_MS=60_000, PERF_SLOW_QUERY_MS=60_000, PERF_N_PLUS_ONE=5)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        perf.stats.reset()
+        self.addCleanup(perf.stats.reset)
+        self.pks = [
+            Patient.objects.create(rut=rut, first_name="Ana", last_name="Soto").pk
+            for rut in ("1-9", "2-7", "3-5", "4-3", "5-1", "6-K")
+        ]
+
+    def call(self, repeats):
+        def view(request):
+            Patient.objects.count()
+            for pk in self.pks[:repeats]:  # misma SQL, otro parámetro: el patrón N+1
+                Patient.objects.filter(pk=pk).first()
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/pacientes/")
+        request.resolver_match = mock.Mock(view_name="patient_detail")
+        return PerformanceMiddleware(view)(request)
+
+    def test_repeated_statement_is_flagged_as_n_plus_one(self):
+        with self.assertLogs("core.perf", "WARNING") as logs:
+            response = self.call(6)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Posible N+1 en patient_detail: 6×", logs.output[0])
+        self.assertIn('desc="7 queries"', response["Server-Timing"])
+
+        with self.assertNoLogs("core.perf", "WARNING"):
+            self.call(4)
+        [row] = perf.stats.summary()
+        self.assertEqual((row["view"], row["count"], row["flags"]), ("patient_detail", 2, {"n+1": 1}))
+        self.assertEqual(row["queries"], {50: 6.0, 95: 6.9, 99: 6.98})
+
+    def test_percentile_interpolates_between_samples(self):
+        values = [10, 20, 30, 40]
+        self.assertEqual([perf.percentile(values, p) for p in (0, 50, 100)], [10, 25.0, 40])
+        self.assertAlmostEqual(perf.percentile(values, 95), 38.5)
+        self.assertEqual(perf.percentile([7], 99), 7)
+        self.assertIsNone(perf.percentile([], 50))
+
+
+class BenchmarkTests(TestCase):
+    BASELINE = {"1000": {
+        "home": {"median_ms": 10.0, "p95_ms": 12.0, "queries": 4},
+        "patient_detail": {"median_ms": 20.0, "p95_ms": 25.0, "queries": 9},
+    }}
+
+    def results(self, **changes):
+        results = {scale: {name: dict(m) for name, m in cases.items()} for scale, cases in self.BASELINE.items()}
+        for name, metrics in changes.items():
+            results["1000"][name].update(metrics)
+        return results
+
+    def test_compare_flags_query_and_latency_regressions(self):
+        self.assertEqual(benchmarks.compare(self.results(home={"median_ms": 14.9}), self.BASELINE), [])
+        self.assertEqual(
+            benchmarks.compare(self.results(home={"queries": 5}, patient_detail={"median_ms": 31.0}), self.BASELINE),
+            ["1000/home: 5 queries (base 4)", "1000/patient_detail: 31.0 ms (base 20.0 ms)"],
+        )
+        self.assertEqual(
+            benchmarks.compare(self.results(home={"median_ms": 19.0}), self.BASELINE, latency_tolerance=2), [],
+        )
+        # Casos o escalas sin línea base no se comparan
+        self.assertEqual(benchmarks.compare({"10000": self.BASELINE["1000"]}, self.BASELINE), [])
+
+    def test_baseline_round_trip_and_check_requires_it(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bench_baseline.json"
+            benchmarks.save_baseline(path, self.BASELINE)
+            self.assertEqual(benchmarks.load_baseline(path), self.BASELINE)
+
+            missing = Path(tmp) / "otra.json"
+            with self.assertRaisesMessage(CommandError, "Sin línea base"):
+                call_command("benchmark", "--check", "--baseline", str(missing))
+
+    @override_settings(REPLICA_READS=True)
+    def test_command_measures_only_the_throwaway_database(self):
+        def run(*args, **kwargs):
+            self.assertFalse(routers.replica_configured())  # nada se lee de la réplica real
+            return self.BASELINE
+
+        creation = connection.creation
+        command = "core.management.commands.benchmark"
+        with mock.patch.object(creation, "create_test_db", return_value="real") as create, \
+                mock.patch.object(creation, "destroy_test_db") as destroy, \
+                mock.patch(f"{command}.setup_test_environment"), mock.patch(f"{command}.teardown_test_environment"), \
+                mock.patch.object(benchmarks, "run", side_effect=run), \
+                tempfile.TemporaryDirectory() as tmp:
+            call_command("benchmark", "--save-baseline", "--baseline", str(Path(tmp) / "b.json"), stdout=io.StringIO())
+        create.assert_called_once()
+        destroy.assert_called_once_with("real", verbosity=0)
+        self.assertTrue(routers.replica_configured())
+
+
+class ThresholdVectorTests(TestCase):
+    def test_levels_round_trip(self):
+        p = Patient.objects.create(rut="2-7", first_name="Luis", last_name="Rojas")
+        ag = Audiogram.objects.create(patient=p, date=date(2021, 3, 1), exam_type="HF")
+        th = Threshold.objects.create(audiogram=ag, ear="R", f_125=-10, f_750=15, f_4000=0, f_16000=95)
+        th = Threshold.objects.get(pk=th.pk)
+        self.assertEqual(len(th.levels.to_bytes()), len(EXT_FREQS))
+        self.assertEqual(
+            {f: v for f, v in th.levels.items() if v is not None},
+            {125: -10, 750: 15, 4000: 0, 16000: 95},
+        )
+        self.assertIsNone(th.f_250)
+        self.assertEqual(np.isnan(th.levels.as_float([250, 4000])).tolist(), [True, False])
+
+    def test_migration_drops_out_of_range_legacy_levels(self):
+        migration = import_module("core.migrations.0005_threshold_packed_levels")
+        legacy = SimpleNamespace(pk=7, **{f"f_{f}": None for f in migration.OLD_FREQS})
+        legacy.f_500, legacy.f_1000, legacy.f_4000 = 20, 999, -130
+        with self.assertLogs("core.migrations", "WARNING") as logs:
+            vector = migration.legacy_vector(legacy)
+        self.assertEqual({f: v for f, v in vector.items() if v is not None}, {500: 20})
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("Threshold 7: 999 dB a 1000 Hz", logs.output[0])
+
+    def test_form_rejects_out_of_range(self):
+        form = ThresholdForm({"ear": "R", "pathway": "AC", "f_500": "130"})
+        self.assertFalse(form.is_valid())
+        self.assertIn("f_500", form.errors)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        caches[dashboard.CACHE_ALIAS].clear()
+        self.addCleanup(caches[dashboard.CACHE_ALIAS].clear)
+        self.today = date.today()
+        self.patient = Patient.objects.create(rut="3-5", first_name="Eva", last_name="Tapia")
+
+    def exam(self, days_ago, db):
+        ag = Audiogram.objects.create(patient=self.patient, date=self.today - timedelta(days=days_ago))
+        Threshold.objects.create(audiogram=ag, ear="R", f_500=db, f_1000=db, f_2000=db)
+        ag.refresh_pta()
+        return ag
+
+    def test_incremental_counters_match_rebuild(self):
+        dashboard.rebuild(self.today)
+        self.exam(400, 50)
+        old = self.exam(0, 10)
+        Anamnesis.objects.create(patient=self.patient, tinnitus=True)
+        a = Anamnesis.objects.create(patient=self.patient, vertigo=True)
+        a.vertigo = False
+        a.save()
+        incremental = dashboard.summary(self.today)
+        dashboard.rebuild(self.today)
+        self.assertEqual(incremental, dashboard.summary(self.today))
+        self.assertEqual(incremental["follow_ups"], 0)  # último examen normal
+        self.assertEqual(incremental["tinnitus_pct"], 50.0)
+
+        old.delete()  # vuelve a quedar como último el examen con pérdida
+        stats = dashboard.summary(self.today)
+        self.assertEqual(stats["exams_week"], 0)
+        self.assertEqual(stats["follow_ups"], 1)
+
+    def test_follow_ups_roll_over_time(self):
+        dashboard.rebuild(self.today)
+        self.exam(300, 50)
+        self.assertEqual(dashboard.summary(self.today)["follow_ups"], 0)
+        later = self.today + timedelta(days=100)
+        self.assertEqual(dashboard.summary(later)["follow_ups"], 1)
+        dashboard.rebuild(later)
+        self.assertEqual(dashboard.summary(later)["follow_ups"], 1)
+
+    def test_counters_rebuilt_after_refresh_window(self):
+        dashboard.summary(self.today)
+        # Sin señales, como un cambio hecho por el worker u otro proceso web
+        Audiogram.objects.bulk_create([Audiogram(patient=self.patient, date=self.today)])
+        self.assertEqual(dashboard.summary(self.today)["exams_week"], 0)
+        later = time.time() + settings.DASHBOARD_REFRESH_SECONDS + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(dashboard.summary(self.today)["exams_week"], 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class JobQueueTests(TestCase):
+    def test_export_job_runs_and_is_downloadable(self):
+        user = User.objects.create_user("admin", password="clave-segura-123", is_staff=True)
+        self.client.force_login(user)
+        Patient.objects.create(rut="4-3", first_name="Ana", last_name="Soto")
+        response = self.client.post(reverse("export_job", args=["patients"]), {"date_from": "", "date_to": ""})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse("job_detail", args=[job.pk]))
+
+        self.assertEqual(jobs.claim("test"), job.pk)
+        self.assertIsNone(jobs.claim("test"))  # ya reclamado
+        self.assertEqual(jobs.run(job.pk), "DONE")
+        job.refresh_from_db()
+        self.assertEqual(job.result, {"rows": 1})
+        response = self.client.get(reverse("job_download", args=[job.pk]))
+        self.assertIn(b"4-3", b"".join(response.streaming_content))
+
+    def test_heartbeat_renewed_while_handler_runs_silently(self):
+        # Un handler que no llama a ctx.progress() (como export_csv) no debe parecer caído
+        jobs.HANDLERS["test_slow"] = ("Lento", lambda ctx: time.sleep(0.3) or {})
+        self.addCleanup(jobs.HANDLERS.pop, "test_slow")
+        job = jobs.enqueue("test_slow")
+        jobs.claim("test")
+        with override_settings(JOB_HEARTBEAT_SECONDS=0.05), mock.patch.object(jobs.Heartbeat, "beat") as beat:
+            self.assertEqual(jobs.run(job.pk), "DONE")
+        self.assertGreaterEqual(beat.call_count, 2)
+
+    def test_failed_job_is_retried_then_fails(self):
+        jobs.HANDLERS["test_fail"] = ("Falla", lambda ctx: 1 / 0)
+        self.addCleanup(jobs.HANDLERS.pop, "test_fail")
+        job = jobs.enqueue("test_fail", max_attempts=2)
+        jobs.claim("test")
+        self.assertEqual(jobs.run(job.pk), "QUEUED")
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.claim("test")
+        self.assertEqual(jobs.run(job.pk), "FAILED")
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("ZeroDivisionError", job.error)
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fono", password="clave-segura-123")
+        self.patient = Patient.objects.create(rut="5-1", first_name="Ana", last_name="Soto")
+        add_history(self.patient, 2)
+
+    async def test_read_views_under_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        for url in (reverse("home"), reverse("patient_list") + "?q=soto",
+                    reverse("patient_detail", args=[self.patient.pk])):
+            response = await client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        # el middleware también cuenta las consultas hechas desde sync_to_async
+        self.assertIn(f'desc="{PatientDetailQueriesTests.EXPECTED_QUERIES} queries"', response["Server-Timing"])
+        self.assertEqual((await client.get(reverse("patient_detail", args=[0]))).status_code, 404)
+
+    async def test_anonymous_is_redirected_to_login(self):
+        response = await AsyncClient().get(reverse("patient_list"))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("?next=", response["Location"])
+
+
+class AudiogramSaveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        self.patient = Patient.objects.create(rut="6-K", first_name="Ana", last_name="Soto")
+
+    def post_data(self, traces, instances=()):
+        data = {
+            "date": "2024-05-02", "exam_type": "TONAL", "transducer": "INSERT", "comments": "",
+            "form-TOTAL_FORMS": len(traces), "form-INITIAL_FORMS": len(instances),
+            "form-MIN_NUM_FORMS": 0, "form-MAX_NUM_FORMS": 1000,
+        }
+        for i, trace in enumerate(traces):
+            if i < len(instances):
+                data[f"form-{i}-id"] = instances[i].pk
+            for name, value in trace.items():
+                data[f"form-{i}-{name}"] = value
+        return data
+
+    def test_create_uses_a_single_threshold_insert(self):
+        traces = [
+            {"ear": ear, "pathway": pathway, "f_500": 20, "f_1000": 30, "f_2000": 40}
+            for ear in ("R", "L") for pathway in ("AC", "BC")
+        ]
+        url = reverse("audiogram_create", args=[self.patient.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, self.post_data(traces))
+        self.assertEqual(response.status_code, 302)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "core_threshold"')]
+        self.assertEqual(len(inserts), 1)
+        ag = self.patient.audiograms.get()
+        self.assertEqual(ag.thresholds.count(), 4)
+        self.assertEqual(ag.pta_right, 30.0)
+
+    def test_edit_updates_in_place_and_drops_missing_traces(self):
+        ag = Audiogram.objects.create(patient=self.patient, date=date(2024, 5, 2))
+        right = Threshold.objects.create(audiogram=ag, ear="R", f_500=10, f_1000=10, f_2000=10)
+        left = Threshold.objects.create(audiogram=ag, ear="L", f_500=10)
+        data = self.post_data(
+            [{"ear": "R", "pathway": "AC", "f_500": 50, "f_1000": 50, "f_2000": 50},
+             {"ear": "L", "pathway": "BC", "f_500": 15}],
+            [right, left],
+        )
+        response = self.client.post(reverse("audiogram_edit", args=[ag.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        rows = {(t.ear, t.pathway): t for t in ag.thresholds.all()}
+        self.assertEqual(set(rows), {("R", "AC"), ("L", "BC")})
+        self.assertEqual(rows["R", "AC"].pk, right.pk)
+        self.assertEqual(rows["R", "AC"].f_1000, 50)
+        ag.refresh_from_db()
+        self.assertEqual(ag.pta_right, 50.0)
+        self.assertIsNone(ag.pta_left)
+
+    def test_duplicate_trace_is_rejected(self):
+        traces = [{"ear": "R", "pathway": "AC", "f_500": 20}, {"ear": "R", "pathway": "AC", "f_500": 30}]
+        response = self.client.post(reverse("audiogram_create", args=[self.patient.pk]), self.post_data(traces))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["t_formset"].non_form_errors())
+        self.assertFalse(self.patient.audiograms.exists())
+
+    def test_edit_form_only_adds_missing_default_rows(self):
+        ag = Audiogram.objects.create(patient=self.patient, date=date(2024, 5, 2))
+        Threshold.objects.create(audiogram=ag, ear="R", f_500=10)
+        response = self.client.get(reverse("audiogram_edit", args=[ag.pk]))
+        self.assertEqual(len(response.context["t_formset"].forms), 5)
+
+
+class PatientSummaryTests(TestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(rut="7-8", first_name="Ana", last_name="Soto")
+
+    def add_exam(self, day, level):
+        with self.captureOnCommitCallbacks(execute=True):
+            ag = Audiogram.objects.create(patient=self.patient, date=day)
+            Threshold.objects.create(audiogram=ag, ear="R", f_500=level, f_1000=level, f_2000=level)
+            Threshold.objects.create(audiogram=ag, ear="L", f_500=10, f_1000=10, f_2000=10)
+            ag.refresh_pta()
+        return ag
+
+    def test_refreshed_incrementally_and_matches_rebuild(self):
+        self.add_exam(date(2023, 1, 10), 30)
+        latest = self.add_exam(date(2024, 2, 1), 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            Anamnesis.objects.create(patient=self.patient, date=date(2024, 2, 1), tinnitus=True)
+            Anamnesis.objects.create(patient=self.patient, date=date(2024, 3, 5))
+        s = PatientSummary.objects.get(pk=self.patient.pk)
+        self.assertEqual((s.exam_count, s.visit_count, s.last_visit), (2, 3, date(2024, 3, 5)))
+        self.assertEqual((s.last_pta_right, s.last_pta_left, s.last_pta_worst), (60.0, 10.0, 60.0))
+        self.assertEqual(s.last_loss_degree, "MODERATE")
+        self.assertFalse(s.tinnitus)  # la última anamnesis no lo registra
+
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.delete()
+        s.refresh_from_db()
+        self.assertEqual((s.exam_count, s.last_pta_right, s.last_loss_degree), (1, 30.0, "MILD"))
+
+        expected = PatientSummary.objects.values().get(pk=self.patient.pk)
+        PatientSummary.objects.all().delete()
+        self.assertEqual(summaries.rebuild(), 1)
+        rebuilt = PatientSummary.objects.values().get(pk=self.patient.pk)
+        self.assertEqual({**rebuilt, "updated_at": None}, {**expected, "updated_at": None})
+
+    def test_migration_fills_summaries_like_rebuild(self):
+        self.add_exam(date(2023, 1, 10), 30)
+        self.add_exam(date(2024, 2, 1), 60)
+        Anamnesis.objects.create(patient=self.patient, date=date(2024, 3, 5), vertigo=True)
+        SpeechAudiometry.objects.create(patient=self.patient, date=date(2024, 2, 1), srt=20)
+        Patient.objects.create(rut="8-6", first_name="Bea", last_name="Alba")
+        summaries.rebuild()
+        expected = list(PatientSummary.objects.order_by("pk").values())
+
+        PatientSummary.objects.all().delete()
+        migration = import_module("core.migrations.0007_patient_summary")
+        migration.populate_summaries(django_apps, mock.Mock(connection=connection))
+        self.assertEqual(
+            [{**row, "updated_at": None} for row in PatientSummary.objects.order_by("pk").values()],
+            [{**row, "updated_at": None} for row in expected],
+        )
+
+    def test_list_sorts_and_filters_on_summary(self):
+        self.add_exam(date(2024, 2, 1), 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.create(rut="8-6", first_name="Bea", last_name="Alba")
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        with self.assertNumQueries(4):  # sesión, usuario, COUNT, página con su resumen
+            response = self.client.get(reverse("patient_list") + "?orden=pta")
+        self.assertEqual([p.last_name for p in response.context["patients"]], ["Soto", "Alba"])
+        response = self.client.get(reverse("patient_list") + "?grado=MODERATE")
+        self.assertEqual([p.pk for p in response.context["patients"]], [self.patient.pk])
+        self.assertEqual(response.context["query"], "orden=nombre&grado=MODERATE")
+
+
+@skipUnless("replica" in settings.DATABASES, "sin alias replica (ver config/test_settings.py)")
+@override_settings(REPLICA_READS=True)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"} & set(settings.DATABASES)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        # solo existe en la réplica: si la vista lo encuentra, leyó de ahí
+        self.patient = Patient.objects.using("replica").create(rut="9-4", first_name="Rosa", last_name="Vera")
+
+    def test_patient_views_read_from_replica(self):
+        response = self.client.get(reverse("patient_list"))
+        self.assertEqual([p.pk for p in response.context["patients"]], [self.patient.pk])
+        self.assertEqual(self.client.get(reverse("patient_detail", args=[self.patient.pk])).status_code, 200)
+        self.assertFalse(Patient.objects.exists())  # fuera de esas vistas se lee default
+
+    def test_reads_stay_on_primary_after_a_write(self):
+        response = self.client.post(reverse("patient_create"), {"rut": "10-8", "first_name": "Eva", "last_name": "Paz"})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(reverse("patient_list"))
+        self.assertEqual([p.last_name for p in response.context["patients"]], ["Paz"])
+
+
+class ConnectionPoolTests(TestCase):
+    class Raw:
+        def __init__(self):
+            self.closed = False
+
+        def ping(self):
+            if self.closed:
+                raise OSError("cerrada")
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            self.closed = True
+
+    def test_connections_are_reused_recycled_and_bounded(self):
+        from .backends.mysql.base import ConnectionPool
+
+        pool = ConnectionPool(max_size=1, recycle=60)
+        first, second = pool.acquire(self.Raw), pool.acquire(self.Raw)
+        pool.release(first)
+        pool.release(second)  # pool lleno: se cierra
+        self.assertTrue(second.closed)
+        self.assertIs(pool.acquire(self.Raw, health_check=True), first)
+        first.closed = True  # el servidor cortó la conexión
+        pool.release(first)
+        self.assertIsNot(pool.acquire(self.Raw, health_check=True), first)
+        pool.recycle = 0
+        third = pool.acquire(self.Raw)
+        pool.release(third)
+        self.assertTrue(third.closed)
+
+
+class PrescriptionTests(TestCase):
+    def test_rules_vectorized_and_limited_by_ldl(self):
+        flat = np.full(len(prescription.FREQS), 40.0)
+        half = prescription.prescribe(flat, rule="HALF")
+        self.assertEqual(half.shape, (len(prescription.INPUT_LEVELS), len(prescription.FREQS)))
+        mid = prescription.INPUT_LEVELS.index(65)
+        self.assertTrue((half[mid] == 20).all())
+        self.assertTrue((half[0] > half[mid]).all() and (half[mid] > half[-1]).all())  # compresión
+        nal = prescription.prescribe(flat, rule="NAL-R")[mid]
+        self.assertEqual(nal[prescription.FREQS.index(1000)], round(0.05 * 120 + 0.31 * 40 + 1, 1))
+
+        batch = np.stack([flat, flat + 20, np.full_like(flat, np.nan)])
+        gains = prescription.prescribe(batch, ldl=np.tile([90.0, 90, 90, 90], (3, 1)))
+        self.assertEqual(gains.shape, (3, len(prescription.INPUT_LEVELS), len(prescription.FREQS)))
+        self.assertTrue((gains[:2, -1] <= 10).all())  # 80 dB + ganancia <= LDL 90
+        self.assertTrue(np.isnan(gains[2]).all())
+
+    def test_targets_memoized_and_precomputed_for_candidates(self):
+        patient = Patient.objects.create(rut="11-6", first_name="Ana", last_name="Soto")
+        ag = None
+        for p in (patient, Patient.objects.create(rut="12-4", first_name="Luis", last_name="Rojas")):
+            with self.captureOnCommitCallbacks(execute=True):
+                ag = Audiogram.objects.create(patient=p, date=date(2024, 5, 2))
+                for ear in ("R", "L"):
+                    Threshold.objects.create(audiogram=ag, ear=ear, f_500=40, f_1000=50, f_2000=60, f_4000=70)
+                ag.refresh_pta()
+        self.assertEqual(prescription.precompute(), len(prescription.RULES))  # mismos umbrales: una fila por regla
+        self.assertEqual(prescription.precompute(), 0)
+        with self.assertNumQueries(3):  # trazos, LDL y el objetivo ya memorizado (sin recalcular)
+            targets = prescription.targets_for(ag)
+        self.assertEqual(len(targets["R"]), len(prescription.INPUT_LEVELS))
+
+        LDL.objects.create(patient=patient, date=date(2024, 5, 2), ear="R", ldl_500=80, ldl_1k=80, ldl_2k=80, ldl_4k=80)
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        response = self.client.get(reverse("audiogram_prescription", args=[patient.audiograms.get().pk]) + "?regla=POGO")
+        self.assertEqual(response.status_code, 200)
+        right = response.context["ears"][0]["rows"]
+        self.assertTrue(all(g is None or level + g <= 80 for level, gains in right for g in gains))
+
+
+class ClassificationTests(TestCase):
+    def test_rules_vectorized(self):
+        nan = np.full(8, np.nan)
+        ac = np.array([
+            [[40, 40, 40, 40, 40, 40, 40, 40], [10, 10, 10, 10, 10, 10, 10, 10]],  # OD conductiva, asimétrica
+            [[10, 10, 10, 15, 35, 40, 20, 15], [50, 50, 50, 60, 70, 70, 70, 70]],  # OD muesca, OI sin ósea
+        ], dtype=float)
+        bc = np.array([
+            [[np.nan, 10, 10, 10, 10, 10, np.nan, np.nan], [np.nan, 10, 10, 10, 10, 10, np.nan, np.nan]],
+            [[np.nan, 10, 10, 15, 35, 40, np.nan, np.nan], nan],
+        ])
+        pta = np.array([[40, 10], [13.3, 50]])
+        result = classification.classify(ac, bc, pta, ["SUPRA", "INSERT"], [True, True])
+        self.assertEqual(list(result["type_right"]), ["CONDUCTIVE", "NORMAL"])
+        self.assertEqual(list(result["type_left"]), ["NORMAL", ""])
+        self.assertEqual(list(result["degree_left"]), ["NORMAL", "MODERATE"])
+        self.assertEqual(list(result["gap_right"]), [30.0, 0.0])
+        self.assertEqual(list(result["notch_right"]), [False, True])
+        self.assertEqual(list(result["asymmetry"]), [True, True])
+        self.assertFalse(result["masking_missing"].any())  # se usó máscara
+
+        unmasked = classification.classify(ac, bc, pta, ["SUPRA", "SPEAKER"], [False, False])
+        self.assertEqual(list(unmasked["masking_missing"]), [True, False])  # brecha de 30 dB sin máscara
+
+    def test_stored_on_save_and_batch(self):
+        patient = Patient.objects.create(rut="11-6", first_name="Ana", last_name="Soto")
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        data = {
+            "date": "2024-05-02", "exam_type": "TONAL", "transducer": "SUPRA", "comments": "",
+            "form-TOTAL_FORMS": 2, "form-INITIAL_FORMS": 0, "form-MIN_NUM_FORMS": 0, "form-MAX_NUM_FORMS": 1000,
+            "form-0-ear": "R", "form-0-pathway": "AC", "form-0-f_500": 60, "form-0-f_1000": 60, "form-0-f_2000": 60,
+            "form-1-ear": "R", "form-1-pathway": "BC", "form-1-f_500": 10, "form-1-f_1000": 10, "form-1-f_2000": 10,
+        }
+        self.client.post(reverse("audiogram_create", args=[patient.pk]), data)
+        c = AudiogramClassification.objects.get()
+        self.assertEqual((c.type_right, c.degree_right, c.version), ("CONDUCTIVE", "MODERATE", classification.VERSION))
+        self.assertTrue(c.masking_missing and c.flagged)
+        response = self.client.get(reverse("patient_detail", args=[patient.pk]))
+        self.assertContains(response, "Sin máscara")
+
+        c.delete()
+        self.assertEqual(classification.classify_all(chunk_size=1), (1, 1))
+        self.assertEqual(classification.classify_all(), (0, 0))  # ya al día
+        self.assertEqual(classification.totals()["masking_missing"], 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RoutePerformanceTests(TestCase):
+    """
+    Todas las rutas de core/urls.py y config/urls.py (menos el admin) con un
+    tope de consultas, medidas con historial corto y largo: el número de
+    consultas no debe crecer con el historial. Los tiempos los mide el
+    comando benchmark, no los tests (dependen de la máquina).
+    """
+    SIZES = ((2, 5), (12, 40))  # (registros del paciente, pacientes extra), acumulados
+    # nombre: (método, tope de consultas con sesión y usuario incluidos)
+    ROUTES = {
+        "login": ("GET", 1),
+        "logout": ("POST", 5),
+        "home": ("GET", 4),
+        "patient_list": ("GET", 5),
+        "patient_create": ("GET", 3),
+        "patient_autocomplete": ("GET", 4),
+        "patient_create:post": ("POST", 6),  # + RUT duplicado por rut_body
+        "patient_detail": ("GET", 10),
+        "patient_report": ("GET", 8),
+        "anamnesis_create": ("GET", 4),
+        "anamnesis_create:post": ("POST", 5),
+        "audiogram_create": ("GET", 4),
+        "audiogram_create:post": ("POST", 10),
+        "speech_create": ("GET", 4),
+        "speech_create:post": ("POST", 5),
+        "ldl_create": ("GET", 4),
+        "ldl_create:post": ("POST", 5),
+        "archived_restore:post": ("POST", 5),
+        "audiogram_edit": ("GET", 5),
+        "audiogram_chart": ("GET", 4),
+        "audiogram_chart_png": ("GET", 4),
+        "audiogram_prescription": ("GET", 7),
+        "audiogram_import": ("GET", 3),
+        "export_index": ("GET", 3),
+        "export_csv": ("GET", 4),
+        "export_job": ("POST", 4),
+        "job_list": ("GET", 4),
+        "job_detail": ("GET", 4),
+        "job_status": ("GET", 4),
+        "job_download": ("GET", 4),
+        "cohort_sts": ("GET", 5),
+        "perf_dashboard": ("GET", 3),
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user("admin", password="clave-segura-123", is_staff=True)
+        self.patient = Patient.objects.create(rut="7-8", first_name="Ana", last_name="Soto", birth_date=date(1970, 3, 1))
+        self.job = jobs.enqueue("export_csv", {"kind": "patients"}, self.user)
+        self.job.output_file.save("pacientes.csv", ContentFile(b"id\n"))
+        self.posts = 0
+
+    def request(self, name, method):
+        url_name = name.split(":")[0]
+        ag = self.patient.audiograms.first()
+        args = {
+            "patient_detail": [self.patient.pk], "patient_report": [self.patient.pk],
+            "audiogram_edit": [ag.pk], "audiogram_chart": [ag.pk], "audiogram_chart_png": [ag.pk],
+            "audiogram_prescription": [ag.pk], "export_csv": ["patients"], "export_job": ["patients"],
+            "job_detail": [self.job.pk], "job_status": [self.job.pk], "job_download": [self.job.pk],
+            "archived_restore": [self.patient.pk, "anamnesis", 0],  # nada archivado: mensaje y vuelta a la ficha
+        }.get(url_name, [self.patient.pk] if url_name.endswith("_create") and url_name != "patient_create" else [])
+        url = reverse(url_name, args=args)
+        if method == "GET":
+            return self.client.get(url, {"q": "soto"} if url_name == "patient_autocomplete" else {})
+        self.posts += 1
+        data = {
+            "login": {},
+            "patient_create": {"rut": synthetic.format_rut(30_000_000 + self.posts), "first_name": "Luis", "last_name": "Rojas"},
+            "anamnesis_create": {"date": "2024-05-02"},
+            "audiogram_create": {
+                "date": "2024-05-02", "exam_type": "TONAL", "transducer": "INSERT", "comments": "",
+                "form-TOTAL_FORMS": 1, "form-INITIAL_FORMS": 0, "form-MIN_NUM_FORMS": 0, "form-MAX_NUM_FORMS": 1000,
+                "form-0-ear": "R", "form-0-pathway": "AC", "form-0-f_500": 20, "form-0-f_1000": 30, "form-0-f_2000": 40,
+            },
+            "speech_create": {"date": "2024-05-02", "ear": "R", "srt": 20, "wrs_percent": 90},
+            "ldl_create": {"date": "2024-05-02", "ear": "R", "ldl_500": 95},
+            "export_job": {"date_from": "", "date_to": ""},
+        }.get(url_name, {})
+        return self.client.post(url, data)
+
+    def measure(self, name, method):
+        self.client.force_login(self.user)  # logout cierra la sesión
+        if method == "GET":
+            self.request(name, method)  # calienta cachés (contadores del panel, gráficos)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.request(name, method)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        expected = 404 if name == "audiogram_chart_png" and charts.cairosvg is None else (302 if method == "POST" else 200)
+        self.assertEqual(response.status_code, expected, name)
+        return len(ctx.captured_queries)
+
+    def test_patient_card_cached_until_patient_saved(self):
+        self.client.force_login(self.user)
+        url = reverse("patient_detail", args=[self.patient.pk])
+        self.client.get(url)
+        Patient.objects.filter(pk=self.patient.pk).update(phone="+56911112222")  # sin tocar updated_at
+        self.assertNotContains(self.client.get(url), "+56911112222")
+        self.patient.phone = "+56911112222"
+        self.patient.save()
+        self.assertContains(self.client.get(url), "+56911112222")
+
+    def test_vendor_assets_fall_back_to_cdn_until_downloaded(self):
+        css = "bootstrap/css/bootstrap.min.css"
+        manifest = {**settings.STORAGES, "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
+        }}
+        vendor.url.cache_clear()
+        self.addCleanup(vendor.url.cache_clear)
+        with override_settings(STORAGES=manifest, STATIC_ROOT=tempfile.mkdtemp()):
+            self.assertEqual(vendor.url(css), vendor.CDN_URLS[css])  # sin manifiesto: no hay 500
+        vendor.url.cache_clear()
+        with override_settings(STATICFILES_DIRS=[tempfile.mkdtemp()]):
+            static_dir = settings.STATICFILES_DIRS[0]
+            (Path(static_dir) / "vendor" / css).parent.mkdir(parents=True)
+            (Path(static_dir) / "vendor" / css).write_text("/* local */")
+            self.assertEqual(vendor.url(css), settings.STATIC_URL + "vendor/" + css)
+        vendor.url.cache_clear()
+        self.assertContains(self.client.get(reverse("login")), vendor.CDN_URLS[css])
+
+    def test_missing_vendor_assets_fail_the_check_when_required(self):
+        static_dir = tempfile.mkdtemp()
+        with override_settings(STATICFILES_DIRS=[static_dir]):
+            self.assertEqual(vendor.check_assets(None), [])  # VENDOR_ASSETS_REQUIRED=False (DEBUG)
+            with override_settings(VENDOR_ASSETS_REQUIRED=True):
+                [error] = vendor.check_assets(None)
+                self.assertEqual(error.id, "core.E001")
+                for _, _, target in vendor.ASSETS:
+                    (Path(static_dir) / "vendor" / target).parent.mkdir(parents=True, exist_ok=True)
+                    (Path(static_dir) / "vendor" / target).write_text("/* local */")
+                self.assertEqual(vendor.check_assets(None), [])
+
+    def test_every_route_is_covered(self):
+        from config import urls as project_urls
+        from core import urls as core_urls
+
+        names = {p.name for p in [*project_urls.urlpatterns, *core_urls.urlpatterns] if isinstance(p, URLPattern)}
+        self.assertEqual(names, {name.split(":")[0] for name in self.ROUTES})
+
+    def test_queries_bounded_and_constant_across_sizes(self):
+        counts = {}
+        offset = 0
+        for history, extra in self.SIZES:
+            add_history(self.patient, history)
+            synthetic.generate(extra, batch_size=extra, start=offset)
+            offset += extra
+            for name, (method, limit) in self.ROUTES.items():
+                with self.subTest(route=name, history=history):
+                    queries = self.measure(name, method)
+                    self.assertLessEqual(queries, limit)
+                    self.assertEqual(counts.setdefault(name, queries), queries, "crece con el historial")
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.addCleanup(autocomplete.index.clear)
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        self.ana = Patient.objects.create(rut="12.345.678-5", first_name="Ana María", last_name="Soto Muñoz")
+        Patient.objects.create(rut="9.876.543-3", first_name="Luis", last_name="Sotomayor")
+        Patient.objects.create(rut="11.111.111-1", first_name="Eva", last_name="Rojas")
+
+    def names(self, q):
+        response = self.client.get(reverse("patient_autocomplete"), {"q": q})
+        self.assertIn("max-age", response["Cache-Control"])
+        return response.json()["source"], [r["name"] for r in response.json()["results"]]
+
+    def test_cold_index_falls_back_to_db(self):
+        self.assertEqual(self.names("sot"), ("db", ["Soto Muñoz, Ana María", "Sotomayor, Luis"]))
+        self.assertEqual(self.names("s"), ("index", []))  # menos de MIN_CHARS
+
+    def test_warm_index_matches_db_and_follows_signals(self):
+        autocomplete.warm()
+        for q in ("sot", "munoz ana", "12.345", "98765", "xyz"):
+            db = [e.label for _, e in autocomplete._db_search(q, 10)]
+            self.assertEqual(self.names(q), ("index", db), q)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.last_name = "Pérez"
+            self.ana.save()
+            Patient.objects.create(rut="5.555.555-5", first_name="Sofía", last_name="Soto")
+        self.assertEqual(self.names("sot")[1], ["Soto, Sofía", "Sotomayor, Luis"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.delete()
+        self.assertEqual(self.names("perez")[1], [])
+
+    def test_warm_index_answers_without_patient_queries(self):
+        autocomplete.warm()
+        with self.assertNumQueries(2):  # sesión y usuario
+            self.assertEqual(self.names("sot")[0], "index")
+
+    def test_index_search_reads_only_up_to_the_limit(self):
+        class CountingDict(dict):
+            reads = 0
+
+            def __getitem__(self, key):
+                CountingDict.reads += 1
+                return super().__getitem__(key)
+
+        index = autocomplete.PrefixIndex()
+        index.load(
+            (pk, f"{pk}-K", f"{pk}K", f"apellido{pk % 500} otro{pk % 37} nombre{pk % 91}", "A", "B")
+            for pk in range(1, 100_001)
+        )
+        everyone = dict(index.entries)
+        index.entries = CountingDict(everyone)
+        for q in ("apellido1", "nombre9 otro3", "12"):
+            CountingDict.reads = 0
+            found = index.search(q, 10)
+            # Cada resultado calza, y el costo depende del límite, no de los 100.000 pacientes
+            self.assertEqual(len(found), 10, q)
+            for pk, entry in found:
+                self.assertEqual(entry, everyone[pk])
+                if q == "12":
+                    self.assertTrue(entry.rut_search.startswith("12"))
+                else:
+                    words = entry.search_name.split()
+                    self.assertTrue(all(any(w.startswith(t) for w in words) for t in q.split()), q)
+            self.assertLess(CountingDict.reads, 200, q)
+
+
+class RutTests(TestCase):
+    def test_check_digit_and_canonical_key(self):
+        self.assertEqual(rut.parse("12.345.678-5"), (12345678, "5"))
+        self.assertEqual(rut.parse(" 123456785 "), (12345678, "5"))
+        self.assertEqual(rut.canonical("6-k"), "6-K")
+        self.assertEqual(rut.format_rut(5_000_000), "5.000.000-" + rut.check_digit(5_000_000))
+        for bad in ("12.345.678-4", "abc", "", "0-0"):
+            self.assertFalse(rut.is_valid(bad), bad)
+
+        legacy = Patient.objects.create(rut="12-3", first_name="Ana", last_name="Soto")  # DV inválido: se admite
+        self.assertEqual((legacy.rut_body, legacy.rut_dv), (None, ""))
+        ana = Patient.objects.create(rut="12345678-5", first_name="Ana", last_name="Rojas")
+        self.assertEqual(list(search_patients("12.345.678-5")), [ana])
+        self.assertIn("rut_body", str(search_patients("12.345.678-5").query))
+        self.assertIn("rut_search", str(search_patients("12.345").query))  # parcial: prefijo
+
+    def test_form_validates_and_rejects_other_format(self):
+        form = PatientForm({"rut": "123456785", "first_name": "Ana", "last_name": "Soto"})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().rut, "12.345.678-5")
+        for value in ("12345678-5", "12.345.678-4"):
+            form = PatientForm({"rut": value, "first_name": "Luis", "last_name": "Rojas"})
+            self.assertFalse(form.is_valid())
+            self.assertIn("rut", form.errors)
+
+    def test_merge_duplicates_repoints_children(self):
+        keeper = Patient.objects.create(rut="12345678-5", first_name="Ana", last_name="Soto")
+        dup = Patient.objects.create(rut="12.345.678-5", first_name="Ana", last_name="Soto", phone="+56911111111")
+        other = Patient.objects.create(rut="1-9", first_name="Luis", last_name="Rojas")
+        add_history(dup, 2)
+        SpeechAudiometry.objects.create(patient=dup)
+        LDL.objects.create(patient=dup, ear="R")
+
+        self.assertEqual(dedup.merge_duplicates(dry_run=True), (1, 1, 0))
+        self.assertEqual(dedup.merge_duplicates(), (1, 1, 10))  # 2 de cada sección + logo y LDL
+        self.assertEqual(set(Patient.objects.values_list("pk", flat=True)), {keeper.pk, other.pk})
+        keeper.refresh_from_db()
+        self.assertEqual((keeper.rut, keeper.phone), ("12.345.678-5", "+56911111111"))
+        for related in ("anamneses", "audiograms", "speech_tests", "ldl_tests"):
+            self.assertTrue(getattr(keeper, related).exists(), related)
+        self.assertEqual(keeper.summary.exam_count, 2)
+        self.assertEqual(dedup.merge_duplicates(), (0, 0, 0))
+
+    def test_merge_moves_audit_history_to_keeper(self):
+        keeper = Patient.objects.create(rut="12345678-5", first_name="Ana", last_name="Soto")
+        with self.captureOnCommitCallbacks(execute=True):
+            dup = Patient.objects.create(rut="12.345.678-5", first_name="Ana", last_name="Soto")
+            ag = Audiogram.objects.create(patient=dup, date=date(2024, 5, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            dedup.merge_duplicates()
+        self.assertFalse(AuditEntry.objects.filter(patient_id=dup.pk).exists())
+        self.assertEqual(
+            sorted((e.model, e.object_id) for e in audit.history(keeper.pk)),
+            sorted([("audiogram", ag.pk), ("patient", dup.pk)]),  # sin entrada de borrado por la fusión
+        )
+
+    def test_merge_keeps_archived_records_of_duplicates(self):
+        keeper = Patient.objects.create(rut="12345678-5", first_name="Ana", last_name="Soto")
+        dup = Patient.objects.create(rut="12.345.678-5", first_name="Ana", last_name="Soto")
+        for year in (2005, 2006, date.today().year):
+            ag = Audiogram.objects.create(patient=dup, date=date(year, 3, 1))
+            Threshold.objects.create(audiogram=ag, ear="R", f_1000=40)
+        self.assertEqual(archive.archive_all(years=5)["audiogram"], 1)
+        archived = ArchivedRecord.objects.get()
+
+        self.assertEqual(dedup.merge_duplicates(), (1, 1, 3))  # 2 audiometrías activas + 1 archivada
+        archived.refresh_from_db()
+        self.assertEqual(archived.patient_id, keeper.pk)
+        self.assertEqual(archive.restore("audiogram", [archived.source_id]), 1)
+        self.assertEqual(keeper.audiograms.count(), 3)
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    patient_cache.CACHE_ALIAS: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"},
+})
+class PatientCacheTests(TestCase):
+    def setUp(self):
+        caches[patient_cache.CACHE_ALIAS].clear()
+        patient_cache.stats.reset()
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        self.patient = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        add_history(self.patient, 2)
+
+    def test_visit_navigation_skips_db_until_a_child_changes(self):
+        detail = reverse("patient_detail", args=[self.patient.pk])
+        self.client.get(detail)
+        with self.assertNumQueries(4):  # solo sesión + usuario de cada request
+            self.client.get(detail)
+            self.client.get(reverse("anamnesis_create", args=[self.patient.pk]))
+        self.assertEqual(
+            [(r["kind"], r["hits"], r["misses"]) for r in patient_cache.stats.summary()],
+            [("detail", 1, 1), ("patient", 1, 0)],
+        )
+
+        self.client.post(reverse("anamnesis_create", args=[self.patient.pk]), {
+            "date": "2024-06-01", "main_complaint": "Control nuevo",
+        })
+        response = self.client.get(detail)
+        self.assertContains(response, "Control nuevo")
+
+    def test_bulk_writes_bump_versions(self):
+        detail = reverse("patient_detail", args=[self.patient.pk])
+        self.client.get(detail)
+        Anamnesis.objects.filter(patient=self.patient).update(main_complaint="Editado en lote")
+        self.assertNotContains(self.client.get(detail), "Editado en lote")  # sin señales: sigue en caché
+        patient_cache.bump([self.patient.pk])
+        self.assertContains(self.client.get(detail), "Editado en lote")
+
+        Audiogram.objects.filter(patient=self.patient).update(comments="Revisado")
+        patient_cache.bump_all()
+        self.assertEqual(self.client.get(detail).context["audiograms"][0].comments, "Revisado")
+        with self.assertRaises(Patient.DoesNotExist):
+            patient_cache.get_patient(self.patient.pk + 1000)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("fono", password="clave-segura-123"))
+        self.patient = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        self.exams = []
+        for year in (2008, 2010, 2012, date.today().year):
+            ag = Audiogram.objects.create(patient=self.patient, date=date(year, 3, 1))
+            Threshold.objects.create(audiogram=ag, ear="R", f_500=10, f_1000=20, f_2000=30)
+            self.exams.append(ag)
+        for year in (2009, 2011):
+            Anamnesis.objects.create(patient=self.patient, date=date(year, 1, 1), main_complaint=f"Consulta {year}")
+
+    def test_history_uses_patient_date_index(self):
+        sql, params = self.patient.audiograms.all()[:5].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("audiogram_patient_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)  # sin ordenar en memoria
+
+    def test_archive_keeps_latest_and_baseline_and_reads_through(self):
+        self.assertEqual(archive.archive_all(years=5, dry_run=True)["audiogram"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = archive.archive_all(years=5, chunk_size=1)
+        self.assertEqual((totals["audiogram"], totals["anamnesis"]), (2, 1))
+        self.assertEqual(
+            list(self.patient.audiograms.values_list("date__year", flat=True)), [date.today().year, 2008],
+        )
+        self.assertEqual(self.patient.summary.exam_count, 4)  # los archivados siguen contando
+
+        # Las vistas GET leen del archivo sin restaurar
+        archived = self.exams[1]
+        detail = reverse("patient_detail", args=[self.patient.pk])
+        self.assertRedirects(self.client.get(reverse("audiogram_edit", args=[archived.pk])), detail)
+        response = self.client.get(reverse("audiogram_chart", args=[archived.pk]))
+        self.assertEqual(response.content, charts.get_chart([self.exams[0].thresholds.get()])[1].encode())
+        response = self.client.get(reverse("audiogram_prescription", args=[archived.pk]))
+        self.assertContains(response, "audiometría del")
+        self.assertEqual(response.context["audiogram"].date, date(2010, 3, 1))
+        self.assertFalse(Audiogram.objects.filter(pk=archived.pk).exists())
+        self.assertEqual(ArchivedRecord.objects.filter(kind="audiogram").count(), 2)
+
+        url = reverse("archived_restore", args=[self.patient.pk, "audiogram", archived.pk])
+        self.assertRedirects(self.client.post(url), detail)
+        restored = Audiogram.objects.get(pk=archived.pk)
+        self.assertEqual(restored.thresholds.get().f_2000, 30)
+        self.assertTrue(AudiogramClassification.objects.filter(audiogram=restored).exists())
+        self.assertEqual(ArchivedRecord.objects.filter(kind="audiogram").count(), 1)
+        self.assertEqual(self.client.get(reverse("audiogram_edit", args=[999])).status_code, 404)
+
+    def test_jsonl_backend_restores_from_file(self):
+        with override_settings(ARCHIVE_BACKEND="jsonl", ARCHIVE_DIR=tempfile.mkdtemp()):
+            archive.archive_all(years=5, kinds=["anamnesis"])
+            row = ArchivedRecord.objects.get()
+            self.assertEqual((row.payload, row.file), (None, "anamnesis/2009.jsonl.gz"))
+            self.assertContains(self.client.get(reverse("patient_detail", args=[self.patient.pk])), "Restaurar")
+
+            url = reverse("archived_restore", args=[self.patient.pk, "anamnesis", row.source_id])
+            self.assertRedirects(self.client.post(url), reverse("patient_detail", args=[self.patient.pk]))
+        self.assertEqual(Anamnesis.objects.get(pk=row.source_id).main_complaint, "Consulta 2009")
+        self.assertFalse(ArchivedRecord.objects.exists())
+
+    def test_jsonl_lines_rolled_back_and_purged_with_the_patient(self):
+        archive_dir = Path(tempfile.mkdtemp())
+        path = archive_dir / "anamnesis" / "2009.jsonl.gz"
+
+        def lines():
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                return [json.loads(line)["fields"]["main_complaint"] for line in fh]
+
+        with override_settings(ARCHIVE_BACKEND="jsonl", ARCHIVE_DIR=archive_dir):
+            with mock.patch.object(ArchivedRecord.objects, "bulk_create", side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    archive.archive_all(years=5, kinds=["anamnesis"])
+            self.assertFalse(path.exists())  # sin líneas huérfanas
+            archive.archive_all(years=5, kinds=["anamnesis"])
+            self.assertEqual(lines(), ["Consulta 2009"])
+            self.assertEqual(archive.compact(), 0)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.patient.delete()
+            self.assertEqual(lines(), ["Consulta 2009"])  # hasta compactar
+            self.assertEqual(archive.compact(), 1)
+            self.assertEqual(lines(), [])
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fono", password="clave-segura-123")
+        self.client.force_login(self.user)
+        self.patient = Patient.objects.create(rut="1-9", first_name="Ana", last_name="Soto")
+        self.ag = Audiogram.objects.create(patient=self.patient, date=date(2024, 5, 2))
+        self.right = Threshold.objects.create(audiogram=self.ag, ear="R", f_500=10, f_1000=10)
+
+    def test_audiogram_edit_records_only_changed_levels(self):
+        data = {
+            "date": "2024-05-02", "exam_type": "TONAL", "transducer": "INSERT", "comments": "",
+            "form-TOTAL_FORMS": 2, "form-INITIAL_FORMS": 1, "form-MIN_NUM_FORMS": 0, "form-MAX_NUM_FORMS": 1000,
+            "form-0-id": self.right.pk, "form-0-ear": "R", "form-0-pathway": "AC", "form-0-f_500": 10,
+            "form-0-f_1000": 40, "form-1-ear": "L", "form-1-pathway": "AC", "form-1-f_500": 25,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("audiogram_edit", args=[self.ag.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        entries = {e.action: e for e in audit.history(self.patient.pk)}  # la audiometría no cambió
+        self.assertEqual(set(entries), {"update", "create"})
+        self.assertEqual(entries["update"].object_id, self.right.pk)
+        self.assertEqual(entries["update"].changes, {"f_1000": [10, 40]})
+        self.assertEqual(entries["create"].changes["f_500"], [None, 25])
+        self.assertEqual(entries["create"].model, "threshold")
+
+    def test_trace_dropped_in_audiogram_edit_is_recorded(self):
+        left = Threshold.objects.create(audiogram=self.ag, ear="L", f_500=25)
+        data = {
+            "date": "2024-05-02", "exam_type": "TONAL", "transducer": "INSERT", "comments": "",
+            "form-TOTAL_FORMS": 1, "form-INITIAL_FORMS": 1, "form-MIN_NUM_FORMS": 0, "form-MAX_NUM_FORMS": 1000,
+            "form-0-id": self.right.pk, "form-0-ear": "R", "form-0-pathway": "AC", "form-0-f_500": 10,
+            "form-0-f_1000": 10,
+        }
+        AuditEntry.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("audiogram_edit", args=[self.ag.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Threshold.objects.filter(pk=left.pk).exists())
+        [entry] = audit.history(self.patient.pk)
+        self.assertEqual((entry.action, entry.model, entry.object_id), ("delete", "threshold", left.pk))
+        self.assertEqual((entry.changes["ear"], entry.changes["f_500"]), (["L", None], [25, None]))
+
+    def test_batch_writes_committed_entries_in_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with audit.batch(self.user.pk, "job:test"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    patient = Patient.objects.get(pk=self.patient.pk)
+                    patient.phone = "+56 9 1234 5678"
+                    patient.save()
+                    try:
+                        with transaction.atomic():
+                            Audiogram.objects.get(pk=self.ag.pk).delete()
+                            raise RuntimeError
+                    except RuntimeError:
+                        pass  # revertido: no queda en el historial
+                    self.ag.comments = "Control"
+                    self.ag.save()
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "core_auditentry"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            [(e.model, e.changes, e.user_id, e.origin) for e in audit.history(self.patient.pk)],
+            [("audiogram", {"comments": ["", "Control"]}, self.user.pk, "job:test"),
+             ("patient", {"phone": ["", "+56 9 1234 5678"]}, self.user.pk, "job:test")],
+        )
+
+    def test_history_survives_deletion_and_is_a_range_scan(self):
+        pk = self.patient.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.delete()
+        deleted = {e.model: e for e in AuditEntry.objects.filter(patient_id=pk)}
+        self.assertEqual(set(deleted), {"patient", "audiogram"})
+        self.assertEqual(deleted["patient"].changes["rut"], ["1-9", None])
+
+        sql, params = audit.history(pk)[:50].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("audit_patient_at_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
 
-# Create your tests here.
@@ -6,10 +6,34 @@ urlpatterns = [
 
     path("pacientes/", views.patient_list, name="patient_list"),
     path("pacientes/nuevo/", views.patient_create, name="patient_create"),
+    path("pacientes/buscar/", views.patient_autocomplete, name="patient_autocomplete"),
     path("pacientes/<int:pk>/", views.patient_detail, name="patient_detail"),
+    path("pacientes/<int:pk>/informe.pdf", views.patient_report, name="patient_report"),
 
     path("pacientes/<int:patient_pk>/anamnesis/nueva/", views.anamnesis_create, name="anamnesis_create"),
     path("pacientes/<int:patient_pk>/audiometria/nueva/", views.audiogram_create, name="audiogram_create"),
     path("pacientes/<int:patient_pk>/vocal/nueva/", views.speech_create, name="speech_create"),
     path("pacientes/<int:patient_pk>/ldl/nueva/", views.ldl_create, name="ldl_create"),
+    path(
+        "pacientes/<int:patient_pk>/archivo/<str:kind>/<int:source_id>/restaurar/",
+        views.archived_restore, name="archived_restore",
+    ),
+
+    path("audiometrias/<int:pk>/editar/", views.audiogram_edit, name="audiogram_edit"),
+    path("audiometrias/<int:pk>/grafico.svg", views.audiogram_chart, name="audiogram_chart"),
+    path("audiometrias/<int:pk>/grafico.png", views.audiogram_chart, {"fmt": "png"}, name="audiogram_chart_png"),
+    path("audiometrias/<int:pk>/prescripcion/", views.audiogram_prescription, name="audiogram_prescription"),
+    path("audiometrias/importar/", views.audiogram_import, name="audiogram_import"),
+
+    path("exportar/", views.export_index, name="export_index"),
+    path("exportar/<str:kind>.csv", views.export_csv, name="export_csv"),
+    path("exportar/<str:kind>/segundo-plano/", views.export_job, name="export_job"),
+
+    path("trabajos/", views.job_list, name="job_list"),
+    path("trabajos/<int:pk>/", views.job_detail, name="job_detail"),
+    path("trabajos/<int:pk>/estado/", views.job_status, name="job_status"),
+    path("trabajos/<int:pk>/descargar/", views.job_download, name="job_download"),
+
+    path("analitica/sts/", views.cohort_sts, name="cohort_sts"),
+    path("rendimiento/", views.perf_dashboard, name="perf_dashboard"),
 ]
@@ -0,0 +1,60 @@
+"""
+Recursos de terceros (Bootstrap, Bootstrap Icons) en versiones fijas.
+
+Se sirven desde static/vendor/ una vez descargados (`manage.py
+fetch_vendor_assets` y luego collectstatic). Mientras no estén, url()
+entrega la misma versión desde el CDN: un checkout recién clonado se ve con
+estilos y, con DEBUG=False, el manifiesto no falla por una entrada que falta.
+En producción (VENDOR_ASSETS_REQUIRED) el check core.E001 avisa que faltan:
+los archivos descargados no se versionan (.gitignore).
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.checks import Error, Tags, register
+
+CDN = "https://cdn.jsdelivr.net/npm"
+
+# (paquete@versión, ruta en el paquete, destino bajo static/vendor/)
+ASSETS = [
+    ("bootstrap@5.3.3", "dist/css/bootstrap.min.css", "bootstrap/css/bootstrap.min.css"),
+    ("bootstrap@5.3.3", "dist/css/bootstrap.min.css.map", "bootstrap/css/bootstrap.min.css.map"),
+    ("bootstrap@5.3.3", "dist/js/bootstrap.bundle.min.js", "bootstrap/js/bootstrap.bundle.min.js"),
+    ("bootstrap@5.3.3", "dist/js/bootstrap.bundle.min.js.map", "bootstrap/js/bootstrap.bundle.min.js.map"),
+    ("bootstrap-icons@1.11.3", "font/bootstrap-icons.min.css", "bootstrap-icons/font/bootstrap-icons.min.css"),
+    ("bootstrap-icons@1.11.3", "font/fonts/bootstrap-icons.woff2", "bootstrap-icons/font/fonts/bootstrap-icons.woff2"),
+    ("bootstrap-icons@1.11.3", "font/fonts/bootstrap-icons.woff", "bootstrap-icons/font/fonts/bootstrap-icons.woff"),
+]
+CDN_URLS = {target: f"{CDN}/{package}/{source}" for package, source, target in ASSETS}
+
+
+def _local_url(path):
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        try:
+            return staticfiles_storage.url(path)
+        except ValueError:  # sin entrada en el manifiesto (o sin manifiesto)
+            return None
+    return staticfiles_storage.url(path) if finders.find(path) else None
+
+
+@lru_cache(maxsize=None)
+def url(target):
+    """URL local de static/vendor/<target> si existe; si no, la del CDN (misma versión)."""
+    return _local_url(f"vendor/{target}") or CDN_URLS[target]
+
+
+@register(Tags.staticfiles)
+def check_assets(app_configs, **kwargs):
+    """core.E001: con VENDOR_ASSETS_REQUIRED, cada recurso debe estar en static/vendor/."""
+    if not settings.VENDOR_ASSETS_REQUIRED:
+        return []
+    missing = [target for _, _, target in ASSETS if not finders.find(f"vendor/{target}")]
+    if not missing:
+        return []
+    return [Error(
+        f"Faltan {len(missing)} recursos en static/vendor/ (p. ej. {missing[0]}); se pedirían al CDN.",
+        hint="Corre `manage.py fetch_vendor_assets` (con red) y luego collectstatic.",
+        id="core.E001",
+    )]
@@ -1,29 +1,121 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
-from django.forms import modelformset_factory
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
 
-from .models import Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL
+from .models import EAR_CHOICES, LOSS_DEGREE_CHOICES, Patient, Anamnesis, Audiogram, Threshold, SpeechAudiometry, LDL, Job
+from . import charts
+from .audiograms import save_audiogram
 from .forms import (
-    PatientForm, AnamnesisForm, AudiogramForm, ThresholdForm, ThresholdFormSet,
-    SpeechForm, LDLForm
+    PatientForm, AnamnesisForm, AudiogramForm, ThresholdFormSet,
+    SpeechForm, LDLForm, AudiogramImportForm, ExportForm,
 )
+from . import analytics, archive, autocomplete, dashboard, exports, jobs, patient_cache, prescription
+from .perf import stats as perf_stats
+from .routers import read_from_replica
+from .importers import detect_format
+from .search import search_patients
+
+PATIENTS_PER_PAGE = 25
+# Orden del listado: columnas de Patient o de su resumen (PatientSummary)
+PATIENT_SORTS = {
+    "nombre": ("Nombre", ["last_name", "first_name", "id"]),
+    "visita": ("Última visita", [F("summary__last_visit").desc(nulls_last=True), "id"]),
+    "pta": ("Peor PTA", [F("summary__last_pta_worst").desc(nulls_last=True), "id"]),
+}
+
+
+# --------- Vistas async (ASGI) ---------
+# home, patient_list y patient_detail son de solo lectura y se consultan
+# constantemente desde recepción: bajo ASGI no ocupan un hilo por request
+# mientras esperan a la base. Bajo WSGI Django las ejecuta igual (adaptadas).
+def async_login_required(view):
+    """login_required para vistas async (el de Django 4.2 es solo sync)."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await sync_to_async(get_user)(request)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
 
-@login_required
-def home(request):
-    # Dashboard simple: últimos pacientes y acciones rápidas
-    patients = Patient.objects.order_by("-id")[:8]
-    return render(request, "core/home.html", {"patients": patients})
+
+async def _alist(qs):
+    return [obj async for obj in qs]
+
+
+@async_login_required
+async def home(request):
+    # Últimos pacientes, acciones rápidas e indicadores (contadores en caché)
+    patients, stats = await asyncio.gather(
+        _alist(Patient.objects.select_related("summary").order_by("-id")[:8]),
+        sync_to_async(dashboard.summary)(),
+    )
+    return render(request, "core/home.html", {"patients": patients, "stats": stats})
 
 # --------- Pacientes ---------
-@login_required
-def patient_list(request):
+@async_login_required
+@read_from_replica
+async def patient_list(request):
     q = request.GET.get("q", "").strip()
-    qs = Patient.objects.all()
-    if q:
-        qs = qs.filter(last_name__icontains=q) | qs.filter(first_name__icontains=q) | qs.filter(rut__icontains=q)
-    qs = qs.order_by("last_name", "first_name")
-    return render(request, "core/patient_list.html", {"patients": qs, "q": q})
+    sort = request.GET.get("orden", "")
+    if sort not in PATIENT_SORTS:
+        sort = "nombre"
+    degree = request.GET.get("grado", "")
+    qs = search_patients(q).select_related("summary").order_by(*PATIENT_SORTS[sort][1])
+    if degree in dict(LOSS_DEGREE_CHOICES):
+        qs = qs.filter(summary__last_loss_degree=degree)
+    else:
+        degree = ""
+    paginator = Paginator(qs, PATIENTS_PER_PAGE)
+    paginator.count = await qs.acount()  # evita el COUNT sync de Paginator
+    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj.object_list = await _alist(page_obj.object_list)
+    return render(request, "core/patient_list.html", {
+        "patients": page_obj.object_list,
+        "q": q,
+        "sort": sort,
+        "sorts": [(key, label) for key, (label, _) in PATIENT_SORTS.items()],
+        "degree": degree,
+        "degrees": LOSS_DEGREE_CHOICES,
+        "query": urlencode({k: v for k, v in (("q", q), ("orden", sort), ("grado", degree)) if v}),
+        "page_obj": page_obj,
+        "paginator": paginator,
+        "is_paginated": page_obj.has_other_pages(),
+    })
+
+@async_login_required
+async def patient_autocomplete(request):
+    """Sugerencias para el buscador (JSON); ver core.autocomplete."""
+    q = request.GET.get("q", "")
+    if autocomplete.index.ready:
+        matches, source = autocomplete.search(q)  # en memoria: sin base ni hilo
+    else:
+        matches, source = await sync_to_async(autocomplete.search)(q)  # índice frío: consulta indexada
+    response = JsonResponse({
+        "q": q,
+        "source": source,
+        "results": [
+            {"id": pk, "rut": e.rut, "name": e.label, "url": reverse("patient_detail", args=[pk])}
+            for pk, e in matches
+        ],
+    })
+    # Al borrar y volver a teclear el mismo prefijo, el navegador reutiliza la respuesta
+    patch_cache_control(response, private=True, max_age=settings.AUTOCOMPLETE_MAX_AGE)
+    patch_vary_headers(response, ["Cookie"])
+    return response
 
 @login_required
 def patient_create(request):
@@ -37,25 +129,16 @@ def patient_create(request):
         form = PatientForm()
     return render(request, "core/patient_form.html", {"form": form, "title": "Nuevo Paciente"})
 
-@login_required
-def patient_detail(request, pk):
-    p = get_object_or_404(Patient, pk=pk)
-    anamneses = p.anamneses.all()[:5]
-    audiograms = p.audiograms.all()[:5]
-    speech = p.speech_tests.all()[:5]
-    ldl = p.ldl_tests.all()[:5]
-    return render(request, "core/patient_detail.html", {
-        "patient": p,
-        "anamneses": anamneses,
-        "audiograms": audiograms,
-        "speech": speech,
-        "ldl": ldl,
-    })
+@async_login_required
+@read_from_replica
+async def patient_detail(request, pk):
+    # Desde core.patient_cache; en un fallo, secciones acotadas en paralelo
+    return render(request, "core/patient_detail.html", await patient_cache.detail(pk))
 
 # --------- Anamnesis ---------
 @login_required
 def anamnesis_create(request, patient_pk):
-    p = get_object_or_404(Patient, pk=patient_pk)
+    p = patient_cache.get_patient_or_404(patient_pk)
     if request.method == "POST":
         form = AnamnesisForm(request.POST)
         if form.is_valid():
@@ -71,46 +154,112 @@ def anamnesis_create(request, patient_pk):
 # --------- Audiometría ---------
 @login_required
 def audiogram_create(request, patient_pk):
-    p = get_object_or_404(Patient, pk=patient_pk)
-    ThresholdFS = modelformset_factory(Threshold, form=ThresholdForm, extra=0, can_delete=False)
+    p = patient_cache.get_patient_or_404(patient_pk)
+    return _audiogram_form(request, p, Audiogram(patient=p))
+
+@login_required
+def audiogram_edit(request, pk):
+    ag = archive.get_or_archived(Audiogram.objects.select_related("patient"), pk)
+    if getattr(ag, "archived", None):
+        messages.info(request, "La audiometría está archivada: restáurala desde la ficha para editarla.")
+        return redirect("patient_detail", pk=ag.patient_id)
+    return _audiogram_form(request, ag.patient, ag)
 
+def _audiogram_form(request, patient, ag):
+    editing = ag.pk is not None
+    queryset = ag.thresholds.order_by("pk") if editing else Threshold.objects.none()
     if request.method == "POST":
-        a_form = AudiogramForm(request.POST)
-        t_formset = ThresholdFS(request.POST, queryset=Threshold.objects.none())
+        a_form = AudiogramForm(request.POST, instance=ag)
+        t_formset = ThresholdFormSet(request.POST, queryset=queryset)
         if a_form.is_valid() and t_formset.is_valid():
-            ag = a_form.save(commit=False)
-            ag.patient = p
-            ag.save()
-            # guardar thresholds
-            for tf in t_formset:
-                th = tf.save(commit=False)
-                th.audiogram = ag
-                th.save()
-            messages.success(request, "Audiometría guardada.")
-            return redirect("patient_detail", pk=p.pk)
+            # Cabecera + trazos en una transacción (ver core.audiograms)
+            save_audiogram(a_form, t_formset)
+            messages.success(request, "Audiometría actualizada." if editing else "Audiometría guardada.")
+            return redirect("patient_detail", pk=patient.pk)
     else:
-        a_form = AudiogramForm()
-        # Cargamos 3 filas por defecto: OD Aérea, OI Aérea, (opcional) Campo Libre
-        initial = [
-            {"ear": "R", "pathway": "AC", "symbol": "O"},
-            {"ear": "L", "pathway": "AC", "symbol": "X"},
-            {"ear": "R", "pathway": "BC", "symbol": "<"},
-            {"ear": "L", "pathway": "BC", "symbol": ">"},
-            {"ear": "B", "pathway": "AC", "symbol": "◇"},  # Campo libre
-        ]
-        ThresholdFS = modelformset_factory(Threshold, form=ThresholdForm, extra=len(initial), can_delete=False)
-        t_formset = ThresholdFS(queryset=Threshold.objects.none(), initial=initial)
+        a_form = AudiogramForm(instance=ag)
+        # Filas por defecto (OD/OI aérea y ósea, campo libre) que el examen no tenga
+        t_formset = ThresholdFormSet(queryset=queryset)
 
     return render(request, "core/audiogram_form.html", {
         "a_form": a_form,
         "t_formset": t_formset,
-        "patient": p
+        "patient": patient,
+        "audiogram": ag if editing else None,
     })
 
+@login_required
+def audiogram_import(request):
+    # El archivo puede ser enorme: se guarda y lo procesa `manage.py worker`
+    if request.method == "POST":
+        form = AudiogramImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            job = jobs.enqueue("import_audiograms", {"format": detect_format(upload.name)}, request.user, input_file=upload)
+            messages.info(request, "Importación en cola; puedes seguir trabajando.")
+            return redirect("job_detail", pk=job.pk)
+    else:
+        form = AudiogramImportForm()
+    return render(request, "core/audiogram_import.html", {"form": form})
+
+@login_required
+def audiogram_chart(request, pk, fmt="svg"):
+    thresholds = list(Threshold.objects.filter(audiogram_id=pk))
+    if not thresholds and not Audiogram.objects.filter(pk=pk).exists():
+        archived = archive.load("audiogram", pk)
+        if archived is None:
+            raise Http404("Audiometría no encontrada.")
+        thresholds = list(archived.thresholds.all())
+    if fmt == "png" and charts.cairosvg is None:
+        raise Http404("Render PNG no disponible en este servidor.")
+
+    key, content = charts.get_chart(thresholds, fmt)
+    etag = f'"{key}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        content_type = "image/png" if fmt == "png" else "image/svg+xml"
+        response = HttpResponse(content, content_type=content_type)
+    response["ETag"] = etag
+    # La URL no cambia al editar la audiometría: el navegador revalida siempre (304 si no cambió)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+@login_required
+def audiogram_prescription(request, pk):
+    ag = archive.get_or_archived(Audiogram.objects.select_related("patient"), pk)
+    rule = request.GET.get("regla", prescription.DEFAULT_RULE)
+    if rule not in prescription.RULES:
+        rule = prescription.DEFAULT_RULE
+    targets = prescription.targets_for(ag, rule)
+    ears = dict(EAR_CHOICES)
+    return render(request, "core/prescription.html", {
+        "audiogram": ag,
+        "patient": ag.patient,
+        "rule": rule,
+        "rules": prescription.RULES.items(),
+        "freqs": prescription.FREQS,
+        "ears": [
+            {"label": ears[ear], "rows": list(zip(prescription.INPUT_LEVELS, targets[ear]))}
+            for ear in prescription.EARS
+        ],
+    })
+
+@login_required
+def archived_restore(request, patient_pk, kind, source_id):
+    # Registro archivado (core.archive) de vuelta en la ficha
+    if request.method != "POST" or kind not in archive.MODELS:
+        raise Http404("Registro no encontrado.")
+    if archive.restore(kind, [source_id], patient_pk):
+        messages.success(request, "Registro restaurado desde el archivo.")
+    else:
+        messages.info(request, "El registro ya no estaba archivado.")
+    return redirect("patient_detail", pk=patient_pk)
+
 # --------- Vocal / LDL ---------
 @login_required
 def speech_create(request, patient_pk):
-    p = get_object_or_404(Patient, pk=patient_pk)
+    p = patient_cache.get_patient_or_404(patient_pk)
     if request.method == "POST":
         form = SpeechForm(request.POST)
         if form.is_valid():
@@ -125,7 +274,7 @@ def speech_create(request, patient_pk):
 
 @login_required
 def ldl_create(request, patient_pk):
-    p = get_object_or_404(Patient, pk=patient_pk)
+    p = patient_cache.get_patient_or_404(patient_pk)
     if request.method == "POST":
         form = LDLForm(request.POST)
         if form.is_valid():
@@ -137,3 +286,121 @@ def ldl_create(request, patient_pk):
     else:
         form = LDLForm()
     return render(request, "core/ldl_form.html", {"form": form, "patient": p})
+
+# --------- Exportación / Informes ---------
+def _is_staff(user):
+    return user.is_staff
+
+
+@login_required
+@user_passes_test(_is_staff)
+def export_index(request):
+    form = ExportForm(request.GET or None)
+    return render(request, "core/export.html", {"form": form, "kinds": exports.EXPORTS})
+
+
+@login_required
+@user_passes_test(_is_staff)
+def export_csv(request, kind):
+    if kind not in exports.EXPORTS:
+        raise Http404("Tipo de exportación desconocido.")
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return render(request, "core/export.html", {"form": form, "kinds": exports.EXPORTS}, status=400)
+    return exports.stream_csv(kind, form.cleaned_data["date_from"], form.cleaned_data["date_to"])
+
+
+@login_required
+@user_passes_test(_is_staff)
+def export_job(request, kind):
+    """Encola una exportación (CSV por tipo o PDF por paciente en ZIP)."""
+    if request.method != "POST" or (kind not in exports.EXPORTS and kind != "reports"):
+        raise Http404("Tipo de exportación desconocido.")
+    form = ExportForm(request.POST)
+    if not form.is_valid():
+        return render(request, "core/export.html", {"form": form, "kinds": exports.EXPORTS}, status=400)
+    payload = {k: v.isoformat() if v else None for k, v in form.cleaned_data.items()}
+    if kind == "reports":
+        job = jobs.enqueue("patient_reports", payload, request.user)
+    else:
+        job = jobs.enqueue("export_csv", {"kind": kind, **payload}, request.user)
+    return redirect("job_detail", pk=job.pk)
+
+
+@login_required
+def patient_report(request, pk):
+    p = patient_cache.get_patient_or_404(pk)
+    form = ExportForm(request.GET)
+    date_from = date_to = None
+    if form.is_valid():
+        date_from, date_to = form.cleaned_data["date_from"], form.cleaned_data["date_to"]
+    response = HttpResponse(exports.patient_report_pdf(p, date_from, date_to), content_type="application/pdf")
+    response["Content-Disposition"] = f'inline; filename="informe_{p.rut_search or p.pk}.pdf"'
+    return response
+
+
+# --------- Analítica ---------
+@login_required
+@user_passes_test(_is_staff)
+def cohort_sts(request):
+    rows = analytics.cohort_sts_report()
+    if request.GET.get("solo_sts"):
+        rows = [r for r in rows if r["sts"]]
+    return render(request, "core/cohort_sts.html", {
+        "rows": rows,
+        "sts_freqs": analytics.STS_FREQS,
+        "sts_db": analytics.STS_DB,
+    })
+
+
+# --------- Rendimiento ---------
+@login_required
+@user_passes_test(_is_staff)
+def perf_dashboard(request):
+    if request.method == "POST" and request.POST.get("reset"):
+        perf_stats.reset()
+        patient_cache.stats.reset()
+        messages.info(request, "Métricas reiniciadas.")
+        return redirect("perf_dashboard")
+    rows = sorted(perf_stats.summary(), key=lambda r: -(r["total_ms"][95] or 0))
+    return render(request, "core/perf_dashboard.html", {"rows": rows, "cache_rows": patient_cache.stats.summary()})
+
+
+# --------- Trabajos en segundo plano ---------
+def _user_jobs(request):
+    qs = Job.objects.select_related("created_by")
+    return qs if request.user.is_staff else qs.filter(created_by=request.user)
+
+
+@login_required
+def job_list(request):
+    rows = list(_user_jobs(request)[:50])
+    for job in rows:
+        job.label = jobs.label_for(job.kind)
+    return render(request, "core/job_list.html", {"jobs": rows})
+
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(_user_jobs(request), pk=pk)
+    return render(request, "core/job_detail.html", {"job": job, "label": jobs.label_for(job.kind)})
+
+
+@login_required
+def job_status(request, pk):
+    """Estado en JSON, para consultar el avance sin recargar la página."""
+    job = get_object_or_404(_user_jobs(request), pk=pk)
+    return JsonResponse({
+        "id": job.pk, "kind": job.kind, "status": job.status,
+        "progress": job.progress, "message": job.progress_message,
+        "attempts": job.attempts, "result": job.result,
+        "download": bool(job.output_file),
+    })
+
+
+@login_required
+def job_download(request, pk):
+    job = get_object_or_404(_user_jobs(request), pk=pk)
+    if not job.output_file:
+        raise Http404("El trabajo no generó archivo.")
+    return FileResponse(job.output_file.open("rb"), as_attachment=True, filename=job.output_file.name.rsplit("/", 1)[-1])